@@ -0,0 +1,119 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:02:36.786193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created earlier by init_db() already have these tables
+    op.create_table('fsm_states',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('state', sa.String(), nullable=True),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('key'),
+    if_not_exists=True,
+    )
+    op.create_table('offers',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=False),
+    sa.Column('advantages', sa.Text(), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True,
+    )
+    op.create_table('payments',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('payment_method', sa.String(), nullable=False),
+    sa.Column('invoice_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True,
+    )
+    op.create_table('routes',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('departure', sa.String(), nullable=False),
+    sa.Column('destination', sa.String(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('departure', 'destination', name='unique_points'),
+    if_not_exists=True,
+    )
+    op.create_table('users',
+    sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('username', sa.String(), nullable=True),
+    sa.Column('full_name', sa.String(), nullable=True),
+    sa.Column('age', sa.Integer(), nullable=True),
+    sa.Column('zip_code', sa.String(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True,
+    )
+    op.create_table('bookings',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('route_id', sa.Integer(), nullable=False),
+    sa.Column('payment_id', sa.Integer(), nullable=True),
+    sa.Column('date', sa.String(), nullable=False),
+    sa.Column('seat_type', sa.String(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ),
+    sa.ForeignKeyConstraint(['route_id'], ['routes.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True,
+    )
+    op.create_table('monthly_passes',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('payment_id', sa.Integer(), nullable=True),
+    sa.Column('offer_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['offer_id'], ['offers.id'], ),
+    sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('monthly_passes')
+    op.drop_table('bookings')
+    op.drop_table('users')
+    op.drop_table('routes')
+    op.drop_table('payments')
+    op.drop_table('offers')
+    op.drop_table('fsm_states')
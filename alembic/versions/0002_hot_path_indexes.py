@@ -0,0 +1,37 @@
+"""hot path indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:02:51.189445
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_bookings_status_created', 'bookings', ['status', 'created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_bookings_user_status', 'bookings', ['user_id', 'status'], unique=False, if_not_exists=True)
+    op.create_index(
+        'ix_monthly_passes_status_created', 'monthly_passes', ['status', 'created_at'], unique=False, if_not_exists=True
+    )
+    # Offers are upserted by name; duplicated names must be merged before upgrading
+    op.create_index('ix_offers_name', 'offers', ['name'], unique=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_offers_name', table_name='offers')
+    op.drop_index('ix_monthly_passes_status_created', table_name='monthly_passes')
+    op.drop_index('ix_bookings_user_status', table_name='bookings')
+    op.drop_index('ix_bookings_status_created', table_name='bookings')
@@ -0,0 +1,54 @@
+"""campaigns
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:40:12.518304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('campaigns',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('steps', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True,
+    )
+    op.create_index('ix_campaigns_name', 'campaigns', ['name'], unique=True, if_not_exists=True)
+    op.create_table('campaign_messages',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('campaign_id', sa.Integer(), nullable=False),
+    sa.Column('step', sa.Integer(), nullable=False),
+    sa.Column('due_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['campaign_id'], ['campaigns.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'campaign_id', name='unique_user_campaign'),
+    if_not_exists=True,
+    )
+    op.create_index('ix_campaign_messages_due_at', 'campaign_messages', ['due_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_campaign_messages_due_at', table_name='campaign_messages')
+    op.drop_table('campaign_messages')
+    op.drop_index('ix_campaigns_name', table_name='campaigns')
+    op.drop_table('campaigns')
@@ -0,0 +1,40 @@
+"""scheduled jobs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:20:41.093118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scheduled_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('func', sa.String(), nullable=False),
+    sa.Column('interval_seconds', sa.Integer(), nullable=True),
+    sa.Column('next_run_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('last_run_by', sa.String(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True,
+    )
+    op.create_index('ix_scheduled_jobs_next_run_at', 'scheduled_jobs', ['next_run_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_scheduled_jobs_next_run_at', table_name='scheduled_jobs')
+    op.drop_table('scheduled_jobs')
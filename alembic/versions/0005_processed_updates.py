@@ -0,0 +1,36 @@
+"""processed updates
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:58:07.412690
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('processed_updates',
+    sa.Column('update_id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('update_id'),
+    if_not_exists=True,
+    )
+    op.create_index('ix_processed_updates_created_at', 'processed_updates', ['created_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_processed_updates_created_at', table_name='processed_updates')
+    op.drop_table('processed_updates')
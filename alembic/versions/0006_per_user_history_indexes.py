@@ -0,0 +1,37 @@
+"""per-user history indexes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 13:31:22.648015
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # id is appended so keyset pages are read in index order
+    op.drop_index('ix_bookings_user_status', table_name='bookings')
+    op.create_index('ix_bookings_user_status', 'bookings', ['user_id', 'status', 'id'], unique=False)
+    op.create_index('ix_bookings_user_id', 'bookings', ['user_id', 'id'], unique=False, if_not_exists=True)
+    op.create_index(
+        'ix_monthly_passes_user_status', 'monthly_passes', ['user_id', 'status', 'id'], unique=False, if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_monthly_passes_user_status', table_name='monthly_passes')
+    op.drop_index('ix_bookings_user_id', table_name='bookings')
+    op.drop_index('ix_bookings_user_status', table_name='bookings')
+    op.create_index('ix_bookings_user_status', 'bookings', ['user_id', 'status'], unique=False)
@@ -0,0 +1,37 @@
+"""payment invoice indexes
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 15:34:08.527196
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_payments_invoice_id', 'payments', ['invoice_id'], unique=False, if_not_exists=True)
+    op.create_index(
+        'ix_bookings_payment_status', 'bookings', ['payment_id', 'status'], unique=False, if_not_exists=True
+    )
+    op.create_index(
+        'ix_monthly_passes_payment_status', 'monthly_passes', ['payment_id', 'status'], unique=False,
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_monthly_passes_payment_status', table_name='monthly_passes')
+    op.drop_index('ix_bookings_payment_status', table_name='bookings')
+    op.drop_index('ix_payments_invoice_id', table_name='payments')
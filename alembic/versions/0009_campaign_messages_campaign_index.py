@@ -0,0 +1,35 @@
+"""campaign messages campaign index
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 16:41:55.203874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_campaign_messages_campaign_id', 'campaign_messages', ['campaign_id'], unique=False, if_not_exists=True
+    )
+    # Broadcasts used to be kept forever
+    op.execute(
+        "DELETE FROM campaigns WHERE name LIKE 'broadcast\\_%' ESCAPE '\\' "
+        "AND NOT EXISTS (SELECT 1 FROM campaign_messages WHERE campaign_messages.campaign_id = campaigns.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_campaign_messages_campaign_id', table_name='campaign_messages')
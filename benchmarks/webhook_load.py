@@ -0,0 +1,312 @@
+"""
+Load test of the /webhook endpoint with synthetic Telegram updates.
+
+Every virtual user walks the booking funnel (/start, /booking, departure,
+destination, date, seat, quantity, confirm, pay_manual / pay_cryptobot) and
+opens /order_offers. Updates are posted to the FastAPI app in-process, the
+Bot API, RabbitMQ and CryptoBot are replaced by stubs, so the numbers show
+the cost of our own code and database.
+
+    python -m benchmarks.webhook_load --users 500 --concurrency 50 --json report.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+
+# bot.config reads the settings at import time
+os.environ.setdefault("BOT_TOKEN", "123456:LOAD")
+os.environ.setdefault("CRYPTO_PAY_TOKEN", "load")
+os.environ.setdefault("ADMIN_IDS", "[1]")
+os.environ.setdefault("DB_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/load.db")
+os.environ.setdefault("NETWORK_CRYPTO_API", "TEST_NET")
+os.environ.setdefault("SUPPORTS", "[]")
+os.environ.setdefault("BASE_URL", "http://localhost")
+os.environ.setdefault("RABBITMQ_USERNAME", "guest")
+os.environ.setdefault("RABBITMQ_PASSWORD", "guest")
+os.environ.setdefault("RABBITMQ_HOST", "localhost")
+os.environ.setdefault("RABBITMQ_PORT", "5672")
+os.environ.setdefault("VHOST", "load")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Latency is measured per request, the update queue would only time the enqueue
+os.environ["UPDATE_QUEUE_ENABLED"] = "false"
+
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+from aiogram.types import Chat, Message  # noqa: E402
+from loguru import logger  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+import main  # noqa: E402
+from bot.config import broker  # noqa: E402
+from bot.create_bot import bot, dp, start_bot, stop_bot  # noqa: E402
+from bot.database.main import async_session_maker, init_db  # noqa: E402
+from bot.database.models import Booking, Offer, Payment, Route, User  # noqa: E402
+from bot.handlers import payment  # noqa: E402
+
+
+class StubSession(BaseSession):
+    """Bot API stand-in answering every method after `latency` seconds."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+async def stub_publish(*args, **kwargs):
+    return None
+
+
+async def stub_create_invoice(amount: float, currency: str = "USDT"):
+    invoice_id = next(_invoice_ids)
+    return SimpleNamespace(invoice_id=invoice_id, bot_invoice_url=f"https://t.me/CryptoTestnetBot?start={invoice_id}")
+
+
+_invoice_ids = itertools.count(1)
+_update_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"}
+
+
+def message_update(user_id: int, text: str) -> dict:
+    update_id = next(_update_ids)
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(user_id: int, data: str) -> dict:
+    update_id = next(_update_ids)
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": bot.id, "is_bot": True, "first_name": "Casa"},
+                "text": "keyboard",
+            },
+        },
+    }
+
+
+def funnel(user_id: int) -> list[tuple[str, dict]]:
+    """(step name, update) pairs of one user, in the order Telegram would send them."""
+    method = "pay_cryptobot" if user_id % 2 else "pay_manual"
+    return [
+        ("start", message_update(user_id, "/start")),
+        ("booking", message_update(user_id, "/booking")),
+        ("departure", message_update(user_id, "Lisbon")),
+        ("destination", message_update(user_id, "Porto")),
+        ("travel_date", message_update(user_id, "tomorrow")),
+        ("seat_type", callback_update(user_id, "standard")),
+        ("quantity", callback_update(user_id, "2")),
+        ("confirm", callback_update(user_id, "confirm_booking")),
+        (method, callback_update(user_id, method)),
+        ("order_offers", message_update(user_id, "/order_offers")),
+        ("offer", callback_update(user_id, "offer_1")),
+    ]
+
+
+async def post_json(app, path: str, payload: dict) -> int:
+    """Minimal in-process ASGI client, returns the response status."""
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+    received = False
+    status = 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+async def seed():
+    await init_db()
+    async with async_session_maker() as session:
+        if await session.get(Route, 1) is None:
+            session.add(Route(id=1, departure="Lisbon", destination="Porto", cost=15))
+        if await session.get(Offer, 1) is None:
+            session.add(Offer(id=1, name="Monthly", description="", advantages="", url="https://x.com", price=30))
+        await session.commit()
+
+
+async def db_outcomes(first_user: int, users: int) -> dict:
+    """What the funnel left in the database for the virtual users."""
+    user_ids = range(first_user, first_user + users)
+    async with async_session_maker() as session:
+        registered = await session.scalar(select(func.count()).select_from(User).where(User.id.in_(user_ids)))
+        bookings = (await session.execute(
+            select(Booking.user_id, func.count(), func.count(Booking.payment_id))
+            .where(Booking.user_id.in_(user_ids))
+            .group_by(Booking.user_id)
+        )).all()
+        payments = (await session.execute(
+            select(Payment.payment_method, func.count())
+            .join(Booking, Booking.payment_id == Payment.id)
+            .where(Booking.user_id.in_(user_ids))
+            .group_by(Payment.payment_method)
+        )).all()
+    return {
+        "users": registered,
+        "users_with_one_booking_and_payment": sum(1 for _, total, paid in bookings if total == 1 and paid == 1),
+        "bookings": sum(total for _, total, _ in bookings),
+        "payments": dict(payments),
+    }
+
+
+async def run_load(users: int = 100, concurrency: int = 20, api_latency: float = 0.0, first_user: int = 10_000) -> dict:
+    """Replay the funnel for `users` virtual users, `concurrency` of them at a time."""
+    api = StubSession(latency=api_latency)
+    bot.session = api
+    broker.publish = stub_publish
+    payment.create_invoice = stub_create_invoice
+
+    await seed()
+    await start_bot()
+
+    latencies = defaultdict(list)
+    statuses = Counter()
+    # /webhook and the handlers answer 200 and log failures: count them instead
+    errors = []
+    sink = logger.add(lambda message: errors.append(message.record["message"]), level="ERROR")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def virtual_user(user_id: int):
+        async with semaphore:
+            for step, update in funnel(user_id):
+                started = time.perf_counter()
+                statuses[await post_json(main.app, "/webhook", update)] += 1
+                latencies[step].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(first_user + i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    logger.remove(sink)
+
+    await stop_bot()
+    await dp.storage.close()
+
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "users": users,
+        "concurrency": concurrency,
+        "api_latency_ms": api_latency * 1000,
+        "updates": total,
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(total / elapsed, 1),
+        "statuses": dict(statuses),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "db": await db_outcomes(first_user, users),
+        "bot_api_calls": dict(api.calls),
+        "steps": {
+            step: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+            }
+            for step, values in latencies.items()
+        },
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"{report['updates']} updates from {report['users']} users in {report['seconds']}s "
+        f"-> {report['updates_per_sec']} updates/sec (statuses {report['statuses']}, errors {report['errors']})"
+    )
+    print(f"{'step':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, row in report["steps"].items():
+        print(f"{step:<16}{row['count']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Bot API round trip")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.users, args.concurrency, args.api_latency_ms / 1000))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
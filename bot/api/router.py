@@ -1,11 +1,16 @@
 from datetime import datetime, timedelta
 from faststream.rabbit.fastapi import RabbitRouter
 from loguru import logger
-from bot.create_bot import bot
-from bot.config import config, scheduler, broker
+from sqlalchemy import Row
+from bot.create_bot import job_runner, outbox, storage
+from bot.config import config, broker
 from bot.database.dao.dao import BookingDAO, MonthlyPassDAO
+from bot.database.dao.registry import DAORegistry
 from bot.database.main import async_session_maker
-from bot.services.crypto import get_invoice_status
+from bot.database.storage import SQLAlchemyStorage
+from bot.services.campaigns import WELCOME, dispatch_campaigns, enroll_user
+from bot.services.crypto import get_invoices_status
+from bot.services.sweeper import delete_invoices, sweep_expired
 
 router = RabbitRouter(url=config.rabbitmq_url)
 
@@ -13,105 +18,163 @@ router = RabbitRouter(url=config.rabbitmq_url)
 # Manual command for expire_check (RabbitMQ)
 @router.subscriber("expire_check")
 async def schedule_expiration():
-    scheduler.add_job(
-        disable_expired_bookings,
-        "date",
-        run_date=datetime.utcnow() + timedelta(minutes=30),
-        id="disable_expired_bookings",
-        replace_existing=True,
-    )
-    scheduler.add_job(
-        disable_expired_orders,
-        "date",
-        run_date=datetime.utcnow() + timedelta(minutes=30),
-        id="disable_expired_bookings",
-        replace_existing=True,
-    )
-
-
-@router.subscriber("crypto_check")
-async def monitor_crypto_payment(data: dict):
-    booking_id = data["booking_id"]
-    invoice_id = data["invoice_id"]
-    user_id = data["user_id"]
-
-    # Checking the crypto payment status in 30sec (APSheduler)
-    scheduler.add_job(
-        check_invoice_status,
-        "interval",
-        seconds=30,
-        args=[booking_id, invoice_id, user_id],
-        id=f"crypto_check_{booking_id}",
-        replace_existing=True,
-    )
+    # Own ids, the interval jobs of the same functions keep running
+    run_at = datetime.utcnow() + timedelta(minutes=30)
+    await job_runner.at(disable_expired_bookings, run_at, job_id="expire_check_bookings")
+    await job_runner.at(disable_expired_orders, run_at, job_id="expire_check_orders")
 
 
 @router.subscriber("admin_msg")
 async def send_booking_msg(msg: str):
-    for admin in config.ADMIN_IDS:
-        await bot.send_message(admin, text=msg)
+    outbox.send_many(config.ADMIN_IDS, msg)
 
 
 @router.subscriber("noti_user")
 async def schedule_user_notifications(user_id: int):
-    """Plans to send a series of messages to the user with different intervals."""
-    now = datetime.now()
-
-    notifications = [
-        {
-            "time": now + timedelta(hours=1),
-            "text": "Thanks for the choice of our casa bot! We hope you will like it."
-                    "Leave a review so that we become better!",
-        },
-        {
-            "time": now + timedelta(hours=3),
-            "text": "Do you need to book the ticket again? Try our new routes!",
-        },
-    ]
-
-    for i, notification in enumerate(notifications):
-        scheduler.add_job(
-            send_user_msg,
-            "date",
-            run_date=notification["time"],
-            args=(user_id, notification["text"]),
-            id=f"user_notification_{user_id}_{i}",
-            replace_existing=True,
-        )
-        logger.info(
-            f"Notification for the user is planned {user_id} on {notification['time']}"
-        )
+    """Enrolls a new user in the welcome campaign, sent by dispatch_campaign_messages."""
+    await enroll_user(async_session_maker, user_id, WELCOME)
 
 
 async def disable_expired_bookings():
-    async with async_session_maker() as session:
-        result = await BookingDAO(session).cancel_expired(expire_minutes=60)
-        logger.info(f"Canceled {result} expired bookings")
+    await sweep_expired(
+        async_session_maker,
+        BookingDAO,
+        outbox,
+        expire_minutes=config.BOOKING_EXPIRE_MINUTES,
+        text="⌛ Your unpaid booking has expired and was canceled.",
+        chunk_size=config.EXPIRY_CHUNK_SIZE,
+    )
 
 
 async def disable_expired_orders():
-    async with async_session_maker() as session:
-        result = await MonthlyPassDAO(session).cancel_expired(expire_minutes=60)
-        logger.info(f"Canceled {result} expired monthly passes")
+    await sweep_expired(
+        async_session_maker,
+        MonthlyPassDAO,
+        outbox,
+        expire_minutes=config.PASS_EXPIRE_MINUTES,
+        text="⌛ Your unpaid pass order has expired and was canceled.",
+        chunk_size=config.EXPIRY_CHUNK_SIZE,
+    )
+
+
+async def dispatch_campaign_messages():
+    await dispatch_campaigns(async_session_maker, outbox, batch_size=config.CAMPAIGN_BATCH_SIZE)
+
+
+async def cleanup_fsm_states():
+    if isinstance(storage, SQLAlchemyStorage):
+        await storage.cleanup(ttl=timedelta(hours=config.FSM_STATE_TTL_HOURS))
+
+
+async def confirm_paid_invoice(invoice_id: int) -> int:
+    """
+    Handle an `invoice_paid` update pushed by CryptoBot: mark the bookings and
+    pass orders of the invoice paid and notify their users. Idempotent, a
+    redelivered update finds nothing unpaid and sends nothing. A payment
+    whose orders were canceled meanwhile is reported to the admins.
+    """
+    # Bookings and passes are committed together, a failure leaves the invoice
+    # unpaid for the retry instead of half confirmed with its notices lost
+    async with DAORegistry(async_session_maker, unit_of_work=True) as dao:
+        bookings = await dao.booking.mark_paid_by_invoice(invoice_id)
+        passes = await dao["pass"].mark_paid_by_invoice(invoice_id)
+        if not bookings and not passes:
+            orders = [("booking", row) for row in await dao.booking.find_by_invoice(invoice_id)]
+            orders += [("pass order", row) for row in await dao["pass"].find_by_invoice(invoice_id)]
+
+    if not bookings and not passes:
+        await report_unmatched_payment(invoice_id, orders)
+        return 0
+
+    logger.info(f"Invoice {invoice_id} paid: {len(bookings)} bookings, {len(passes)} passes.")
+    for row in bookings:
+        await send_user_msg(row.user_id, "✅ Your payment is confirmed!")
+        await notify_admins(f"📬 Paid booking {row.id}")
+    for row in passes:
+        await send_user_msg(row.user_id, "✅ Your payment is confirmed!")
+        await notify_admins(f"📬 Paid pass order {row.id}")
+    return len(bookings) + len(passes)
+
+
+async def report_unmatched_payment(invoice_id: int, orders: list[tuple[str, Row]]):
+    """
+    An `invoice_paid` update that confirmed nothing. Fine for a redelivery
+    (every order already paid); otherwise the money arrived for canceled or
+    unknown orders and an admin has to restore or refund them.
+    """
+    unpaid = [(kind, row) for kind, row in orders if row.status != "paid"]
+    if orders and not unpaid:
+        return
+    logger.warning(f"Invoice {invoice_id} paid without a payable order: {[(k, r.id, r.status) for k, r in orders]}")
+    if not orders:
+        await notify_admins(f"⚠️ Invoice {invoice_id} was paid but matches no booking or pass order.")
+        return
+    for kind, row in unpaid:
+        await notify_admins(f"⚠️ Invoice {invoice_id} was paid but {kind} {row.id} is {row.status}.")
+    for user_id in {row.user_id for _, row in unpaid}:
+        await send_user_msg(
+            user_id, "⚠️ Your payment arrived after the order was canceled. Our support will contact you."
+        )
 
 
-async def check_invoice_status(booking_id: int, invoice_id: int, user_id: int):
-    status = await get_invoice_status(invoice_id)
+async def check_pending_invoices():
+    """
+    Reconciliation fallback for the CryptoBot webhook: catches invoices
+    whose `invoice_paid` update was lost and cancels timed out bookings.
+    Statuses are fetched in chunks, then paid / timed out bookings are
+    updated with one bulk UPDATE per status and the invoices of the timed
+    out ones are deleted in CryptoBot.
+    """
     async with async_session_maker() as session:
         booking_dao = BookingDAO(session)
+        pending = await booking_dao.find_pending_invoices()
+        if not pending:
+            return
 
-        if status == "paid":
-            await booking_dao.mark_paid(booking_id)
-            await send_user_msg(user_id, "✅ Your payment is confirmed!")
-            await broker.publish(message=f"📬 Paid booking {booking_id}", queue="admin_msg")
-            scheduler.remove_job(f"crypto_check_{booking_id}")
-        else:
-            booking = await booking_dao.find_one_or_none_by_id(data_id=booking_id)
-            if (datetime.utcnow() - booking.created_at).total_seconds() > 1800:  # 30 мин
-                await booking_dao.mark_cancel(booking_id)
-                await send_user_msg(user_id, "⌛ Booking canceled due to timeout.")
-                scheduler.remove_job(f"crypto_check_{booking_id}")
+        statuses = await get_invoices_status(
+            [row.invoice_id for row in pending],
+            chunk_size=config.INVOICE_POLL_CHUNK,
+        )
+        deadline = datetime.utcnow() - timedelta(minutes=config.INVOICE_TIMEOUT_MINUTES)
+
+        paid, canceled = [], []
+        for row in pending:
+            status = statuses.get(row.invoice_id)
+            if status == "paid":
+                paid.append(row)
+            elif status == "expired" or row.created_at < deadline:
+                canceled.append(row)
+
+        # Only the rows this UPDATE changed: the webhook may have paid some meanwhile
+        paid = await booking_dao.set_status_many([row.id for row in paid], "paid")
+        canceled = await booking_dao.set_status_many([row.id for row in canceled], "canceled")
+
+    invoice_ids = {row.id: row.invoice_id for row in pending}
+    errors = await delete_invoices(
+        [invoice_ids[row.id] for row in canceled if statuses.get(invoice_ids[row.id]) != "expired"]
+    )
+    logger.info(
+        f"Invoices checked: {len(pending)}, paid: {len(paid)}, canceled: {len(canceled)}, "
+        f"invoice delete errors: {errors}"
+    )
+    for row in paid:
+        await send_user_msg(row.user_id, "✅ Your payment is confirmed!")
+        await notify_admins(f"📬 Paid booking {row.id}")
+    for row in canceled:
+        await send_user_msg(row.user_id, "⌛ Booking canceled due to timeout.")
 
 
 async def send_user_msg(user_id: int, text: str):
-    await bot.send_message(user_id, text=text)
+    outbox.send(user_id, text)
+
+
+async def notify_admins(text: str):
+    """
+    Admin notice through RabbitMQ. Called once the change is committed, so a
+    broker failure is logged and swallowed: raising would skip the remaining
+    notices and nothing would ever send them again.
+    """
+    try:
+        await broker.publish(message=text, queue="admin_msg")
+    except Exception as e:
+        logger.error(f"Admin notice {text!r} not published: {e}")
@@ -1,11 +1,9 @@
 import os
+import sys
 from urllib.parse import quote
 
-from aiocryptopay import Networks, AioCryptoPay
 from faststream.rabbit import RabbitBroker
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from loguru import logger
 
@@ -15,8 +13,29 @@ class Config(BaseSettings):
     CRYPTO_PAY_TOKEN: str
     ADMIN_IDS: list[int]
     DB_URL: str
-    STORE_URL: str = 'sqlite:///./jobs.sqlite'
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = True
+    DB_UNIT_OF_WORK: bool = True  # one commit per update instead of one per DAO write
+    SQLITE_WAL: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT: int = 5000  # ms
     NETWORK_CRYPTO_API: str
+    CRYPTO_API_URL: str | None = None  # overrides the network URL, e.g. a local fake CryptoBot
+    CRYPTO_TIMEOUT: float = 10  # seconds per request
+    CRYPTO_CONCURRENCY: int = 10  # requests in flight, also the connection pool size
+    CRYPTO_MAX_ATTEMPTS: int = 3  # reads only, invoices are created once
+    CRYPTO_BACKOFF: float = 0.5  # seconds, doubled on every retry
+    CRYPTO_BREAKER_THRESHOLD: int = 5  # consecutive failures that open the circuit
+    CRYPTO_BREAKER_RESET_SECONDS: float = 30
+    PRICE_ASSET: str = "USDT"  # currency of Route.cost and booking prices
+    OFFER_PRICE_ASSET: str = "EUR"  # currency of Offer.price
+    PAY_ASSETS: list[str] = ["USDT", "TON", "BTC", "ETH", "USDC"]  # offered by /currency
+    RATES_REFRESH_SECONDS: int = 60
+    RATES_MAX_AGE_SECONDS: int = 600  # older rates are not used, prices fall back to PRICE_ASSET
     SUPPORTS: list[str]
 
     BASE_URL: str
@@ -28,6 +47,47 @@ class Config(BaseSettings):
 
     FORMAT_LOG: str = "{time:YYYY-MM-DD at HH:mm:ss} | {level} | {message}"
     LOG_ROTATION: str = "10 MB"
+    LOG_LEVEL: str = "INFO"
+    LOG_ENQUEUE: bool = True  # write the log file from a background thread
+    DAO_LOG_LEVEL: str = "DEBUG"  # per-query DAO logs, dropped cheaply below LOG_LEVEL
+    DAO_LOG_SAMPLE_RATE: float = 1.0
+
+    ROUTE_CACHE_TTL: int = 300  # seconds
+    OFFER_CACHE_TTL: int = 300  # seconds, bounds how stale other instances' catalogs get
+    HISTORY_PAGE_SIZE: int = 5  # bookings / passes per /my_bookings and /my_offers message
+
+    INVOICE_POLL_SECONDS: int = 300  # reconciliation only, paid invoices are pushed to /cryptobot
+    INVOICE_POLL_CHUNK: int = 100  # CryptoBot accepts up to 1000 ids per getInvoices
+    INVOICE_TIMEOUT_MINUTES: int = 30
+    BOOKING_EXPIRE_MINUTES: int = 60
+    PASS_EXPIRE_MINUTES: int = 60
+    EXPIRY_SWEEP_MINUTES: int = 30
+    EXPIRY_CHUNK_SIZE: int = 500
+    OUTBOX_GLOBAL_RATE: float = 30  # messages per second, Telegram's bot-wide limit
+    OUTBOX_CHAT_RATE: float = 1  # messages per second to one chat
+    OUTBOX_CHAT_BURST: int = 3
+    OUTBOX_CONCURRENCY: int = 10
+    OUTBOX_DRAIN_TIMEOUT: int = 10
+    CAMPAIGN_TICK_SECONDS: int = 30
+    CAMPAIGN_BATCH_SIZE: int = 500
+    JOB_POLL_SECONDS: float = 5  # upper bound, the runner also wakes up for the next due job
+    JOB_INSTANCE: str | None = None  # defaults to hostname:pid
+    JOB_DRAIN_TIMEOUT: int = 10
+    METRICS_ENABLED: bool = True
+    METRICS_SLOW_UPDATE_MS: int = 1000
+
+    FSM_STORAGE: str = "db"  # "db" or "memory" (single process only)
+    FSM_STORAGE_URL: str | None = None  # defaults to DB_URL
+    FSM_STATE_TTL_HOURS: int = 24
+
+    UPDATE_QUEUE_ENABLED: bool = False  # answer the webhook before handling the update
+    UPDATE_WORKERS: int = 8
+    UPDATE_QUEUE_SIZE: int = 1000  # split evenly: each worker's shard holds SIZE // WORKERS
+    UPDATE_DRAIN_TIMEOUT: int = 10  # seconds
+    UPDATE_DEDUP_ENABLED: bool = True  # drop redelivered update ids before the dispatcher
+    UPDATE_DEDUP_SIZE: int = 10_000  # ids kept in memory
+    UPDATE_DEDUP_DB: bool = False  # also claim ids in the database, for several instances
+    UPDATE_DEDUP_RETENTION_SECONDS: int = 86400  # Telegram keeps undelivered updates for 24h
 
     @property
     def rabbitmq_url(self) -> str:
@@ -41,6 +101,11 @@ class Config(BaseSettings):
         """Returns the webhook URL"""
         return f"{self.BASE_URL}/webhook"
 
+    @property
+    def crypto_hook_url(self) -> str:
+        """Webhook URL to set in the CryptoBot app settings (it cannot be set through the API)"""
+        return f"{self.BASE_URL}/cryptobot"
+
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
     )
@@ -51,15 +116,15 @@ config = Config()
 
 # Logging setting
 log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log.txt")
-logger.add(log_file_path, format=config.FORMAT_LOG, level="INFO", rotation=config.LOG_ROTATION)
+logger.remove()
+logger.add(sys.stderr, level=config.LOG_LEVEL)
+logger.add(
+    log_file_path,
+    format=config.FORMAT_LOG,
+    level=config.LOG_LEVEL,
+    rotation=config.LOG_ROTATION,
+    enqueue=config.LOG_ENQUEUE,
+)
 
 # Creating a RabbitMQ message broker
 broker = RabbitBroker(url=config.rabbitmq_url)
-
-# Creating a planner of tasks
-scheduler = AsyncIOScheduler(jobstores={"default": SQLAlchemyJobStore(url=config.STORE_URL)})
-
-# Crypto API method
-method = config.NETWORK_CRYPTO_API
-network_API = Networks.TEST_NET if method == "TEST_NET" else Networks.MAIN_NET
-crypto = AioCryptoPay(token=config.CRYPTO_PAY_TOKEN, network=network_API)
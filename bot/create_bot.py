@@ -5,20 +5,57 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.utils.callback_answer import CallbackAnswerMiddleware
 
 from bot.config import config
-from bot.database.main import async_session_maker
+from bot.database.main import async_session_maker, engine
+from bot.database.storage import SQLAlchemyStorage
 from bot.handlers import user, admin, other, booking, payment, offers_manager, offers_ordering
 from bot.middlewares.db import DbSessionMiddleware
+from bot.middlewares.fsm_flush import FSMFlushMiddleware
+from bot.middlewares.metrics import BotAPIMetricsMiddleware, HandlerNameMiddleware, MetricsMiddleware
 from bot.middlewares.state_clear import StateClearMiddleware
+from bot.services.jobs import JobRunner
+from bot.services.metrics import instrument_engine
+from bot.services.outbox import MessageDispatcher
 
 from loguru import logger
 
 bot = Bot(token=config.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher(storage=MemoryStorage())
+
+if config.FSM_STORAGE == "memory":
+    storage = MemoryStorage()
+elif config.FSM_STORAGE_URL:
+    storage = SQLAlchemyStorage.from_url(config.FSM_STORAGE_URL)
+else:
+    storage = SQLAlchemyStorage(async_session_maker)
+
+dp = Dispatcher(storage=storage)
+outbox = MessageDispatcher(
+    bot,
+    global_rate=config.OUTBOX_GLOBAL_RATE,
+    chat_rate=config.OUTBOX_CHAT_RATE,
+    chat_burst=config.OUTBOX_CHAT_BURST,
+    concurrency=config.OUTBOX_CONCURRENCY,
+)
+# Injected into handlers: messages to chats other than the update's go through it
+dp["outbox"] = outbox
+job_runner = JobRunner(async_session_maker, poll_seconds=config.JOB_POLL_SECONDS, instance=config.JOB_INSTANCE)
 
 
 async def start_bot():
     # Middlewares
-    dp.update.middleware.register(DbSessionMiddleware(session_pool=async_session_maker))
+    if config.METRICS_ENABLED:
+        # Outermost, so the FSM flush and the DB commit are part of the measured time
+        instrument_engine(engine)
+        bot.session.middleware(BotAPIMetricsMiddleware())
+        dp.update.outer_middleware(MetricsMiddleware(slow_ms=config.METRICS_SLOW_UPDATE_MS))
+        for name, observer in dp.observers.items():
+            if name not in ("update", "error"):
+                observer.middleware(HandlerNameMiddleware())
+    if isinstance(storage, SQLAlchemyStorage):
+        await storage.init()
+        dp.update.outer_middleware(FSMFlushMiddleware(storage))
+    dp.update.middleware.register(
+        DbSessionMiddleware(session_pool=async_session_maker, unit_of_work=config.DB_UNIT_OF_WORK)
+    )
     dp.message.middleware(StateClearMiddleware())
     # Automatically reply to all callbacks
     dp.callback_query.middleware(CallbackAnswerMiddleware())
@@ -31,18 +68,12 @@ async def start_bot():
     dp.include_router(offers_manager.offers_router)
     dp.include_router(offers_ordering.order_offers)
 
-    for admin_id in config.ADMIN_IDS:
-        try:
-            await bot.send_message(admin_id, f'I am launched🥳.')
-        except:
-            pass
+    outbox.start()
+    outbox.send_many(config.ADMIN_IDS, 'I am launched🥳.')
     logger.info("The bot has been launched successfully.")
 
 
 async def stop_bot():
-    try:
-        for admin_id in config.ADMIN_IDS:
-            await bot.send_message(admin_id, 'The bot is stopped. For what? 😔')
-    except:
-        pass
+    outbox.send_many(config.ADMIN_IDS, 'The bot is stopped. For what? 😔')
+    await outbox.stop(timeout=config.OUTBOX_DRAIN_TIMEOUT)
     logger.error("The bot is stopped!")
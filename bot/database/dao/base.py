@@ -1,111 +1,269 @@
-from typing import List, TypeVar, Generic, Type, Optional
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, TypeVar, Generic, Type, Optional, Sequence
 
 from pydantic import BaseModel
-from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete
+from sqlalchemy import Row, event, update as sqlalchemy_update, delete as sqlalchemy_delete, func, literal_column
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
+from bot.config import config
 from bot.database.main import Base
 
 T = TypeVar("T", bound=Base)
+UNIT_FAILED = "unit_failed"  # session.info flag set by a failed DAO write in a unit of work
+AFTER_TRANSACTION = "after_transaction"  # session.info callbacks run when the transaction ends
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _run_after_transaction(session: Session, transaction):
+    # Outermost transaction only: committed, rolled back or closed
+    if transaction.parent is None:
+        for callback in session.info.pop(AFTER_TRANSACTION, ()):
+            callback()
+
+
+@dataclass
+class Page(Generic[T]):
+    """One page of a keyset listing, newest first."""
+    items: List[T] = field(default_factory=list)
+    has_newer: bool = False
+    has_older: bool = False
+
+
+class DAOLogPolicy:
+    """
+    Level and sampling of the per-query DAO logs.
+    Arguments are formatted by loguru only when a sink accepts the level, so
+    at INFO the DEBUG query logs cost a level check. Errors are not sampled.
+    """
+
+    def __init__(self, level: str = "DEBUG", sample_rate: float = 1.0):
+        self.level = level
+        self.sample_rate = sample_rate
+
+    def __call__(self, message: str, *args) -> None:
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        logger.opt(depth=1).log(self.level, message, *args)
+
+
+dao_log = DAOLogPolicy(config.DAO_LOG_LEVEL, config.DAO_LOG_SAMPLE_RATE)
+
+
+def dialect_insert(session: AsyncSession, table: Any):
+    """INSERT construct of the session's dialect, supporting ON CONFLICT."""
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
 
 
 class BaseDAO(Generic[T]):
     model: Type[T] = None
 
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, autocommit: bool = True):
         self._session = session
+        # False inside a unit of work: writes are only flushed and the owner
+        # of the session (DAORegistry) commits once for the whole update
+        self.autocommit = autocommit
         if self.model is None:
             raise ValueError("The model should be indicated in the subsidiary")
 
-    async def cancel_expired(self, expire_minutes: int = 60) -> int:
+    async def _commit(self):
+        if self.autocommit:
+            await self._session.commit()
+        else:
+            await self._session.flush()
+
+    def _after_transaction(self, callback: Callable[[], Any]):
         """
-        Cancel expired unpaid records for the DAO's model.
-        Assumes the model has `status` and `created_at`.
+        Run `callback` once the current transaction is over, e.g. to invalidate
+        a cache: before the commit a concurrent reader would cache the old row
+        again, and the unit itself could cache rows that are then rolled back.
         """
-        try:
-            exp_time = datetime.utcnow() - timedelta(minutes=expire_minutes)
-
-            query = (
-                update(self.model)
-                .where(self.model.status == "unpaid")
-                .where(self.model.created_at < exp_time)
-                .values(status="canceled")
-                .execution_options(synchronize_session="fetch")
-            )
+        if self._session.in_transaction():
+            self._session.info.setdefault(AFTER_TRANSACTION, []).append(callback)
+        else:
+            callback()
 
-            result = await self._session.execute(query)
-            await self._session.flush()
-            return result.rowcount
+    async def _rollback(self):
+        """
+        Undo a failed write. Inside a unit of work the earlier writes of the
+        update must not be dropped by a single DAO: the unit is only marked
+        failed and its owner (DAORegistry) rolls it back instead of committing.
+        """
+        if self.autocommit:
+            await self._session.rollback()
+        else:
+            self._session.info[UNIT_FAILED] = True
+
+    def _load_options(self, load: Sequence[str]) -> list:
+        """
+        Build eager loading options from relationship names, e.g. ("route", "user").
+        Many-to-one relationships are joined into the same SELECT, collections
+        are fetched with one extra SELECT ... IN for all parent rows.
+        """
+        options = []
+        for name in load:
+            relationship = getattr(self.model, name)
+            if relationship.property.uselist:
+                options.append(selectinload(relationship))
+            else:
+                options.append(joinedload(relationship))
+        return options
+
+    async def cancel_expired_chunk(
+            self,
+            expire_minutes: int = 60,
+            limit: int = 500,
+            after_id: int = 0,
+    ) -> List[Row]:
+        """
+        Cancel up to `limit` expired unpaid records with id > `after_id`.
+        Assumes the model has `status`, `created_at`, `user_id` and `payment_id`.
+        Returns (id, user_id, payment_id) of the canceled rows, ordered by id.
+        """
+        exp_time = datetime.utcnow() - timedelta(minutes=expire_minutes)
+        still_expired = (self.model.status == "unpaid", self.model.created_at < exp_time)
+        expired = (
+            select(self.model.id)
+            .where(*still_expired)
+            .where(self.model.id > after_id)
+            .order_by(self.model.id)
+            .limit(limit)
+        )
+        columns = (self.model.id, self.model.user_id, self.model.payment_id)
+        try:
+            if self._session.bind.dialect.update_returning:
+                # The conditions are repeated on the UPDATE: PostgreSQL does not
+                # re-run the subquery for a row locked meanwhile, a booking paid
+                # by the webhook at that moment must stay paid
+                query = (
+                    sqlalchemy_update(self.model)
+                    .where(self.model.id.in_(expired.scalar_subquery()), *still_expired)
+                    .values(status="canceled")
+                    .returning(*columns)
+                    .execution_options(synchronize_session=False)
+                )
+                rows = (await self._session.execute(query)).all()
+            else:
+                rows = (await self._session.execute(
+                    select(*columns).where(self.model.id.in_(expired.scalar_subquery()))
+                )).all()
+                await self._session.execute(
+                    sqlalchemy_update(self.model)
+                    .where(self.model.id.in_([row.id for row in rows]), *still_expired)
+                    .values(status="canceled")
+                    .execution_options(synchronize_session=False)
+                )
+            await self._commit()
+            return sorted(rows, key=lambda row: row.id)
         except SQLAlchemyError as e:
             logger.error(
                 f"Error when canceling expired {self.model.__tablename__}: {e}",
                 exc_info=True,
             )
-            await self._session.rollback()
+            await self._rollback()
             raise
 
-    async def find_one_or_none_by_id(self, data_id: int) -> Optional[T]:
-        logger.info(f"Get {self.model.__name__} by ID: {data_id}")
+    async def cancel_expired(self, expire_minutes: int = 60, chunk_size: int = 500) -> int:
+        """Cancel all expired unpaid records, one bounded UPDATE per chunk."""
+        total, after_id = 0, 0
+        while rows := await self.cancel_expired_chunk(expire_minutes, chunk_size, after_id):
+            total += len(rows)
+            after_id = rows[-1].id
+        return total
+
+    async def find_one_or_none_by_id(self, data_id: int, load: Sequence[str] = ()) -> Optional[T]:
         try:
-            query = select(self.model).filter_by(id=data_id)
+            query = select(self.model).filter_by(id=data_id).options(*self._load_options(load))
             result = await self._session.execute(query)
             record = result.scalar_one_or_none()
-            log_message = f"Record {self.model.__name__} with ID {data_id} {'found' if record else 'not found'}."
-            logger.info(log_message)
+            dao_log("Record {} with ID {} {}.", self.model.__name__, data_id, "found" if record else "not found")
             return record
         except SQLAlchemyError as e:
             logger.error(f"Error when looking for a record with ID {data_id}: {e}")
             raise
 
-    async def find_one_or_none(self, filters: BaseModel) -> Optional[T]:
+    async def find_one_or_none(self, filters: BaseModel, load: Sequence[str] = ()) -> Optional[T]:
         # Search by filter
         filter_dict = filters.model_dump(exclude_unset=True)
-        logger.info(f"Search a row from {self.model.__name__} by filters: {filter_dict}")
         try:
-            query = select(self.model).filter_by(**filter_dict)
+            query = select(self.model).filter_by(**filter_dict).options(*self._load_options(load))
             result = await self._session.execute(query)
             record = result.scalar_one_or_none()
-            if record:
-                logger.info(f"Searched: {filter_dict}")
-            else:
-                logger.info(f"Didn't search: {filter_dict}")
+            dao_log("Row {} by filters {} {}.", self.model.__name__, filter_dict, "found" if record else "not found")
             return record
         except SQLAlchemyError as e:
             logger.error(f"Error with filters {filter_dict}: {e}")
             raise
 
-    async def find_all(self, filters: BaseModel | None = None) -> List[T]:
+    async def find_all(self, filters: BaseModel | None = None, load: Sequence[str] = ()) -> List[T]:
         try:
-            if filters:
-                filter_dict = filters.model_dump(exclude_unset=True)
-                logger.info(f"Search all rows {self.model.__name__} by filters: {filter_dict}")
-                query = select(self.model).filter_by(**filter_dict)
-            else:
-                logger.info(f"Search all rows {self.model.__name__} without filters")
-                query = select(self.model)
-
+            filter_dict = filters.model_dump(exclude_unset=True) if filters else {}
+            query = select(self.model).filter_by(**filter_dict).options(*self._load_options(load))
             result = await self._session.execute(query)
             records = result.scalars().all()
-            logger.info(f"Found {len(records)}.")
+            dao_log("Found {} rows {} by filters {}.", len(records), self.model.__name__, filter_dict)
             return records
         except SQLAlchemyError as e:
             logger.error(f"Error in find_all method: {e}")
             raise
 
+    async def find_page(
+            self,
+            filters: BaseModel,
+            before_id: int | None = None,
+            after_id: int | None = None,
+            limit: int = 5,
+            load: Sequence[str] = (),
+    ) -> Page[T]:
+        """
+        Keyset page of the filtered rows, newest (highest id) first: the rows
+        older than `before_id`, or newer than `after_id`, or the newest ones.
+        Reads `limit + 1` rows at most, so it costs the same on any page when
+        an index covers (filters..., id).
+        """
+        filter_dict = filters.model_dump(exclude_unset=True)
+        query = select(self.model).filter_by(**filter_dict).options(*self._load_options(load)).limit(limit + 1)
+        if after_id is not None:
+            query = query.where(self.model.id > after_id).order_by(self.model.id.asc())
+        else:
+            if before_id is not None:
+                query = query.where(self.model.id < before_id)
+            query = query.order_by(self.model.id.desc())
+        try:
+            records = list((await self._session.scalars(query)).all())
+        except SQLAlchemyError as e:
+            logger.error(f"Error in find_page with filters {filter_dict}: {e}")
+            raise
+
+        more = len(records) > limit
+        records = records[:limit]
+        if after_id is not None:
+            page = Page(list(reversed(records)), has_newer=more, has_older=True)
+        else:
+            page = Page(records, has_newer=before_id is not None, has_older=more)
+        dao_log("Page of {} {} rows by filters {}.", len(records), self.model.__name__, filter_dict)
+        return page
+
     async def add(self, data: BaseModel) -> Optional[T]:
         data_dict = data.model_dump(exclude_unset=True)
-        logger.info(f"Add data to {self.model.__name__} table: {data_dict}")
         new_instance = self.model(**data_dict)
         self._session.add(new_instance)
         try:
-            await self._session.commit()
-            logger.info(f"Data {self.model.__name__} success added.")
-            await self._session.refresh(new_instance)
+            # Flush sends one INSERT ... RETURNING with the PK and server defaults
+            await self._commit()
+            dao_log("Added {} row: {}", self.model.__name__, data_dict)
+            if not self._session.bind.dialect.insert_returning:
+                await self._session.refresh(new_instance)
         except SQLAlchemyError as e:
-            await self._session.rollback()
+            await self._rollback()
             logger.error(f"Error with add row to table: {e}")
             raise e
         return new_instance
@@ -113,14 +271,13 @@ class BaseDAO(Generic[T]):
     async def add_many(self, instances: List[BaseModel]) -> List[T]:
         # Save many values in the table
         values_list = [item.model_dump(exclude_unset=True) for item in instances]
-        logger.info(f"Saving few rows {self.model.__name__}. Count: {len(values_list)}")
         new_instances = [self.model(**values) for values in values_list]
         self._session.add_all(new_instances)
         try:
-            await self._session.commit()
-            logger.info(f"Success saved {len(new_instances)} rows.")
+            await self._commit()
+            dao_log("Saved {} rows {}.", len(new_instances), self.model.__name__)
         except SQLAlchemyError as e:
-            await self._session.rollback()
+            await self._rollback()
             logger.error(f"Error in many saving: {e}")
             raise e
         return new_instances
@@ -128,26 +285,98 @@ class BaseDAO(Generic[T]):
     async def update(self, filters: BaseModel, values: BaseModel) -> int:
         filter_dict = filters.model_dump(exclude_unset=True)
         values_dict = values.model_dump(exclude_unset=True)
-        logger.info(f"Updating columns {self.model.__name__} by filter: {filter_dict} with options: {values_dict}")
         query = (
             sqlalchemy_update(self.model)
             .where(*[getattr(self.model, k) == v for k, v in filter_dict.items()])
             .values(**values_dict)
-            .execution_options(synchronize_session="fetch")
         )
         try:
+            # Loaded objects are synchronized in Python, no SELECT before the UPDATE
             result = await self._session.execute(query)
-            await self._session.commit()
-            logger.info(f"Updated {result.rowcount} rows.")
+            await self._commit()
+            dao_log("Updated {} rows {} by filters {} with {}.", result.rowcount, self.model.__name__, filter_dict, values_dict)
             return result.rowcount
         except SQLAlchemyError as e:
-
+            await self._rollback()
             logger.error(f"Error in Update method: {e}")
             raise e
 
+    async def update_returning(self, filters: BaseModel, values: BaseModel) -> List[T]:
+        """UPDATE and get the updated rows back in the same round trip."""
+        filter_dict = filters.model_dump(exclude_unset=True)
+        values_dict = values.model_dump(exclude_unset=True)
+        where = [getattr(self.model, k) == v for k, v in filter_dict.items()]
+        query = sqlalchemy_update(self.model).where(*where).values(**values_dict)
+        try:
+            if self._session.bind.dialect.update_returning:
+                result = await self._session.scalars(
+                    query.returning(self.model), execution_options={"populate_existing": True}
+                )
+                records = result.all()
+            else:
+                await self._session.execute(query)
+                records = (await self._session.scalars(select(self.model).where(*where))).all()
+            await self._commit()
+            dao_log("Updated {} rows {} by filters {} with {}.", len(records), self.model.__name__, filter_dict, values_dict)
+            return records
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error in update_returning method: {e}")
+            raise e
+
+    async def upsert(self, data: dict, conflict: Sequence[str]) -> tuple[T, bool]:
+        """
+        Insert the row, or update it when it conflicts on the `conflict` columns
+        (they must be covered by a unique index or constraint).
+        Returns the row and whether it was inserted. PostgreSQL does both in one
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING (xmax = 0); other dialects
+        run INSERT ... ON CONFLICT DO NOTHING and an UPDATE if nothing was inserted.
+        """
+        insert = dialect_insert(self._session, self.model).values(**data)
+        values = {key: value for key, value in data.items() if key not in conflict}
+        where = [getattr(self.model, key) == data[key] for key in conflict]
+        options = {"populate_existing": True}
+        try:
+            if self._session.bind.dialect.name == "postgresql":
+                query = insert.on_conflict_do_update(
+                    index_elements=list(conflict),
+                    set_={**{key: getattr(insert.excluded, key) for key in values}, "updated_at": func.now()},
+                )
+                # xmax is only set on a row version written by an UPDATE
+                row = (await self._session.execute(
+                    query.returning(self.model, literal_column("xmax = 0")), execution_options=options
+                )).one()
+                record, inserted = row[0], bool(row[1])
+            else:
+                query = insert.on_conflict_do_nothing(index_elements=list(conflict))
+                update = sqlalchemy_update(self.model).where(*where).values(**values, updated_at=func.now())
+                dialect = self._session.bind.dialect
+                if dialect.insert_returning and dialect.update_returning:
+                    record = (await self._session.scalars(
+                        query.returning(self.model), execution_options=options
+                    )).one_or_none()
+                    inserted = record is not None
+                    if not inserted:
+                        record = (await self._session.scalars(
+                            update.returning(self.model), execution_options=options
+                        )).one()
+                else:
+                    inserted = (await self._session.execute(query)).rowcount == 1
+                    if not inserted:
+                        await self._session.execute(update.execution_options(synchronize_session=False))
+                    record = (await self._session.scalars(
+                        select(self.model).where(*where).execution_options(**options)
+                    )).one()
+            await self._commit()
+            dao_log("Upserted {} row ({}): {}", self.model.__name__, "inserted" if inserted else "updated", data)
+            return record, inserted
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error in upsert method: {e}")
+            raise e
+
     async def delete(self, filters: BaseModel):
         filter_dict = filters.model_dump(exclude_unset=True)
-        logger.info(f"Delete method {self.model.__name__} by filter: {filter_dict}")
         if not filter_dict:
             logger.error("Required minimum one argument for delete")
             raise ValueError("Required minimum one argument for delete")
@@ -155,10 +384,10 @@ class BaseDAO(Generic[T]):
         query = sqlalchemy_delete(self.model).filter_by(**filter_dict)
         try:
             result = await self._session.execute(query)
-            await self._session.commit()
-            logger.info(f"Deleted {result.rowcount}.")
+            await self._commit()
+            dao_log("Deleted {} rows {} by filters {}.", result.rowcount, self.model.__name__, filter_dict)
             return result.rowcount
         except SQLAlchemyError as e:
-            await self._session.rollback()
+            await self._rollback()
             logger.error(f"Error when tried delete row: {e}")
             raise e
@@ -1,16 +1,84 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Sequence
+
 from loguru import logger
 from pydantic import BaseModel, ValidationError
+from sqlalchemy import Row, delete, func, literal, true, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
 
-from bot.database.models import User, Route, Payment, Booking, Offer, MonthlyPass
-from bot.database.dao.base import BaseDAO
+from bot.config import config
+from bot.database.models import (
+    User, Route, Payment, Booking, Offer, MonthlyPass, Campaign, CampaignMessage, ScheduledJob,
+    ProcessedUpdate,
+)
+from bot.database.dao.base import BaseDAO, dao_log, dialect_insert
 from bot.database.schemas.booking import BookingBase, BookingByStatus, BookingsByUser
-from bot.database.schemas.route import RouteFind, RouteCostUpdate
-from bot.database.schemas.offers import OfferName, OffersCreate, OffersBase
+from bot.database.schemas.route import RouteFind, RouteCostUpdate, RouteCreate, RouteInfo
+from bot.database.schemas.offers import OfferInfo, OffersCreate
 from bot.database.schemas.monthly_pass import PassCreate
-from bot.database.schemas.user import UserUpdate, UserBase
+from bot.database.schemas.user import UserAsset, UserUpdate, UserBase
+from bot.services.cache import TTLCache
+
+# Routes change a few times a day, prices are read on every quantity callback
+route_cache = TTLCache(ttl=config.ROUTE_CACHE_TTL)
+# One entry: the offers catalog, read on every /order_offers and replaced on create_or_update_offer
+offer_cache = TTLCache(ttl=config.OFFER_CACHE_TTL, maxsize=1)
+
+
+class InvoiceMixin:
+    """
+    CryptoBot invoice lookups for DAOs whose model has `status`, `user_id`
+    and `payment_id` (bookings, monthly passes). Mixed into a BaseDAO.
+    """
+
+    async def find_by_invoice(self, invoice_id: int) -> list[Row]:
+        """(id, user_id, status) of every record paid with the invoice, whatever its status."""
+        query = (
+            select(self.model.id, self.model.user_id, self.model.status)
+            .join(Payment, self.model.payment_id == Payment.id)
+            .where(Payment.invoice_id == invoice_id)
+            .order_by(self.model.id)
+        )
+        try:
+            return list((await self._session.execute(query)).all())
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching {self.model.__tablename__} of invoice {invoice_id}: {e}")
+            raise
+
+    async def mark_paid_by_invoice(self, invoice_id: int) -> list[Row]:
+        """
+        Mark the unpaid records of a CryptoBot invoice as paid.
+        Returns (id, user_id) of the rows that changed, empty if they were
+        already paid, so a redelivered notification changes nothing.
+        """
+        payments = select(Payment.id).where(Payment.invoice_id == invoice_id)
+        where = (self.model.payment_id.in_(payments.scalar_subquery()), self.model.status == "unpaid")
+        columns = (self.model.id, self.model.user_id)
+        try:
+            if self._session.bind.dialect.update_returning:
+                rows = (await self._session.execute(
+                    update(self.model)
+                    .where(*where)
+                    .values(status="paid")
+                    .returning(*columns)
+                    .execution_options(synchronize_session=False)
+                )).all()
+            else:
+                rows = (await self._session.execute(select(*columns).where(*where))).all()
+                await self._session.execute(
+                    update(self.model)
+                    .where(self.model.id.in_([row.id for row in rows]), self.model.status == "unpaid")
+                    .values(status="paid")
+                    .execution_options(synchronize_session=False)
+                )
+            await self._commit()
+            dao_log("Invoice {} paid {} {}.", invoice_id, len(rows), self.model.__tablename__)
+            return list(rows)
+        except SQLAlchemyError as e:
+            logger.error(f"Error marking {self.model.__tablename__} of invoice {invoice_id} paid: {e}")
+            await self._rollback()
+            raise
 
 
 class OfferDAO(BaseDAO[Offer]):
@@ -19,20 +87,10 @@ class OfferDAO(BaseDAO[Offer]):
     async def create_or_update_offer(self, data: dict) -> str:
         try:
             offer_obj = OffersCreate(**data)
-
-            offer = await self.find_one_or_none(
-                filters=OfferName(name=offer_obj.name)
-            )
-
-            if offer:
-                await self.update(
-                    filters=OffersBase(id=offer.id),
-                    values=offer_obj
-                )
-                return "update"
-
-            await self.add(offer_obj)
-            return "Create"
+            # One INSERT ... ON CONFLICT (name) DO UPDATE ... RETURNING
+            _, inserted = await self.upsert(offer_obj.model_dump(mode="json"), conflict=("name",))
+            self._after_transaction(offer_cache.invalidate)
+            return "Create" if inserted else "update"
         except ValidationError as e:
             logger.error(f"Pydantic error in create_or_update_offer: {e}", exc_info=True)
             raise
@@ -43,8 +101,23 @@ class OfferDAO(BaseDAO[Offer]):
             logger.error(f"Unexpected error in create_or_update_offer: {e}", exc_info=True)
             raise
 
+    async def get_catalog(self) -> tuple[OfferInfo, ...]:
+        """Immutable snapshot of all offers ordered by id, read through `offer_cache`."""
+        found, catalog = offer_cache.get("catalog")
+        if found:
+            return catalog
+        try:
+            result = await self._session.scalars(select(self.model).order_by(self.model.id))
+            catalog = tuple(OfferInfo.model_validate(offer) for offer in result.all())
+            offer_cache.set("catalog", catalog)
+            dao_log("Offers catalog rebuilt with {} offers.", len(catalog))
+            return catalog
+        except SQLAlchemyError as e:
+            logger.error(f"Error loading the offers catalog: {e}")
+            raise
 
-class MonthlyPassDAO(BaseDAO[MonthlyPass]):
+
+class MonthlyPassDAO(InvoiceMixin, BaseDAO[MonthlyPass]):
     model = MonthlyPass
 
     async def add_order(self, data: dict):
@@ -92,11 +165,31 @@ class UserDAO(BaseDAO[User]):
             logger.error(f"Unexpected error in update_details: {e}", exc_info=True)
             raise
 
+    async def get_asset(self, user_id: int) -> str | None:
+        """
+        Asset chosen with /currency. Not cached in the process: a primary key
+        lookup in the update's session is cheap, and a user must never be
+        invoiced in an asset they already changed on another instance.
+        """
+        try:
+            return await self._session.scalar(select(self.model.asset).where(self.model.id == user_id))
+        except SQLAlchemyError as e:
+            logger.error(f"DB error in get_asset for user {user_id}: {e}", exc_info=True)
+            raise
+
+    async def set_asset(self, user_id: int, asset: str) -> int:
+        return await self.update(filters=UserBase(id=user_id), values=UserAsset(asset=asset))
+
 
 class RouteDAO(BaseDAO[Route]):
     model = Route
 
-    async def get_route(self, departure: str, destination: str) -> Route:
+    async def get_route(self, departure: str, destination: str) -> RouteInfo | None:
+        """Read-through lookup in `route_cache`; misses are cached too."""
+        key = (departure, destination)
+        found, route = route_cache.get(key)
+        if found:
+            return route
         try:
             result = await self.find_one_or_none(
                 filters=RouteFind(
@@ -104,7 +197,9 @@ class RouteDAO(BaseDAO[Route]):
                     destination=destination
                 )
             )
-            return result
+            route = RouteInfo.model_validate(result) if result else None
+            route_cache.set(key, route)
+            return route
         except ValidationError as e:
             logger.error(f"Pydantic error in get_route by names: {departure} -> {destination}: {e}", exc_info=True)
             raise
@@ -112,12 +207,30 @@ class RouteDAO(BaseDAO[Route]):
             logger.error(f"DB Error fetching route by names {departure} -> {destination}: {e}", exc_info=True)
             raise
 
+    async def add(self, data: BaseModel) -> Route:
+        route = await super().add(data)
+        key = (route.departure, route.destination)
+        self._after_transaction(lambda: route_cache.invalidate(key))
+        return route
+
+    async def upsert_route(self, data: RouteCreate) -> tuple[Route, bool]:
+        """The route and whether it was added (False: an existing route got the new cost)."""
+        try:
+            route, inserted = await self.upsert(data.model_dump(), conflict=("departure", "destination"))
+            key = (route.departure, route.destination)
+            self._after_transaction(lambda: route_cache.invalidate(key))
+            return route, inserted
+        except SQLAlchemyError as e:
+            logger.error(f"Error upsert route {data.departure} -> {data.destination}: {e}")
+            raise
+
     async def update_cost(self, dep: str, dest: str, cost: float):
         try:
             result = await self.update(
                 filters=RouteFind(departure=dep, destination=dest),
                 values=RouteCostUpdate(cost=cost)
             )
+            self._after_transaction(lambda: route_cache.invalidate((dep, dest)))
             return result
         except ValidationError as e:
             logger.error(f"Pydantic error in update_cost by names: {dep} -> {dest}: {e}", exc_info=True)
@@ -130,15 +243,29 @@ class RouteDAO(BaseDAO[Route]):
 class PaymentDAO(BaseDAO[Payment]):
     model = Payment
 
+    async def get_invoice_ids(self, payment_ids: Sequence[int]) -> list[int]:
+        """CryptoBot invoice ids of the given payments, manual payments are skipped."""
+        if not payment_ids:
+            return []
+        try:
+            result = await self._session.scalars(
+                select(self.model.invoice_id)
+                .where(self.model.id.in_(payment_ids), self.model.invoice_id.is_not(None))
+            )
+            return list(result.all())
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching invoice ids of payments {payment_ids}: {e}")
+            raise
+
 
-class BookingDAO(BaseDAO[Booking]):
+class BookingDAO(InvoiceMixin, BaseDAO[Booking]):
     model = Booking
 
     async def get_booking_paid(self, user_id: int) -> list[Booking]:
-        logger.info(f"Get paid booking by User_ID: {user_id}")
         try:
             result = await self.find_all(
-                BookingsByUser(user_id=user_id, status="paid")
+                BookingsByUser(user_id=user_id, status="paid"),
+                load=("route",)
             )
             return result
         except ValidationError as e:
@@ -148,32 +275,132 @@ class BookingDAO(BaseDAO[Booking]):
             logger.error(f"Error fetching last booking for user {user_id}: {e}")
             raise
 
-    async def find_last_by_user(self, user_id: int) -> Booking | None:
-        logger.info(f"Get last booking by User_ID: {user_id}")
+    async def find_last_by_user(self, user_id: int, load: Sequence[str] = ()) -> Booking | None:
         try:
-            query = select(self.model).order_by(self.model.id.desc()).limit(1)
+            query = (
+                select(self.model)
+                .where(self.model.user_id == user_id)
+                .options(*self._load_options(load))
+                .order_by(self.model.id.desc())
+                .limit(1)
+            )
             result = await self._session.execute(query)
             record = result.scalar_one_or_none()
-            log_message = f"Record the last booking of user_id:{user_id} {'found' if record else 'not found'}."
-            logger.info(log_message)
+            dao_log("Last booking of user_id {} {}.", user_id, "found" if record else "not found")
             return record
         except SQLAlchemyError as e:
             logger.error(f"Error fetching last booking for user {user_id}: {e}")
             raise
 
+    async def find_pending_invoices(self) -> list[Row]:
+        """Unpaid bookings with a CryptoBot invoice: (id, user_id, created_at, invoice_id) rows."""
+        try:
+            query = (
+                select(self.model.id, self.model.user_id, self.model.created_at, Payment.invoice_id)
+                .join(Payment, self.model.payment_id == Payment.id)
+                .where(self.model.status == "unpaid", Payment.invoice_id.is_not(None))
+            )
+            result = await self._session.execute(query)
+            return list(result.all())
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching bookings with pending invoices: {e}")
+            raise
+
+    async def set_status_many(self, book_ids: list[int], status: str) -> list[Row]:
+        """
+        Move many unpaid bookings to `status` with a single UPDATE.
+        Returns (id, user_id) of the bookings that changed: one paid meanwhile
+        (e.g. by the CryptoBot webhook) is left alone and not returned.
+        """
+        if not book_ids:
+            return []
+        where = (self.model.id.in_(book_ids), self.model.status == "unpaid")
+        columns = (self.model.id, self.model.user_id)
+        try:
+            if self._session.bind.dialect.update_returning:
+                rows = (await self._session.execute(
+                    update(self.model)
+                    .where(*where)
+                    .values(status=status)
+                    .returning(*columns)
+                    .execution_options(synchronize_session=False)
+                )).all()
+            else:
+                rows = (await self._session.execute(select(*columns).where(*where))).all()
+                await self._session.execute(
+                    update(self.model)
+                    .where(self.model.id.in_([row.id for row in rows]), self.model.status == "unpaid")
+                    .values(status=status)
+                    .execution_options(synchronize_session=False)
+                )
+            await self._commit()
+            dao_log("Set status {} for {} bookings.", status, len(rows))
+            return list(rows)
+        except SQLAlchemyError as e:
+            logger.error(f"Error when setting status {status} for bookings {book_ids}: {e}")
+            await self._rollback()
+            raise
+
+    async def stream_export(
+            self,
+            status: str | None = None,
+            date_from: datetime | None = None,
+            date_to: datetime | None = None,
+            batch_size: int = 500,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Yield bookings joined with route, user and payment columns in batches.
+        Rows are plain tuples fetched through a server-side cursor, so memory
+        stays bounded by `batch_size` whatever the table size.
+        """
+        query = (
+            select(
+                self.model.id,
+                self.model.created_at,
+                self.model.status,
+                self.model.date,
+                self.model.seat_type,
+                self.model.quantity,
+                self.model.price,
+                Route.departure,
+                Route.destination,
+                self.model.user_id,
+                User.username,
+                User.full_name,
+                Payment.payment_method,
+                Payment.invoice_id,
+            )
+            .join(Route, self.model.route_id == Route.id)
+            .outerjoin(User, self.model.user_id == User.id)
+            .outerjoin(Payment, self.model.payment_id == Payment.id)
+            .order_by(self.model.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if status:
+            query = query.where(self.model.status == status)
+        if date_from:
+            query = query.where(self.model.created_at >= date_from)
+        if date_to:
+            query = query.where(self.model.created_at < date_to)
+
+        try:
+            result = await self._session.stream(query)
+            async for partition in result.partitions():
+                yield partition
+        except SQLAlchemyError as e:
+            logger.error(f"Error when streaming bookings for export: {e}")
+            raise
 
     async def delete_book(self, book_id: int):
         try:
             result = await self.delete(filters=BookingBase(id=book_id))
-            logger.info(f"Deleted {result.rowcount} records.")
-            await self._session.flush()
-            return result.rowcount
+            return result
         except ValidationError as e:
             logger.error(f"Pydantic error in delete_book by book_id: {book_id}: {e}", exc_info=True)
             raise
         except SQLAlchemyError as e:
             logger.error(f"Error when removing records: {e}")
-            await self._session.rollback()
+            await self._rollback()
             raise
 
     async def mark_paid(self, book_id: int):
@@ -182,14 +409,13 @@ class BookingDAO(BaseDAO[Booking]):
                 filters=BookingBase(id=book_id),
                 values=BookingByStatus(status="paid")
             )
-            await self._session.flush()
-            return result.rowcount
+            return result
         except ValidationError as e:
             logger.error(f"Pydantic error in mark_paid by book_id: {book_id}: {e}", exc_info=True)
             raise
         except SQLAlchemyError as e:
             logger.error(f"Error when canceling a book with ID {book_id}: {e}")
-            await self._session.rollback()
+            await self._rollback()
             raise
 
     async def mark_cancel(self, book_id: int):
@@ -198,12 +424,251 @@ class BookingDAO(BaseDAO[Booking]):
                 filters=BookingBase(id=book_id),
                 values=BookingByStatus(status="canceled")
             )
-            await self._session.flush()
-            return result.rowcount
+            return result
         except ValidationError as e:
             logger.error(f"Pydantic error in mark_cancel by book_id: {book_id}: {e}", exc_info=True)
             raise
         except SQLAlchemyError as e:
             logger.error(f"Error when canceling a book with ID {book_id}: {e}")
-            await self._session.rollback()
+            await self._rollback()
+            raise
+
+
+class CampaignDAO(BaseDAO[Campaign]):
+    model = Campaign
+
+    async def save(self, name: str, steps: list[dict]) -> Campaign:
+        """Create or replace the campaign template `name`."""
+        campaign, _ = await self.upsert({"name": name, "steps": steps}, conflict=("name",))
+        return campaign
+
+    async def find_one_or_none_by_name(self, name: str) -> Campaign | None:
+        try:
+            result = await self._session.scalars(select(self.model).where(self.model.name == name))
+            return result.one_or_none()
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching campaign {name}: {e}")
+            raise
+
+    async def get_many(self, campaign_ids: Sequence[int]) -> dict[int, Campaign]:
+        try:
+            result = await self._session.scalars(select(self.model).where(self.model.id.in_(campaign_ids)))
+            return {campaign.id: campaign for campaign in result.all()}
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching campaigns {campaign_ids}: {e}")
+            raise
+
+    async def delete_finished(self, campaign_ids: Sequence[int], prefix: str) -> int:
+        """Delete the campaigns named `prefix...` among `campaign_ids` that no user is still in."""
+        if not campaign_ids:
+            return 0
+        pending = select(CampaignMessage.id).where(CampaignMessage.campaign_id == self.model.id)
+        try:
+            result = await self._session.execute(
+                delete(self.model)
+                .where(
+                    self.model.id.in_(campaign_ids),
+                    self.model.name.startswith(prefix, autoescape=True),
+                    ~pending.exists(),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await self._commit()
+            dao_log("Deleted {} finished campaigns.", result.rowcount)
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error deleting finished campaigns {campaign_ids}: {e}")
+            raise
+
+
+class CampaignMessageDAO(BaseDAO[CampaignMessage]):
+    model = CampaignMessage
+
+    # Broadcast audiences, each a SELECT of user ids
+    segments = {
+        "all": select(User.id),
+        "customers": select(Booking.user_id).where(Booking.status == "paid").distinct(),
+        "pass_holders": select(MonthlyPass.user_id).where(MonthlyPass.status == "paid").distinct(),
+    }
+
+    async def enroll(self, user_id: int, campaign_id: int, due_at: datetime) -> None:
+        """Start a campaign for one user; a user already in it is left as is."""
+        query = dialect_insert(self._session, self.model).values(
+            user_id=user_id, campaign_id=campaign_id, step=0, due_at=due_at
+        ).on_conflict_do_nothing(index_elements=["user_id", "campaign_id"])
+        try:
+            await self._session.execute(query)
+            await self._commit()
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error enrolling user {user_id} in campaign {campaign_id}: {e}")
+            raise
+
+    async def enroll_segment(self, segment: str, campaign_id: int, due_at: datetime) -> int:
+        """Enroll a whole segment with one INSERT ... SELECT."""
+        users = self.segments[segment].subquery()
+        query = dialect_insert(self._session, self.model).from_select(
+            ["user_id", "campaign_id", "step", "due_at"],
+            # WHERE true: SQLite cannot parse ON CONFLICT right after a bare SELECT
+            select(users.c[0], literal(campaign_id), literal(0), literal(due_at)).where(true()),
+        ).on_conflict_do_nothing(index_elements=["user_id", "campaign_id"])
+        try:
+            result = await self._session.execute(query)
+            await self._commit()
+            dao_log("Enrolled {} users of segment {} in campaign {}.", result.rowcount, segment, campaign_id)
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error enrolling segment {segment} in campaign {campaign_id}: {e}")
+            raise
+
+    async def find_due(self, now: datetime, limit: int = 500) -> list[CampaignMessage]:
+        """Oldest due messages; rows locked by another node are skipped."""
+        try:
+            result = await self._session.scalars(
+                select(self.model)
+                .where(self.model.due_at <= now)
+                .order_by(self.model.due_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            return list(result.all())
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching due campaign messages: {e}")
+            raise
+
+    async def advance(self, next_steps: list[dict], finished_ids: list[int]) -> None:
+        """Move rows to their next step (by primary key) and drop finished ones."""
+        try:
+            if next_steps:
+                await self._session.execute(update(self.model), next_steps)
+            if finished_ids:
+                await self._session.execute(
+                    delete(self.model)
+                    .where(self.model.id.in_(finished_ids))
+                    .execution_options(synchronize_session=False)
+                )
+            await self._commit()
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error advancing campaign messages: {e}")
+            raise
+
+
+class ScheduledJobDAO(BaseDAO[ScheduledJob]):
+    model = ScheduledJob
+
+    async def schedule(
+            self,
+            job_id: str,
+            func_ref: str,
+            next_run_at: datetime,
+            interval_seconds: int | None = None,
+            replace: bool = True,
+    ) -> None:
+        """
+        Store a job. An existing job is replaced, or with `replace=False` only
+        gets the new function and interval and keeps its next run, so every
+        instance can register the interval jobs on startup.
+        """
+        query = dialect_insert(self._session, self.model).values(
+            id=job_id, func=func_ref, interval_seconds=interval_seconds, next_run_at=next_run_at
+        )
+        updated = {"func": query.excluded.func, "interval_seconds": query.excluded.interval_seconds}
+        if replace:
+            updated["next_run_at"] = query.excluded.next_run_at
+        query = query.on_conflict_do_update(index_elements=["id"], set_=updated)
+        try:
+            await self._session.execute(query)
+            await self._commit()
+            dao_log("Scheduled job {} ({}) at {}.", job_id, func_ref, next_run_at)
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error scheduling job {job_id}: {e}")
+            raise
+
+    async def find_due(self, now: datetime, limit: int = 100) -> list[Row]:
+        try:
+            result = await self._session.execute(
+                select(self.model.id, self.model.func, self.model.interval_seconds, self.model.next_run_at)
+                .where(self.model.next_run_at <= now)
+                .order_by(self.model.next_run_at)
+                .limit(limit)
+            )
+            return list(result.all())
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching due jobs: {e}")
+            raise
+
+    async def next_run_at(self) -> datetime | None:
+        try:
+            return await self._session.scalar(select(func.min(self.model.next_run_at)))
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching the next job run: {e}")
+            raise
+
+    async def claim(self, job: Row, now: datetime, instance: str) -> bool:
+        """
+        Take one due run of `job` for this instance. The UPDATE (or DELETE for
+        a one-off job) only matches while the job is still due, so of several
+        instances claiming the same run exactly one gets a row back.
+        """
+        still_due = (self.model.id == job.id, self.model.next_run_at <= now)
+        if job.interval_seconds:
+            # Runs missed while every instance was down are coalesced into one
+            interval = timedelta(seconds=job.interval_seconds)
+            next_run_at = job.next_run_at + interval * ((now - job.next_run_at) // interval + 1)
+            query = (
+                update(self.model)
+                .where(*still_due)
+                .values(next_run_at=next_run_at, last_run_by=instance)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            query = delete(self.model).where(*still_due).execution_options(synchronize_session=False)
+        try:
+            result = await self._session.execute(query)
+            await self._commit()
+            return result.rowcount == 1
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error claiming job {job.id}: {e}")
+            raise
+
+
+class ProcessedUpdateDAO(BaseDAO[ProcessedUpdate]):
+    model = ProcessedUpdate
+
+    async def claim(self, update_id: int) -> bool:
+        """Record the update; False if some instance already did."""
+        query = dialect_insert(self._session, self.model).values(
+            update_id=update_id
+        ).on_conflict_do_nothing(index_elements=["update_id"])
+        try:
+            result = await self._session.execute(query)
+            await self._commit()
+            return result.rowcount == 1
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error claiming update {update_id}: {e}")
+            raise
+
+    async def release(self, update_id: int) -> None:
+        try:
+            await self._session.execute(delete(self.model).where(self.model.update_id == update_id))
+            await self._commit()
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error releasing update {update_id}: {e}")
+            raise
+
+    async def delete_older_than(self, moment: datetime) -> int:
+        try:
+            result = await self._session.execute(delete(self.model).where(self.model.created_at < moment))
+            await self._commit()
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await self._rollback()
+            logger.error(f"Error deleting processed updates: {e}")
             raise
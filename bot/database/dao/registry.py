@@ -0,0 +1,109 @@
+from typing import Dict, Iterator, Optional, Type
+from collections.abc import Mapping
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from bot.database.dao.base import UNIT_FAILED, BaseDAO
+from bot.database.dao.dao import (
+    UserDAO, BookingDAO, PaymentDAO, RouteDAO, OfferDAO, MonthlyPassDAO, CampaignDAO, CampaignMessageDAO
+)
+
+
+class UnitOfWorkFailed(Exception):
+    """A DAO write of the unit failed earlier, the whole unit was rolled back."""
+
+
+class DAORegistry(Mapping):
+    """
+    Lazy provider of the session and DAOs for a single update.
+
+    Nothing is allocated until a handler actually asks for it: the session is
+    opened on the first access to `session` (or to any DAO) and every DAO is
+    built once on first lookup. Handlers keep using `dao["booking"]`;
+    `dao.booking` works as well.
+
+    With `unit_of_work=True` the DAOs only flush and the registry commits
+    once when the block exits cleanly (or rolls back on an exception, or if
+    a DAO write failed even though the handler caught the error), so every
+    write of an update lands in a single transaction or none does. Handlers that
+    must persist before a side effect (a message, an invoice) call
+    `await dao.commit()` explicitly.
+    """
+
+    daos: Dict[str, Type[BaseDAO]] = {
+        "user": UserDAO,
+        "booking": BookingDAO,
+        "payment": PaymentDAO,
+        "route": RouteDAO,
+        "offer": OfferDAO,
+        "pass": MonthlyPassDAO,
+        "campaign": CampaignDAO,
+        "campaign_message": CampaignMessageDAO,
+    }
+
+    def __init__(self, session_pool: async_sessionmaker[AsyncSession], unit_of_work: bool = False):
+        self._session_pool = session_pool
+        self.unit_of_work = unit_of_work
+        self._session: Optional[AsyncSession] = None
+        self._instances: Dict[str, BaseDAO] = {}
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_pool()
+        return self._session
+
+    @property
+    def is_opened(self) -> bool:
+        return self._session is not None
+
+    def __getitem__(self, key: str) -> BaseDAO:
+        instance = self._instances.get(key)
+        if instance is None:
+            instance = self.daos[key](self.session, autocommit=not self.unit_of_work)
+            self._instances[key] = instance
+        return instance
+
+    def __getattr__(self, name: str) -> BaseDAO:
+        if name.startswith("_") or name not in self.daos:
+            raise AttributeError(name)
+        return self[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.daos)
+
+    def __len__(self) -> int:
+        return len(self.daos)
+
+    async def commit(self):
+        if self._session is not None:
+            if self._session.info.pop(UNIT_FAILED, False):
+                await self._session.rollback()
+                raise UnitOfWorkFailed("A write of this unit of work failed, it was rolled back")
+            await self._session.commit()
+
+    async def rollback(self):
+        if self._session is not None:
+            self._session.info.pop(UNIT_FAILED, None)
+            await self._session.rollback()
+
+    async def close(self):
+        """Return the connection to the pool if the session was ever opened."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._instances.clear()
+
+    async def __aenter__(self) -> "DAORegistry":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if self._session is not None and self._session.in_transaction():
+                failed = self._session.info.pop(UNIT_FAILED, False)
+                if exc_type is None and self.unit_of_work and not failed:
+                    await self._session.commit()
+                else:
+                    await self._session.rollback()
+        finally:
+            await self.close()
@@ -3,12 +3,13 @@ from datetime import datetime
 from decimal import Decimal
 from sqlalchemy import inspect, TIMESTAMP, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, AsyncSession
 from loguru import logger
 
 from bot.config import config
+from bot.database.engine import create_engine_from_config
 
-engine = create_async_engine(url=config.DB_URL, echo=True)
+engine = create_engine_from_config(config)
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -1,12 +1,15 @@
-from datetime import date
+from datetime import date, datetime
 from sqlalchemy import (
     BigInteger,
+    TIMESTAMP,
     Integer,
     String,
     Text,
     Float,
     Date,
     ForeignKey,
+    Index,
+    JSON,
     UniqueConstraint,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -24,6 +27,7 @@ class User(Base):
     full_name: Mapped[str | None] = mapped_column(String, nullable=True)
     age: Mapped[int] = mapped_column(Integer, nullable=True)
     zip_code: Mapped[str] = mapped_column(String, nullable=True)
+    asset: Mapped[str | None] = mapped_column(String, nullable=True)  # chosen with /currency
 
     bookings: Mapped[list["Booking"]] = relationship(
         "Booking", back_populates="user", cascade="all, delete-orphan"
@@ -62,6 +66,8 @@ class Payment(Base):
         "MonthlyPass", back_populates="payment", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (Index("ix_payments_invoice_id", "invoice_id"),)  # CryptoBot webhook
+
 
 class Booking(Base):
     __tablename__ = "bookings"
@@ -81,6 +87,13 @@ class Booking(Base):
     route: Mapped["Route"] = relationship("Route", back_populates="bookings")
     payment: Mapped["Payment"] = relationship("Payment", back_populates="bookings")
 
+    __table_args__ = (
+        Index("ix_bookings_user_id", "user_id", "id"),  # find_last_by_user
+        Index("ix_bookings_user_status", "user_id", "status", "id"),  # get_booking_paid, find_page
+        Index("ix_bookings_status_created", "status", "created_at"),  # cancel_expired
+        Index("ix_bookings_payment_status", "payment_id", "status"),  # mark_paid_by_invoice
+    )
+
 
 class Offer(Base):
     __tablename__ = "offers"
@@ -96,6 +109,8 @@ class Offer(Base):
         "MonthlyPass", back_populates="offer", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (Index("ix_offers_name", "name", unique=True),)
+
 
 class MonthlyPass(Base):
     __tablename__ = "monthly_passes"
@@ -111,3 +126,66 @@ class MonthlyPass(Base):
     user: Mapped["User"] = relationship("User", back_populates="monthly_passes")
     payment: Mapped["Payment"] = relationship("Payment", back_populates="monthly_passes")
     offer: Mapped["Offer"] = relationship("Offer", back_populates="monthly_passes")
+
+    __table_args__ = (
+        Index("ix_monthly_passes_status_created", "status", "created_at"),  # cancel_expired
+        Index("ix_monthly_passes_payment_status", "payment_id", "status"),  # mark_paid_by_invoice
+        Index("ix_monthly_passes_user_status", "user_id", "status", "id"),  # find_page
+    )
+
+
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)  # built by aiogram KeyBuilder
+    state: Mapped[str | None] = mapped_column(String, nullable=True)
+    data: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+
+
+class Campaign(Base):
+    __tablename__ = "campaigns"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    steps: Mapped[list] = mapped_column(JSON, nullable=False)  # [{"delay": seconds, "text": str}, ...]
+
+    __table_args__ = (Index("ix_campaigns_name", "name", unique=True),)
+
+
+class CampaignMessage(Base):
+    """Next pending step of a campaign for one user."""
+    __tablename__ = "campaign_messages"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    campaign_id: Mapped[int] = mapped_column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), nullable=False)
+    step: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    due_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "campaign_id", name="unique_user_campaign"),
+        Index("ix_campaign_messages_due_at", "due_at"),  # dispatch_campaigns
+        Index("ix_campaign_messages_campaign_id", "campaign_id"),  # delete_finished
+    )
+
+
+class ScheduledJob(Base):
+    """A job of the JobRunner; `interval_seconds` is None for one-off jobs."""
+    __tablename__ = "scheduled_jobs"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    func: Mapped[str] = mapped_column(String, nullable=False)  # "module:qualname" of a registered coroutine
+    interval_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    next_run_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+    last_run_by: Mapped[str | None] = mapped_column(String, nullable=True)  # instance that claimed the last run
+
+    __table_args__ = (Index("ix_scheduled_jobs_next_run_at", "next_run_at"),)
+
+
+class ProcessedUpdate(Base):
+    """Telegram update ids already handled by some instance (UpdateDeduplicator)."""
+    __tablename__ = "processed_updates"
+
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+
+    __table_args__ = (Index("ix_processed_updates_created_at", "created_at"),)  # cleanup
@@ -21,3 +21,7 @@ class PassCreate(BaseModel):
 
 class PassStatus(BaseModel):
     status: str
+
+
+class PassesByUser(PassStatus):
+    user_id: int
@@ -21,3 +21,16 @@ class OfferName(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class OfferInfo(OffersBase):
+    """Immutable copy of an offer for the cached catalog."""
+    name: str
+    description: str
+    advantages: str
+    url: str
+    price: float
+
+    class Config:
+        from_attributes = True
+        frozen = True
@@ -23,3 +23,10 @@ class RouteCostUpdate(BaseModel):
 class RouteCreate(RouteFind, RouteCostUpdate):
     pass
 
+
+class RouteInfo(RouteCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+        frozen = True
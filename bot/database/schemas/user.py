@@ -23,3 +23,7 @@ class UserUpdate(BaseModel):
     full_name: str
     age: int
     zip_code: str
+
+
+class UserAsset(BaseModel):
+    asset: Optional[str] = None
@@ -0,0 +1,169 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from copy import copy
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from loguru import logger
+
+from bot.database.dao.base import dialect_insert
+from bot.database.models import FSMRecord
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+class SQLAlchemyStorage(BaseStorage):
+    """
+    FSM storage kept in the `fsm_states` table, shared by every worker and node.
+
+    Inside `buffered()` (entered by `FSMFlushMiddleware` for every update)
+    `set_state` / `set_data` only touch a dirty map owned by that update, and
+    all of them are stored with a single upsert when it ends. Outside of it
+    every write goes straight to the database. Reads of keys the current
+    update did not change always go to the database, so any worker can pick
+    up a conversation.
+    """
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker[AsyncSession],
+            key_builder: KeyBuilder | None = None,
+    ):
+        self.session_pool = session_pool
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        # Per update: concurrent updates never see or flush each other's writes
+        self._dirty: ContextVar[Optional[Dict[str, _Record]]] = ContextVar(f"fsm_dirty_{id(self)}", default=None)
+        self._engine = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "SQLAlchemyStorage":
+        """Standalone storage with its own engine, e.g. a local SQLite file for tests."""
+        engine = create_async_engine(url)
+        storage = cls(async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False), **kwargs)
+        storage._engine = engine
+        return storage
+
+    async def init(self):
+        """Create the `fsm_states` table if it does not exist yet."""
+        async with self.session_pool() as session:
+            connection = await session.connection()
+            await connection.run_sync(FSMRecord.__table__.create, checkfirst=True)
+            await session.commit()
+
+    @asynccontextmanager
+    async def buffered(self) -> AsyncIterator[None]:
+        """Buffer the writes made in this block and store them together at its end."""
+        token = self._dirty.set({})
+        try:
+            yield
+        finally:
+            try:
+                await self.flush()
+            finally:
+                self._dirty.reset(token)
+
+    async def _load(self, key: str) -> _Record:
+        dirty = self._dirty.get()
+        record = dirty.get(key) if dirty is not None else None
+        if record is not None:
+            return record
+        async with self.session_pool() as session:
+            result = await session.execute(
+                select(FSMRecord.state, FSMRecord.data).where(FSMRecord.key == key)
+            )
+            row = result.one_or_none()
+        if row is None:
+            return _Record()
+        return _Record(state=row.state, data=dict(row.data or {}))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        db_key = self.key_builder.build(key)
+        record = replace(await self._load(db_key), state=state.state if isinstance(state, State) else state)
+        await self._store(db_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self.key_builder.build(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        db_key = self.key_builder.build(key)
+        record = replace(await self._load(db_key), data=copy(data))
+        await self._store(db_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy((await self._load(self.key_builder.build(key))).data)
+
+    async def _store(self, key: str, record: _Record):
+        dirty = self._dirty.get()
+        if dirty is None:
+            await self._write({key: record})
+        else:
+            dirty[key] = record
+
+    async def flush(self) -> int:
+        """
+        Write the records buffered by the current update; cleared conversations
+        are deleted. Records leave the buffer only once they are committed.
+        """
+        dirty = self._dirty.get()
+        if not dirty:
+            return 0
+        pending = dict(dirty)
+        await self._write(pending)
+        for key, record in pending.items():
+            # Records are replaced, never mutated: a newer write stays buffered
+            if dirty.get(key) is record:
+                del dirty[key]
+        return len(pending)
+
+    async def _write(self, records: Dict[str, _Record]):
+        rows = [
+            {"key": key, "state": record.state, "data": record.data}
+            for key, record in records.items()
+            if record.state is not None or record.data
+        ]
+        cleared = [key for key, record in records.items() if record.state is None and not record.data]
+
+        async with self.session_pool() as session:
+            if rows:
+                query = dialect_insert(session, FSMRecord.__table__)
+                query = query.on_conflict_do_update(
+                    index_elements=[FSMRecord.key],
+                    set_={
+                        "state": query.excluded.state,
+                        "data": query.excluded.data,
+                        "updated_at": func.now(),
+                    },
+                )
+                await session.execute(query, rows)
+            if cleared:
+                await session.execute(delete(FSMRecord).where(FSMRecord.key.in_(cleared)))
+            await session.commit()
+
+    async def cleanup(self, ttl: timedelta) -> int:
+        """Drop conversations that were not touched for `ttl`."""
+        async with self.session_pool() as session:
+            result = await session.execute(
+                delete(FSMRecord).where(FSMRecord.updated_at < datetime.utcnow() - ttl)
+            )
+            await session.commit()
+        logger.info(f"Removed {result.rowcount} abandoned FSM conversations.")
+        return result.rowcount
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._engine is not None:
+            await self._engine.dispose()
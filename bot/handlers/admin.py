@@ -1,5 +1,5 @@
-import csv
-import io
+import os
+from datetime import datetime
 from functools import wraps
 
 from loguru import logger
@@ -7,13 +7,16 @@ from loguru import logger
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, FSInputFile
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.config import config
-from bot.database.dao.dao import BookingDAO, RouteDAO
+from bot.database.dao.dao import BookingDAO, RouteDAO, CampaignDAO, CampaignMessageDAO
+from bot.database.dao.registry import DAORegistry
 from bot.database.schemas.booking import BookingByStatus, BookingBase
 from bot.database.schemas.route import RouteCreate
 from bot.keyboards.admin import admin_general_keyboard_menu
+from bot.services.campaigns import broadcast
+from bot.services.export import export_bookings_csv
+from bot.services.outbox import MessageDispatcher
 
 admin_router = Router()
 
@@ -25,6 +28,7 @@ class ExportFailed(Exception): ...
 class PendingUploadNotFound(Exception): ...
 class BookingNotFound(Exception): ...
 class UserIdNotFound(Exception): ...
+class TicketNotDelivered(Exception): ...
 
 
 def admin_required(handler):
@@ -48,12 +52,12 @@ async def get_admin_panel(message: Message):
 
 @admin_router.message(Command("booking_id"))
 @admin_required
-async def get_booking_by_id(message: Message, session: AsyncSession, dao: dict):
+async def get_booking_by_id(message: Message, dao: DAORegistry):
     booking_dao: BookingDAO = dao["booking"]
     _, book_id = message.text.strip().split()
 
     try:
-        booking = await booking_dao.find_one_or_none_by_id(book_id)
+        booking = await booking_dao.find_one_or_none_by_id(int(book_id), load=("user", "route"))
         if not booking:
             raise BookingNotFound()
 
@@ -61,7 +65,7 @@ async def get_booking_by_id(message: Message, session: AsyncSession, dao: dict):
             f"User: @{booking.user.username} ({booking_dao})\n"
                 f"Route: {booking.route.departure} → {booking.route.destination}\n"
                 f"Quantity: {booking.quantity}\n"
-                f"Total: {booking.price} USDT",
+                f"Total: {booking.price} {config.PRICE_ASSET}",
             reply_markup=admin_general_keyboard_menu()
         )
     except BookingNotFound:
@@ -71,35 +75,48 @@ async def get_booking_by_id(message: Message, session: AsyncSession, dao: dict):
         await message.answer(f"❌ Failed to get booking {book_id}. Try /booking_id <book_id>.")
 
 
+def parse_export_args(text: str) -> dict:
+    """/export_bookings [status=paid] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [gzip]"""
+    options = {"status": None, "date_from": None, "date_to": None, "compress": False}
+    for arg in text.split()[1:]:
+        key, _, value = arg.partition("=")
+        if key == "gzip":
+            options["compress"] = True
+        elif key == "status":
+            options["status"] = value
+        elif key == "from":
+            options["date_from"] = datetime.strptime(value, "%Y-%m-%d")
+        elif key == "to":
+            options["date_to"] = datetime.strptime(value, "%Y-%m-%d")
+        else:
+            raise ValueError(f"Unknown export option: {arg}")
+    return options
+
+
 @admin_router.message(Command("export_bookings"))
 @admin_required
-async def export_paid_orders(message: Message, session: AsyncSession, dao: dict):
+async def export_paid_orders(message: Message, dao: DAORegistry):
     booking_dao: BookingDAO = dao["booking"]
+    file_path = None
 
     try:
-        # 1. Get bookings
-        bookings = await booking_dao.find_all()
-        if not bookings:
-            raise NoBookingsFound()
-
-        # 2. Prepare CSV in-memory
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=bookings[0].to_dict().keys())
-        writer.writeheader()
-        for row in bookings:
-            writer.writerow(row.to_dict())
-
-        output.seek(0)
+        try:
+            options = parse_export_args(message.text)
+        except ValueError:
+            await message.answer(
+                "❗ Usage: /export_bookings [status=paid] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [gzip]"
+            )
+            return
 
-        # 3. Save file locally (avoid open() twice)
-        file_path = "export_bookings.csv"
-        with open(file_path, "w", encoding="utf-8", newline="") as f:
-            f.write(output.read())
+        # 1. Stream bookings into a temp file
+        file_path, total = await export_bookings_csv(booking_dao, **options)
+        if not total:
+            raise NoBookingsFound()
 
-        # 4. Send document to admin
+        # 2. Send document to admin
         await message.answer_document(
-            FSInputFile(file_path),
-            caption="📦 All bookings exported."
+            FSInputFile(file_path, filename=f"export_bookings{'.csv.gz' if options['compress'] else '.csv'}"),
+            caption=f"📦 {total} bookings exported."
         )
 
     except NoBookingsFound:
@@ -107,37 +124,62 @@ async def export_paid_orders(message: Message, session: AsyncSession, dao: dict)
     except Exception as e:
         logger.error(f"Error during export_bookings: {e}")
         await message.answer("❌ Failed to export bookings. Try again later.")
+    finally:
+        if file_path:
+            os.remove(file_path)
 
 
 @admin_router.message(Command("add_route"))
 @admin_required
-async def update_routes(message: Message, session: AsyncSession, dao: dict):
+async def update_routes(message: Message, dao: DAORegistry):
     try:
         _, dep, dest, cost = message.text.strip().split()
         cost = float(cost)
         route_dao: RouteDAO = dao["route"]
-        route = route_dao.get_route(dep, dest)
-        if route:
-            await route_dao.update_cost(dep, dest, cost)
-            await message.answer(f"✅ Route {dep} → {dest} already exict! Price updated!")
-            return
-        await route_dao.add(
+        _, inserted = await route_dao.upsert_route(
             RouteCreate(departure=dep, destination=dest, cost=cost)
         )
-        await message.answer(f"✅ Route {dep} → {dest} added with price {cost} USDT.")
+        await dao.commit()
+        if not inserted:
+            await message.answer(f"✅ Route {dep} → {dest} already exict! Price updated!")
+            return
+        await message.answer(f"✅ Route {dep} → {dest} added with price {cost} {config.PRICE_ASSET}.")
     except Exception as e:
         logger.error(f"Get error in add_route method: {e}")
         await message.answer("❗ Usage: /add_route <departure> <destination> <price>")
 
 
+@admin_router.message(Command("broadcast"))
+@admin_required
+async def broadcast_message(message: Message, dao: DAORegistry):
+    segments = ", ".join(CampaignMessageDAO.segments)
+    parts = message.text.split(maxsplit=2)
+    if len(parts) < 3 or parts[1] not in CampaignMessageDAO.segments:
+        await message.answer(f"❗ Usage: /broadcast <segment> <text>\nSegments: {segments}")
+        return
+
+    try:
+        _, segment, text = parts
+        campaign_dao: CampaignDAO = dao["campaign"]
+        message_dao: CampaignMessageDAO = dao["campaign_message"]
+        total = await broadcast(campaign_dao, message_dao, segment, text)
+        await dao.commit()
+        await message.answer(f"📣 Broadcast queued for {total} users.")
+    except Exception as e:
+        logger.error(f"Error during broadcast: {e}")
+        await message.answer("❌ Failed to start the broadcast. Try again later.")
+
+
 # For manual manager booking status
 @admin_router.message(Command("mark_paid"))
 @admin_required
-async def set_paid_booking(message: Message, session: AsyncSession, dao: dict):
+async def set_paid_booking(message: Message, dao: DAORegistry):
     try:
         _, book_id = message.text.strip().split()
         booking_dao: BookingDAO = dao["booking"]
         await booking_dao.mark_paid(int(book_id))
+        # Stored before the reply, a failed commit must not be reported as done
+        await dao.commit()
         await message.answer(f"Order {book_id} has paid!")
     except Exception as e:
         logger.error(f"Get error in mark_paid method: {e}")
@@ -146,11 +188,12 @@ async def set_paid_booking(message: Message, session: AsyncSession, dao: dict):
 
 @admin_router.message(Command("cancel_order"))
 @admin_required
-async def set_canceled_booking(message: Message, session: AsyncSession, dao: dict):
+async def set_canceled_booking(message: Message, dao: DAORegistry):
     try:
         booking_id = int(message.text.split()[1])
         booking_dao: BookingDAO = dao["booking"]
         await booking_dao.mark_cancel(book_id=booking_id)
+        await dao.commit()
         await message.answer(f"Order {booking_id} has canceled!")
     except Exception as e:
         logger.error(f"Get error in set_canceled_booking method: {e}")
@@ -171,7 +214,7 @@ async def prepare_ticket_upload(message: Message):
 
 @admin_router.message(F.document)
 @admin_required
-async def handle_pdf_upload(message: Message, session: AsyncSession, dao: dict):
+async def handle_pdf_upload(message: Message, dao: DAORegistry, outbox: MessageDispatcher):
     admin_id = message.from_user.id
     booking_dao: BookingDAO = dao["booking"]
 
@@ -191,18 +234,21 @@ async def handle_pdf_upload(message: Message, session: AsyncSession, dao: dict):
         # Only remove from pending when we're sure booking is valid
         pending_ticket_uploads.pop(admin_id)
 
-        # Send ticket
-        await message.bot.send_document(
-            chat_id=int(booking.user_id),
-            document=message.document.file_id,
+        # Send ticket through the rate-limited outbox, awaited to report a failed delivery
+        sent = await outbox.send_document(
+            int(booking.user_id),
+            message.document.file_id,
             caption="🎟 Your ticket PDF is ready!"
         )
+        if sent is None:
+            raise TicketNotDelivered(booking_id)
 
         # Update DB
         await booking_dao.update(
             filters=BookingBase(id=booking_id),
             values=BookingByStatus(status="processed")
         )
+        await dao.commit()
 
         await message.answer("✅ Ticket sent to user.")
 
@@ -212,6 +258,8 @@ async def handle_pdf_upload(message: Message, session: AsyncSession, dao: dict):
         await message.answer(f"⚠️ Booking {e} not found.")
     except UserIdNotFound as e:
         await message.answer(f"⚠️ Booking {e} has no user assigned.")
+    except TicketNotDelivered as e:
+        await message.answer(f"⚠️ Ticket for booking {e} was not delivered. Try /attach_invoice again.")
     except Exception as e:
         logger.error(f"Unexpected error in ticket upload: {e}")
         await message.answer("❌ Something went wrong while sending ticket.")
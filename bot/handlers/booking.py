@@ -3,12 +3,14 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, ReplyKeyboardRemove, CallbackQuery
 from aiogram.filters import Command
 from loguru import logger
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.database.dao.dao import BookingDAO, RouteDAO
+from bot.config import config
+from bot.database.dao.dao import BookingDAO, RouteDAO, UserDAO
+from bot.database.dao.registry import DAORegistry
 from bot.database.schemas.booking import CreateBooking
 from bot.keyboards.user import get_keyboard_seat_classes, get_keyboard_quantity_number, get_keyboard_confirmation, \
     general_keyboard_menu, get_keyboard_payment_method
+from bot.services.rates import rates
 from bot.states.user import JourneyBooking
 
 booking_router = Router()
@@ -63,8 +65,7 @@ async def process_seat_type(callback: CallbackQuery, state: FSMContext):
 async def process_quantity(
     callback: CallbackQuery,
     state: FSMContext,
-    session: AsyncSession,
-    dao: dict
+    dao: DAORegistry
 ):
     """
     Handle quantity selection for a journey booking.
@@ -73,6 +74,7 @@ async def process_quantity(
     """
     user_id = callback.from_user.id
     route_dao: RouteDAO = dao["route"]
+    user_dao: UserDAO = dao["user"]
     # 1. Validate
     try:
         qty = int(callback.data)
@@ -94,6 +96,8 @@ async def process_quantity(
         total = float(route.cost) * qty
         await state.update_data(quantity=qty, price=total, route_id=route.id)
         data = await state.get_data()
+        # Converted locally from the cached rates, no CryptoBot call
+        asset = await user_dao.get_asset(user_id)
 
         # 4. Ask user for confirmation
         await callback.message.delete()
@@ -103,7 +107,7 @@ async def process_quantity(
             f"📅 Date: {data['travel_date']}\n"
             f"🪑 Seat: {data['seat_type']}\n"
             f"👥 Quantity: {qty}\n"
-            f"💰 Total: {total} USDT",
+            f"💰 Total: {rates.format_price(total, config.PRICE_ASSET, asset)}",
             reply_markup=get_keyboard_confirmation()
         )
         await state.set_state(JourneyBooking.confirmation)
@@ -121,7 +125,7 @@ async def process_quantity(
 
 
 @booking_router.callback_query(JourneyBooking.confirmation)
-async def process_confirm(callback: CallbackQuery, state: FSMContext, session: AsyncSession, dao: dict):
+async def process_confirm(callback: CallbackQuery, state: FSMContext, dao: DAORegistry):
     booking_dao: BookingDAO = dao["booking"]
     user_id = callback.from_user.id
     decision = callback.data
@@ -146,6 +150,8 @@ async def process_confirm(callback: CallbackQuery, state: FSMContext, session: A
                 status="unpaid",
             )
             await booking_dao.add(booking)
+            # Stored before the payment menu is shown
+            await dao.commit()
 
             await callback.message.delete()
             await callback.message.answer(
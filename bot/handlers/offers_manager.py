@@ -1,9 +1,11 @@
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import ReplyKeyboardRemove
+from aiogram.types import Message, ReplyKeyboardRemove
+from loguru import logger
 
 from bot.database.dao.dao import OfferDAO
+from bot.database.dao.registry import DAORegistry
 from bot.handlers.admin import admin_required
 from bot.states.admin import AddOffer
 
@@ -41,14 +43,15 @@ async def process_url(message: Message, state: FSMContext):
     await message.answer("What is the cost this offer?")
 
 @offers_router.message(AddOffer.price)
-async def process_price(message: Message, state: FSMContext, dao: dict):
+async def process_price(message: Message, state: FSMContext, dao: DAORegistry):
     await state.update_data(price=message.text)
     data = await state.get_data()
 
     offer_dao: OfferDAO = dao["offer"]
 
     try:
-        result = await offer_dao.create_or_update_offer(**data)
+        result = await offer_dao.create_or_update_offer(data)
+        await dao.commit()
         await message.answer(f"New Offer was {result}")  # Update or Add as new
     except Exception as e:
         logger.error(f"Get error in add_offer method: {e}", exc_info=True)
@@ -2,12 +2,16 @@ from aiogram import Router
 from aiogram.exceptions import AiogramError
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import ReplyKeyboardRemove, CallbackQuery
+from aiogram.types import Message, ReplyKeyboardRemove, CallbackQuery
+from loguru import logger
 
+from bot.config import config
 from bot.keyboards.offers_kb import get_list_offers, get_months_keyboard
 from bot.keyboards.user import general_keyboard_menu, get_keyboard_confirmation, get_keyboard_payment_method
 from bot.states.user import OfferOrder
 from bot.database.dao.dao import OfferDAO, MonthlyPassDAO, UserDAO
+from bot.database.dao.registry import DAORegistry
+from bot.services.rates import rates
 
 order_offers = Router()
 
@@ -16,13 +20,14 @@ order_offers = Router()
 # offer_{offer.id}
 
 @order_offers.message(Command("order_offers"))
-async def start_order(message: Message, state: FSMContext, dao: dict):
+async def start_order(message: Message, state: FSMContext, dao: DAORegistry):
     await state.set_state(OfferOrder.user_id)
     await state.update_data(user_id=message.from_user.id)
     offer_dao: OfferDAO = dao["offer"]
 
     try:
-        offers = await offer_dao.find_all()
+        # Cached snapshot, the keyboard is built once per snapshot
+        offers = await offer_dao.get_catalog()
         if not offers:
             await message.answer("❌ No offers available at the moment.")
             return
@@ -41,16 +46,18 @@ async def start_order(message: Message, state: FSMContext, dao: dict):
 
 
 @order_offers.callback_query(OfferOrder.offer_id)
-async def process_offer(callback: CallbackQuery, state: FSMContext, dao: dict):
+async def process_offer(callback: CallbackQuery, state: FSMContext, dao: DAORegistry):
     offer_id = int(callback.data.split("_")[1])
-    await state.update_data(offer_id=offer_id)
+    offer_dao: OfferDAO = dao["offer"]
+    offer = next((offer for offer in await offer_dao.get_catalog() if offer.id == offer_id), None)
+    await state.update_data(offer_id=offer_id, price=offer.price if offer else None)
     await state.set_state(OfferOrder.full_name)
     await callback.message.answer(
         "🎂 Please enter your fullname (Telegram Bot):"
     )
 
 @order_offers.message(OfferOrder.full_name)
-async def process_fullname(message: Message, state: FSMContext, dao: dict):
+async def process_fullname(message: Message, state: FSMContext, dao: DAORegistry):
     await state.update_data(full_name=message.text)
     await state.set_state(OfferOrder.age)
     await message.answer("How old are you? (age in number)")
@@ -74,7 +81,7 @@ async def process_address(message: Message, state: FSMContext):
     )
 
 @order_offers.callback_query(OfferOrder.month)
-async def process_month(callback: CallbackQuery, state: FSMContext):
+async def process_month(callback: CallbackQuery, state: FSMContext, dao: DAORegistry):
     try:
         month = int(callback.data.strip())
         if not (1 <= month <= 12):
@@ -85,20 +92,24 @@ async def process_month(callback: CallbackQuery, state: FSMContext):
 
     await state.update_data(month=month)
     data = await state.get_data()
+    user_dao: UserDAO = dao["user"]
+    asset = await user_dao.get_asset(callback.from_user.id)
+    price = rates.format_price(data["price"], config.OFFER_PRICE_ASSET, asset) if data.get("price") else "-"
 
     # Ask for confirmation
     await callback.message.answer(
         "✅ Please confirm your Offer order:\n\n"
         f"🎂 Age: {data['age']}\n"
         f"🏠 Post_code: {data['zip_code']}\n"
-        f"📅 Month: {data['month']}",
+        f"📅 Month: {data['month']}\n"
+        f"💰 Price: {price}",
         reply_markup=get_keyboard_confirmation()
     )
     await state.set_state(OfferOrder.confirmation)
 
 
 @order_offers.callback_query(OfferOrder.confirmation)
-async def process_confirm(callback: CallbackQuery, state: FSMContext, dao: dict):
+async def process_confirm(callback: CallbackQuery, state: FSMContext, dao: DAORegistry):
     data = await state.get_data()
     user_dao: UserDAO = dao["user"]
     pass_dao: MonthlyPassDAO = dao["pass"]
@@ -114,6 +125,7 @@ async def process_confirm(callback: CallbackQuery, state: FSMContext, dao: dict)
             # send payment
             await user_dao.update_details(user_id, data)
             await pass_dao.add_order(data)
+            await dao.commit()
             await callback.message.delete()
             await callback.message.answer(
                 "🎫 Your offer order has been created!",
@@ -1,13 +1,14 @@
 from aiogram import Router
 from aiogram.types import CallbackQuery
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.config import broker
-from bot.database.dao.dao import BookingDAO, PaymentDAO
+from bot.config import broker, config
+from bot.database.dao.dao import BookingDAO, PaymentDAO, UserDAO
+from bot.database.dao.registry import DAORegistry
 from bot.database.schemas.booking import BookingBase, SetPayment
 from bot.keyboards.user import general_keyboard_menu, get_keyboard_pay_btn
 from bot.database.schemas.payment import PaymentCreate
 from bot.services.crypto import create_invoice
+from bot.services.rates import rates
 
 from loguru import logger
 
@@ -15,15 +16,16 @@ payment_router = Router()
 
 
 @payment_router.callback_query(lambda c: c.data.startswith("pay_"))
-async def process_payment(callback: CallbackQuery, session: AsyncSession, dao: dict):
+async def process_payment(callback: CallbackQuery, dao: DAORegistry):
     # I must get order_id here from handler
     booking_dao: BookingDAO = dao["booking"]
     payment_dao: PaymentDAO = dao["payment"]
+    user_dao: UserDAO = dao["user"]
     user_id = callback.from_user.id
 
     try:
         # Get latest booking
-        last_booking = await booking_dao.find_last_by_user(user_id=user_id)
+        last_booking = await booking_dao.find_last_by_user(user_id=user_id, load=("route",))
 
         if not last_booking:
             await callback.message.answer("❌ No booking found.")
@@ -31,13 +33,26 @@ async def process_payment(callback: CallbackQuery, session: AsyncSession, dao: d
 
         # Extract payment method
         method = callback.data.removeprefix("pay_")
-        payment = await payment_dao.add(PaymentCreate(payment_method=method, invoice_id=None))
+        invoice = None
+        if method == "cryptobot":
+            # Invoiced in the user's asset when the cached rates are fresh, otherwise in PRICE_ASSET
+            asset = await user_dao.get_asset(user_id) or config.PRICE_ASSET
+            amount = rates.convert(last_booking.price, config.PRICE_ASSET, asset)
+            if amount is None:
+                asset, amount = config.PRICE_ASSET, last_booking.price
+            invoice = await create_invoice(amount=amount, currency=asset)
+        payment = await payment_dao.add(PaymentCreate(
+            payment_method=method,
+            invoice_id=invoice.invoice_id if invoice else None,  # picked up by check_pending_invoices
+        ))
 
         # Update booking with payment reference
         await booking_dao.update(
             filters=BookingBase(id=last_booking.id),
             values=SetPayment(payment_id=payment.id)
         )
+        # Payment and booking are stored together before anyone is notified
+        await dao.commit()
 
         await callback.message.delete()
 
@@ -52,7 +67,7 @@ async def process_payment(callback: CallbackQuery, session: AsyncSession, dao: d
                 f"👤 @{callback.from_user.username} ({user_id})\n"
                 f"🛤 {last_booking.route.departure} → {last_booking.route.destination}\n"
                 f"👥 Quantity: {last_booking.quantity}\n"
-                f"💰 Price: {last_booking.price} USDT\n"
+                f"💰 Price: {last_booking.price} {config.PRICE_ASSET}\n"
                 f"🕐 Date: {last_booking.date}\n"
                 f"🪑 Seat: {last_booking.seat_type}\n\n"
                 f"📌 Booking ID: {last_booking.id}"
@@ -62,13 +77,6 @@ async def process_payment(callback: CallbackQuery, session: AsyncSession, dao: d
 
         # Cryptobot payment flow
         if method == "cryptobot":
-            invoice = await create_invoice(amount=last_booking.price)
-            payment.invoice_id = invoice.invoice_id
-            await session.commit()  # store invoice ID for tracking
-            await broker.publish(
-                message={"booking_id": last_booking.id, "invoice_id": invoice.invoice_id, "user_id": user_id},
-                queue="crypto_check",
-            )
             await callback.message.answer(
                 "✅ Booking confirmed.\n\n💳 Please complete your payment:",
                 reply_markup=get_keyboard_pay_btn(invoice=invoice)
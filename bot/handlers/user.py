@@ -1,20 +1,23 @@
 from aiogram import Router
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, Message
 from aiogram.filters import CommandStart, Command
+from aiogram.utils.callback_answer import CallbackAnswer
 from loguru import logger
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.config import broker
+from bot.config import broker, config
+from bot.database.dao.base import Page
 from bot.database.dao.dao import UserDAO, BookingDAO, MonthlyPassDAO
+from bot.database.dao.registry import DAORegistry
+from bot.database.schemas.booking import BookingsByUser
 from bot.database.schemas.user import UserCreate
-from bot.database.schemas.monthly_pass import PassStatus
-from bot.keyboards.user import general_keyboard_menu
+from bot.database.schemas.monthly_pass import PassesByUser
+from bot.keyboards.user import general_keyboard_menu, get_keyboard_assets, get_keyboard_history_pages
 
 user_router = Router()
 
 
 @user_router.message(CommandStart())
-async def cmd_start(message: Message, session: AsyncSession, dao: dict):
+async def cmd_start(message: Message, dao: DAORegistry):
     """Handle /start command and register user if not exists."""
     user_id = message.from_user.id
     user_dao: UserDAO = dao["user"]
@@ -38,6 +41,8 @@ async def cmd_start(message: Message, session: AsyncSession, dao: dict):
             full_name=message.from_user.full_name
         )
         await user_dao.add(data=user_data)
+        # Committed before the welcome campaign enrolls the user from the broker
+        await dao.commit()
 
         await message.answer(
             f"👋 Welcome to Ticket Bot, {message.from_user.full_name}!\n"
@@ -52,57 +57,145 @@ async def cmd_start(message: Message, session: AsyncSession, dao: dict):
         await message.answer("❌ Something went wrong. Please try again later.")
 
 
-@user_router.message(Command("my_offers"))
-async def user_ordered_offers(message: Message, session: AsyncSession, dao: dict):
-    """Handle /my_offers command and show all offers for user."""
+async def history_page(
+        kind: str,
+        user_id: int,
+        dao: DAORegistry,
+        before_id: int | None = None,
+        after_id: int | None = None,
+) -> Page:
+    """A page of the user's paid bookings ("bookings") or monthly passes ("offers")."""
+    if kind == "bookings":
+        booking_dao: BookingDAO = dao["booking"]
+        return await booking_dao.find_page(
+            BookingsByUser(user_id=user_id, status="paid"),
+            before_id=before_id,
+            after_id=after_id,
+            limit=config.HISTORY_PAGE_SIZE,
+            load=("route",),
+        )
     pass_dao: MonthlyPassDAO = dao["pass"]
+    return await pass_dao.find_page(
+        PassesByUser(user_id=user_id, status="paid"),
+        before_id=before_id,
+        after_id=after_id,
+        limit=config.HISTORY_PAGE_SIZE,
+        load=("offer",),
+    )
+
+
+def render_history_page(kind: str, page: Page) -> str:
+    text_lines = []
+    for item in page.items:
+        if kind == "bookings":
+            text_lines.append(
+                f"🎫 <b>Booking #{item.id}</b>\n"
+                f"From: {item.route.departure} ➡ {item.route.destination}\n"
+                f"Date: {item.date}\n"
+                f"Seat: {item.seat_type}\n"
+                f"Tickets: {item.quantity}\n"
+                f"Price: {item.price} {config.PRICE_ASSET}\n"
+            )
+        else:
+            text_lines.append(
+                f"🎫 <b>Monthly Pass #{item.id}</b>\n"
+                f"Pass name: {item.offer.name}\n"
+                f"Month: {item.month}\n"
+                f"Status: {item.status}"
+            )
+    return "\n".join(text_lines)
+
 
+@user_router.message(Command("my_offers"))
+async def user_ordered_offers(message: Message, dao: DAORegistry):
+    """Handle /my_offers command and show the newest paid passes of the user."""
     try:
-        passes = await pass_dao.find_all(filters=PassStatus(status="paid"))
-        if not passes:
+        page = await history_page("offers", message.from_user.id, dao)
+        if not page.items:
             await message.answer(f" ❌ You dont have any offers yet!")
             return
 
-        text_lines = []
-        for i, _pass in enumerate(passes, start=1):
-            text_lines.append(
-                f"🎫 <b>Monthly Pass #{i}</b>\n"
-                f"Pass name: {_pass.offer.name}"
-                f"Month: {_pass.month}\n"
-                f"Status: {_pass.status}"
-            )
-        await message.answer("\n".join(text_lines))
+        await message.answer(
+            render_history_page("offers", page),
+            reply_markup=get_keyboard_history_pages("offers", page)
+        )
     except Exception as e:
         logger.error(f"Error in /my_offers for user {message.from_user.id}: {e}", exc_info=True)
         await message.answer("❌ Could not fetch your bookings. Please try again later.")
 
 
 @user_router.message(Command("my_bookings"))
-async def user_order_history(message: Message, session: AsyncSession, dao: dict):
-    """Handle /my_bookings command and show paid bookings."""
-    booking_dao: BookingDAO = dao["booking"]
-
+async def user_order_history(message: Message, dao: DAORegistry):
+    """Handle /my_bookings command and show the newest paid bookings."""
     try:
-        bookings = await booking_dao.get_booking_paid(user_id=message.from_user.id)
+        page = await history_page("bookings", message.from_user.id, dao)
 
-        if not bookings:
+        if not page.items:
             await message.answer("You don't have bookings yet!")
             return
 
-        # Build message text
-        text_lines = []
-        for i, booking in enumerate(bookings, start=1):
-            text_lines.append(
-                f"🎫 <b>Booking #{i}</b>\n"
-                f"From: {booking.route.departure} ➡ {booking.route.destination}\n"
-                f"Date: {booking.date}\n"
-                f"Seat: {booking.seat_type}\n"
-                f"Tickets: {booking.quantity}\n"
-                f"Price: {booking.price} USDT\n"
-            )
-
-        await message.answer("\n".join(text_lines))
+        await message.answer(
+            render_history_page("bookings", page),
+            reply_markup=get_keyboard_history_pages("bookings", page)
+        )
 
     except Exception as e:
         logger.error(f"Error in /my_bookings for user {message.from_user.id}: {e}", exc_info=True)
         await message.answer("❌ Could not fetch your bookings. Please try again later.")
+
+
+@user_router.callback_query(
+    lambda c: c.data.startswith(("bookings_newer_", "bookings_older_", "offers_newer_", "offers_older_"))
+)
+async def history_page_switch(callback: CallbackQuery, dao: DAORegistry, callback_answer: CallbackAnswer):
+    """Prev / Next buttons of /my_bookings and /my_offers: edit the message in place."""
+    kind, direction, cursor = callback.data.split("_")
+    try:
+        if direction == "older":
+            page = await history_page(kind, callback.from_user.id, dao, before_id=int(cursor))
+        else:
+            page = await history_page(kind, callback.from_user.id, dao, after_id=int(cursor))
+
+        if not page.items:
+            # Sent by CallbackAnswerMiddleware
+            callback_answer.text = "Nothing more to show."
+            return
+
+        await callback.message.edit_text(
+            render_history_page(kind, page),
+            reply_markup=get_keyboard_history_pages(kind, page)
+        )
+    except Exception as e:
+        logger.error(f"Error switching {kind} page for user {callback.from_user.id}: {e}", exc_info=True)
+        callback_answer.text = "❌ Could not fetch your bookings. Please try again later."
+
+
+@user_router.message(Command("currency"))
+async def choose_currency(message: Message, dao: DAORegistry):
+    """Pick the asset prices are shown and invoiced in."""
+    user_dao: UserDAO = dao["user"]
+    try:
+        asset = await user_dao.get_asset(message.from_user.id) or config.PRICE_ASSET
+        await message.answer(
+            f"💱 Prices are shown in {asset}. Choose a currency:",
+            reply_markup=get_keyboard_assets(tuple(config.PAY_ASSETS))
+        )
+    except Exception as e:
+        logger.error(f"Error in /currency for user {message.from_user.id}: {e}", exc_info=True)
+        await message.answer("❌ Something went wrong. Please try again later.")
+
+
+@user_router.callback_query(lambda c: c.data.startswith("asset_"))
+async def set_currency(callback: CallbackQuery, dao: DAORegistry, callback_answer: CallbackAnswer):
+    asset = callback.data.removeprefix("asset_")
+    if asset not in config.PAY_ASSETS:
+        callback_answer.text = "⚠️ Unknown currency."
+        return
+    user_dao: UserDAO = dao["user"]
+    try:
+        await user_dao.set_asset(callback.from_user.id, asset)
+        await dao.commit()
+        await callback.message.edit_text(f"✅ Prices are now shown in {asset}.")
+    except Exception as e:
+        logger.error(f"Error setting currency for user {callback.from_user.id}: {e}", exc_info=True)
+        callback_answer.text = "❌ Something went wrong. Please try again later."
@@ -1,11 +1,14 @@
+from functools import cache
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
 
+@cache
 def admin_general_keyboard_menu() -> ReplyKeyboardMarkup:
     keyboard = [
         [KeyboardButton(text="/mark_paid"), KeyboardButton(text="/export_bookings")],
         [KeyboardButton(text="/cancel_order"), KeyboardButton(text="/attach_invoice")],
         [KeyboardButton(text="/add_route"), KeyboardButton(text="/booking_id")],
-        [KeyboardButton(text="/add_offer"), ]
+        [KeyboardButton(text="/add_offer"), KeyboardButton(text="/broadcast")]
     ]
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True, is_persistent=True)
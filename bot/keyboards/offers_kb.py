@@ -1,10 +1,17 @@
 import datetime
+from functools import lru_cache
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from bot.database.schemas.offers import OfferInfo
+
 
 def get_months_keyboard() -> InlineKeyboardMarkup:
-    today = datetime.date.today()
+    return _months_keyboard(datetime.date.today())
+
+
+@lru_cache(maxsize=1)
+def _months_keyboard(today: datetime.date) -> InlineKeyboardMarkup:
     months = [(today + datetime.timedelta(days=30 * i)).strftime("%B") for i in range(5)]
     keyboard = [
         [InlineKeyboardButton(text=month, callback_data=f"{month}")]
@@ -13,7 +20,9 @@ def get_months_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def get_list_offers(offers: list) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=4)
+def get_list_offers(offers: tuple[OfferInfo, ...]) -> InlineKeyboardMarkup:
+    """Built once per catalog snapshot (see OfferDAO.get_catalog)."""
     keyboard = [
         [InlineKeyboardButton(text=f"{offer.name} - {offer.price}€", callback_data=f"offer_{offer.id}")]
         for offer in offers
@@ -1,16 +1,23 @@
+from functools import cache
+
 from aiocryptopay.models.invoice import Invoice
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 
+from bot.database.dao.base import Page
+
 
+# Static keyboards are built once and shared by every reply, nothing mutates them
+@cache
 def general_keyboard_menu() -> ReplyKeyboardMarkup:
     keyboard = [
         [KeyboardButton(text="/order_offers"), KeyboardButton(text="/my_offers")],
         [KeyboardButton(text="/start"), KeyboardButton(text="/booking")],
-        [KeyboardButton(text="/my_bookings"), KeyboardButton(text="/help")]
+        [KeyboardButton(text="/my_bookings"), KeyboardButton(text="/currency"), KeyboardButton(text="/help")]
     ]
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True, is_persistent=True)
 
 
+@cache
 def get_keyboard_seat_classes() -> InlineKeyboardMarkup:
     keyboard = [
         [
@@ -30,6 +37,7 @@ def get_keyboard_pay_btn(invoice: Invoice) -> InlineKeyboardMarkup:
     return inline_keyboard
 
 
+@cache
 def get_keyboard_quantity_number() -> InlineKeyboardMarkup:
     keyboard = [
         [InlineKeyboardButton(text=str(i), callback_data=str(i)) for i in range(1, 11)]
@@ -37,6 +45,7 @@ def get_keyboard_quantity_number() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@cache
 def get_keyboard_confirmation() -> InlineKeyboardMarkup:
     confirm_kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Confirm", callback_data="confirm_booking")],
@@ -45,9 +54,28 @@ def get_keyboard_confirmation() -> InlineKeyboardMarkup:
     return confirm_kb
 
 
+@cache
 def get_keyboard_payment_method() -> InlineKeyboardMarkup:
     keyboard = [
         [InlineKeyboardButton(text="💸 CryptoBot", callback_data="pay_cryptobot")],
         [InlineKeyboardButton(text="💵 Manual", callback_data="pay_manual")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+@cache
+def get_keyboard_assets(assets: tuple[str, ...]) -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton(text=asset, callback_data=f"asset_{asset}") for asset in assets]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_keyboard_history_pages(kind: str, page: Page) -> InlineKeyboardMarkup | None:
+    """Prev / Next buttons of a /my_bookings or /my_offers page, the cursor is the edge row id."""
+    buttons = []
+    if page.has_newer:
+        buttons.append(InlineKeyboardButton(text="⬅️ Prev", callback_data=f"{kind}_newer_{page.items[0].id}"))
+    if page.has_older:
+        buttons.append(InlineKeyboardButton(text="Next ➡️", callback_data=f"{kind}_older_{page.items[-1].id}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
@@ -4,13 +4,14 @@ from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
-from bot.database.dao.dao import UserDAO, BookingDAO, PaymentDAO, RouteDAO, OfferDAO, MonthlyPassDAO
+from bot.database.dao.registry import DAORegistry
 
 
 class DbSessionMiddleware(BaseMiddleware):
-    def __init__(self, session_pool: async_sessionmaker[AsyncSession]):
+    def __init__(self, session_pool: async_sessionmaker[AsyncSession], unit_of_work: bool = True):
         super().__init__()
         self.session_pool = session_pool
+        self.unit_of_work = unit_of_work
 
     async def __call__(
             self,
@@ -18,14 +19,8 @@ class DbSessionMiddleware(BaseMiddleware):
             event: TelegramObject,
             data: Dict[str, Any],
     ) -> Any:
-        async with self.session_pool() as session:
-            data["session"] = session
-            data["dao"] = {
-                "user": UserDAO(session),
-                "booking": BookingDAO(session),
-                "payment": PaymentDAO(session),
-                "route": RouteDAO(session),
-                "offer": OfferDAO(session),
-                "pass": MonthlyPassDAO(session)
-            }
+        # The session is checked out only if a handler touches the DB and,
+        # in unit-of-work mode, committed once after the handler returns
+        async with DAORegistry(self.session_pool, unit_of_work=self.unit_of_work) as registry:
+            data["dao"] = registry
             return await handler(event, data)
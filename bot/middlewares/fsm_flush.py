@@ -0,0 +1,23 @@
+from typing import Callable, Awaitable, Dict, Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.database.storage import SQLAlchemyStorage
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """Writes FSM changes made during the update in one batch."""
+
+    def __init__(self, storage: SQLAlchemyStorage):
+        super().__init__()
+        self.storage = storage
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        async with self.storage.buffered():
+            return await handler(event, data)
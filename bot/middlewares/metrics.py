@@ -0,0 +1,86 @@
+import time
+from typing import Callable, Awaitable, Dict, Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+from loguru import logger
+
+from bot.services.metrics import BACKGROUND, UpdateStats, current_update, metrics
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: collects the SQL and Bot API work of the update
+    and records it under the handler that processed it. Updates slower than
+    `slow_ms` are logged with their query breakdown.
+    """
+
+    def __init__(self, slow_ms: float = 1000):
+        super().__init__()
+        self.slow_seconds = slow_ms / 1000
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            current_update.reset(token)
+            metrics.observe_update(stats, seconds, failed)
+            if seconds >= self.slow_seconds:
+                logger.warning(
+                    f"Slow update {getattr(event, 'update_id', '?')} in {stats.handler}: "
+                    f"{seconds * 1000:.1f} ms, {len(stats.queries)} queries in {stats.sql_seconds * 1000:.1f} ms, "
+                    f"Bot API {stats.api_seconds * 1000:.1f} ms\n{stats.breakdown()}"
+                )
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner middleware telling MetricsMiddleware which handler matched."""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        stats = current_update.get()
+        if stats is not None:
+            stats.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+class BotAPIMetricsMiddleware(BaseRequestMiddleware):
+    """Times every Bot API request, inside an update or in the background."""
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            seconds = time.perf_counter() - started
+            name = type(method).__name__
+            stats = current_update.get()
+            if stats is not None:
+                stats.api_calls.append((name, seconds))
+            else:
+                metrics.observe_api_call(BACKGROUND, name, seconds)
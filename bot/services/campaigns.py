@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database.dao.dao import CampaignDAO, CampaignMessageDAO
+from bot.services.outbox import MessageDispatcher
+
+WELCOME = "welcome"
+BROADCAST_PREFIX = "broadcast_"  # one-shot campaigns, deleted once delivered
+
+# Each step is sent `delay` seconds after the previous one (the first one after enrollment)
+DEFAULT_CAMPAIGNS = {
+    WELCOME: [
+        {
+            "delay": 3600,
+            "text": "Thanks for the choice of our casa bot! We hope you will like it."
+                    "Leave a review so that we become better!",
+        },
+        {
+            "delay": 7200,
+            "text": "Do you need to book the ticket again? Try our new routes!",
+        },
+    ],
+}
+
+
+async def setup_campaigns(session_pool: async_sessionmaker[AsyncSession]):
+    """Store the built-in campaign templates, replacing older versions."""
+    async with session_pool() as session:
+        campaign_dao = CampaignDAO(session)
+        for name, steps in DEFAULT_CAMPAIGNS.items():
+            await campaign_dao.save(name, steps)
+
+
+async def enroll_user(session_pool: async_sessionmaker[AsyncSession], user_id: int, name: str = WELCOME):
+    async with session_pool() as session:
+        campaign = await CampaignDAO(session).find_one_or_none_by_name(name)
+        if campaign is None:
+            logger.error(f"Campaign {name} does not exist, user {user_id} not enrolled.")
+            return
+        first_delay = timedelta(seconds=campaign.steps[0]["delay"])
+        await CampaignMessageDAO(session).enroll(user_id, campaign.id, datetime.utcnow() + first_delay)
+    logger.info(f"User {user_id} enrolled in campaign {name}.")
+
+
+async def broadcast(
+        campaign_dao: CampaignDAO,
+        message_dao: CampaignMessageDAO,
+        segment: str,
+        text: str,
+) -> int:
+    """One-step campaign for every user of `segment`; returns the number of recipients."""
+    now = datetime.utcnow()
+    # Unique per call: two broadcasts in the same second must not share a campaign
+    campaign = await campaign_dao.save(f"{BROADCAST_PREFIX}{uuid4().hex}", [{"delay": 0, "text": text}])
+    enrolled = await message_dao.enroll_segment(segment, campaign.id, now)
+    if not enrolled:
+        await campaign_dao.delete_finished([campaign.id], BROADCAST_PREFIX)
+    return enrolled
+
+
+async def dispatch_campaigns(
+        session_pool: async_sessionmaker[AsyncSession],
+        outbox: MessageDispatcher,
+        batch_size: int = 500,
+) -> int:
+    """
+    Send every due campaign step through the outbox and move the rows to
+    their next step. A batch is committed before its messages are queued, so
+    a step is never sent twice. Stops early while the outbox still holds a
+    full batch; the rest stays due for the next run. Broadcasts are deleted
+    once their last message is out.
+    """
+    queued = 0
+    while outbox.depth < batch_size:
+        now = datetime.utcnow()
+        async with session_pool() as session:
+            message_dao = CampaignMessageDAO(session)
+            due = await message_dao.find_due(now, limit=batch_size)
+            if not due:
+                break
+            campaigns = await CampaignDAO(session).get_many({row.campaign_id for row in due})
+
+            outgoing, next_steps, finished, finished_campaigns = [], [], [], set()
+            for row in due:
+                steps = campaigns[row.campaign_id].steps
+                if row.step < len(steps):
+                    outgoing.append((row.user_id, steps[row.step]["text"]))
+                if row.step + 1 < len(steps):
+                    next_steps.append({
+                        "id": row.id,
+                        "step": row.step + 1,
+                        "due_at": now + timedelta(seconds=steps[row.step + 1]["delay"]),
+                    })
+                else:
+                    finished.append(row.id)
+                    finished_campaigns.add(row.campaign_id)
+            await message_dao.advance(next_steps, finished)
+            await CampaignDAO(session).delete_finished(list(finished_campaigns), BROADCAST_PREFIX)
+
+        for user_id, text in outgoing:
+            outbox.send(user_id, text)
+        queued += len(outgoing)
+        if len(due) < batch_size:
+            break
+
+    if queued:
+        logger.info(f"Campaign messages queued: {queued}")
+    return queued
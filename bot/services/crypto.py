@@ -1,18 +1,215 @@
+import asyncio
+import hashlib
+import hmac
+import random
+import ssl
+import time
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+import certifi
 from aiocryptopay import AioCryptoPay, Networks
 from aiocryptopay.const import InvoiceStatus
+from aiocryptopay.exceptions.factory import CodeErrorFactory
 from aiocryptopay.models.invoice import Invoice
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
 
 from loguru import logger
 
-from bot.config import crypto
+from bot.config import config
+
+
+class CircuitOpenError(Exception):
+    """CryptoBot failed too often recently, the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails calls fast
+    for `reset_timeout` seconds; then one trial call is let through, which
+    closes the circuit on success or opens it again on failure.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def check(self) -> bool:
+        """Raise CircuitOpenError if the call must not be made; True for the trial call."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("CryptoBot circuit is open")
+            self.state = self.HALF_OPEN
+            return True
+        if self.state == self.HALF_OPEN:
+            # The trial call is still running
+            raise CircuitOpenError("CryptoBot circuit is half open")
+        return False
+
+    def release_trial(self):
+        """The trial call ended without a result (cancelled): the next call is the new trial."""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.error(f"CryptoBot circuit opened after {self.failures} failures.")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class PooledCryptoPay(AioCryptoPay):
+    """AioCryptoPay with a bounded keep-alive connection pool and a request timeout."""
+
+    def __init__(self, token: str, network: str, pool_size: int = 10, timeout: float = 10):
+        super().__init__(token=token, network=network)
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+    def get_session(self, **kwargs) -> ClientSession:
+        if isinstance(self._session, ClientSession) and not self._session.closed:
+            return self._session
+        ssl_context = ssl.create_default_context(cafile=certifi.where())
+        connector = TCPConnector(ssl=ssl_context, limit=self.pool_size, keepalive_timeout=60)
+        self._session = ClientSession(connector=connector, timeout=ClientTimeout(total=self.timeout), **kwargs)
+        return self._session
+
+
+class CryptoPayClient:
+    """
+    Resilient access to the Crypto Pay API.
+
+    Calls share one pooled HTTP session and at most `concurrency` of them are
+    in flight. Network errors, timeouts and 5xx answers are retried with
+    exponential backoff (reads only; an invoice is never created twice) and
+    counted by a circuit breaker that fails fast while CryptoBot is down.
+    Identical reads that are already in flight are coalesced into one request.
+    """
+
+    def __init__(
+            self,
+            api: AioCryptoPay,
+            concurrency: int = 10,
+            max_attempts: int = 3,
+            backoff: float = 0.5,
+            breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.api = api
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.coalesced_requests = 0
+        self.rejected = 0
+
+    @staticmethod
+    def is_transient(error: Exception) -> bool:
+        # CryptoPayAPIError is a factory instance, the raised errors subclass CodeErrorFactory
+        if isinstance(error, CodeErrorFactory):
+            return error.code is not None and error.code >= 500
+        return isinstance(error, (ClientError, asyncio.TimeoutError))
+
+    async def call(self, method: str, *args, retry: bool = True, **kwargs) -> Any:
+        """Call `AioCryptoPay.<method>` through the semaphore, retries and circuit breaker."""
+        attempts = self.max_attempts if retry else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                trial = self.breaker.check()
+            except CircuitOpenError:
+                self.rejected += 1
+                raise
+            try:
+                async with self._semaphore:
+                    self.requests += 1
+                    result = await getattr(self.api, method)(*args, **kwargs)
+            except asyncio.CancelledError:
+                # Neither success nor failure: a cancelled trial must not keep the circuit half open
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            except Exception as e:
+                if not self.is_transient(e):
+                    # CryptoBot answered, e.g. INVOICE_NOT_FOUND: it is up
+                    self.breaker.record_success()
+                    raise
+                self.failures += 1
+                self.breaker.record_failure()
+                if attempt == attempts:
+                    raise
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                self.retries += 1
+                logger.warning(f"CryptoBot {method} failed ({e!r}), retry {attempt} in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def coalesced(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Share the result of an identical request that is already running."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced_requests += 1
+        # One caller giving up must not cancel the request of the others
+        return await asyncio.shield(future)
+
+    async def close(self):
+        await self.api.close()
+
+    def metrics(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "coalesced": self.coalesced_requests,
+            "rejected": self.rejected,
+            "inflight": len(self._inflight),
+            "circuit_open": int(self.breaker.state != CircuitBreaker.CLOSED),
+        }
+
+
+network_API = Networks.TEST_NET if config.NETWORK_CRYPTO_API == "TEST_NET" else Networks.MAIN_NET
+crypto = CryptoPayClient(
+    PooledCryptoPay(
+        token=config.CRYPTO_PAY_TOKEN,
+        network=config.CRYPTO_API_URL or network_API,
+        pool_size=config.CRYPTO_CONCURRENCY,
+        timeout=config.CRYPTO_TIMEOUT,
+    ),
+    concurrency=config.CRYPTO_CONCURRENCY,
+    max_attempts=config.CRYPTO_MAX_ATTEMPTS,
+    backoff=config.CRYPTO_BACKOFF,
+    breaker=CircuitBreaker(config.CRYPTO_BREAKER_THRESHOLD, config.CRYPTO_BREAKER_RESET_SECONDS),
+)
 
 
 async def get_info_crypto_app():
-    profile = await crypto.get_me()
-    currencies = await crypto.get_currencies()
-    balance = await crypto.get_balance()
-    rates = await crypto.get_exchange_rates()
-    stats = await crypto.get_stats()
+    profile, currencies, balance, rates, stats = await asyncio.gather(
+        crypto.call("get_me"),
+        crypto.call("get_currencies"),
+        crypto.call("get_balance"),
+        crypto.call("get_exchange_rates"),
+        crypto.call("get_stats"),
+    )
 
     return {
         "profile": profile,
@@ -24,7 +221,14 @@ async def get_info_crypto_app():
 
 
 async def create_invoice(amount: float, currency: str = "USDT") -> Invoice:
-    invoice = await crypto.create_invoice(asset=currency, amount=amount)
+    # Expires with the booking: an invoice left open could be paid after the poll canceled its booking
+    invoice = await crypto.call(
+        "create_invoice",
+        asset=currency,
+        amount=amount,
+        expires_in=config.INVOICE_TIMEOUT_MINUTES * 60,
+        retry=False,
+    )
     logger.info(f"URL invoice: {invoice.bot_invoice_url}")
     return invoice
 
@@ -34,23 +238,55 @@ async def create_fiat_invoice(
         fiat: str = "USD",
         currency_type: str = "fiat"
 ) -> Invoice:
-    fiat_invoice = await crypto.create_invoice(
+    fiat_invoice = await crypto.call(
+        "create_invoice",
         amount=amount,
         fiat=fiat,
-        currency_type=currency_type
+        currency_type=currency_type,
+        retry=False,
     )
     return fiat_invoice
 
 
 async def get_invoice_status(invoice_id: int) -> InvoiceStatus | str:
-    invoice = await crypto.get_invoices(invoice_ids=invoice_id)
+    invoice = await crypto.coalesced(
+        ("get_invoices", invoice_id), lambda: crypto.call("get_invoices", invoice_ids=invoice_id)
+    )
     return invoice.status
 
 
+async def get_invoices_status(invoice_ids: list[int], chunk_size: int = 100) -> dict[int, str]:
+    """Fetch statuses of many invoices with one getInvoices call per chunk, chunks run concurrently."""
+    chunks = [tuple(invoice_ids[start:start + chunk_size]) for start in range(0, len(invoice_ids), chunk_size)]
+
+    def fetch(chunk: tuple[int, ...]):
+        return crypto.coalesced(
+            ("get_invoices", chunk), lambda: crypto.call("get_invoices", invoice_ids=list(chunk), count=len(chunk))
+        )
+
+    statuses = {}
+    for invoices in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+        for invoice in invoices or []:
+            statuses[invoice.invoice_id] = invoice.status
+    return statuses
+
+
 def get_invoice_id(invoice: Invoice) -> int:
     return invoice.invoice_id
 
 
 async def delete_invoice(invoice_id: int) -> bool:
-    deleted_invoice = await crypto.delete_invoice(invoice_id=invoice_id)
+    deleted_invoice = await crypto.call("delete_invoice", invoice_id=invoice_id)
     return deleted_invoice
+
+
+def verify_webhook_signature(body: bytes, signature: str | None, token: str = config.CRYPTO_PAY_TOKEN) -> bool:
+    """
+    Check the crypto-pay-api-signature header of a CryptoBot webhook update:
+    HMAC-SHA256 of the raw body keyed with SHA256(token), compared in constant time.
+    """
+    if not signature:
+        return False
+    key = hashlib.sha256(token.encode()).digest()
+    expected = hmac.new(key, body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database.dao.dao import ProcessedUpdateDAO
+from bot.services.cache import TTLCache
+
+
+class UpdateDeduplicator:
+    """
+    Drops Telegram updates that were already accepted, e.g. redelivered after
+    a slow webhook response.
+
+    Recent update ids live in a bounded LRU, so a retry reaching the same
+    instance costs one dict lookup. With a `session_pool` the id is also
+    claimed in the `processed_updates` table (one INSERT ... ON CONFLICT DO
+    NOTHING per new update), which catches retries landing on another
+    instance. Ids are kept for `retention` seconds.
+
+    Only ids this instance accepted go into its LRU: a duplicate found in the
+    table is looked up there again on the next retry, so `forget` by the
+    instance that accepted the update (the only one that can release it) lets
+    the redelivery through on every instance.
+    """
+
+    def __init__(
+            self,
+            maxsize: int = 10_000,
+            retention: float = 86400,
+            session_pool: Optional[async_sessionmaker[AsyncSession]] = None,
+    ):
+        self.retention = retention
+        self.session_pool = session_pool
+        self._seen = TTLCache(ttl=retention, maxsize=maxsize)
+        self.accepted = 0
+        self.duplicates = 0
+
+    async def is_duplicate(self, update_id: int) -> bool:
+        """True if the update was seen before, otherwise remember it and return False."""
+        found, _ = self._seen.get(update_id)
+        if not found and self.session_pool is not None:
+            try:
+                async with self.session_pool() as session:
+                    found = not await ProcessedUpdateDAO(session).claim(update_id)
+            except SQLAlchemyError as e:
+                # Handled unclaimed: a possible second delivery beats a lost update
+                logger.error(f"Update {update_id} could not be claimed, handled without dedup: {e}")
+                self.accepted += 1
+                return False
+        if found:
+            self.duplicates += 1
+            logger.info(f"Duplicate update {update_id} dropped.")
+        else:
+            # Cached once claimed, a failed claim must not mark the update seen
+            self._seen.set(update_id, True)
+            self.accepted += 1
+        return found
+
+    async def forget(self, update_id: int):
+        """Let a redelivery through, for updates that were not handled after all."""
+        self._seen.invalidate(update_id)
+        if self.session_pool is not None:
+            async with self.session_pool() as session:
+                await ProcessedUpdateDAO(session).release(update_id)
+
+    async def cleanup(self):
+        """Drop stored ids older than the retention (the LRU expires on its own)."""
+        if self.session_pool is None:
+            return
+        async with self.session_pool() as session:
+            deleted = await ProcessedUpdateDAO(session).delete_older_than(
+                datetime.utcnow() - timedelta(seconds=self.retention)
+            )
+        if deleted:
+            logger.info(f"Processed updates cleaned up: {deleted}")
+
+    def metrics(self) -> dict:
+        return {"accepted": self.accepted, "duplicates": self.duplicates, "cached": self._seen.stats()["size"]}
@@ -0,0 +1,62 @@
+import asyncio
+import csv
+import gzip
+import os
+import tempfile
+from datetime import datetime
+
+from bot.database.dao.dao import BookingDAO
+
+EXPORT_COLUMNS = [
+    "id",
+    "created_at",
+    "status",
+    "date",
+    "seat_type",
+    "quantity",
+    "price",
+    "departure",
+    "destination",
+    "user_id",
+    "username",
+    "full_name",
+    "payment_method",
+    "invoice_id",
+]
+
+
+async def export_bookings_csv(
+        booking_dao: BookingDAO,
+        status: str | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+        compress: bool = False,
+        batch_size: int = 500,
+) -> tuple[str, int]:
+    """
+    Stream bookings into a temporary CSV (optionally gzip) file.
+
+    Returns the file path and the number of exported rows. The caller owns the
+    file and must remove it.
+    """
+    fd, path = tempfile.mkstemp(prefix="bookings_", suffix=".csv.gz" if compress else ".csv")
+    os.close(fd)
+
+    output = gzip.open(path, "wt", encoding="utf-8", newline="") if compress \
+        else open(path, "w", encoding="utf-8", newline="")
+    total = 0
+    try:
+        writer = csv.writer(output)
+        writer.writerow(EXPORT_COLUMNS)
+        async for rows in booking_dao.stream_export(
+                status=status, date_from=date_from, date_to=date_to, batch_size=batch_size
+        ):
+            # Disk (and gzip) work stays off the event loop
+            await asyncio.to_thread(writer.writerows, rows)
+            total += len(rows)
+    except Exception:
+        output.close()
+        os.remove(path)
+        raise
+    output.close()
+    return path, total
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import socket
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database.dao.dao import ScheduledJobDAO
+
+JobFunc = Callable[[], Awaitable]
+
+
+class JobRunner:
+    """
+    Scheduler of the background jobs, stored in the main database.
+
+    Every instance polls `scheduled_jobs` with async queries, so the event
+    loop never waits on job store I/O. A due run is claimed with a
+    conditional UPDATE (a DELETE for one-off jobs) and only the instance
+    that gets the row runs it: an interval job runs once per interval across
+    the whole cluster. Jobs reference their coroutine function by name, so
+    it must be registered (`every`, `at` or `register`) on every instance.
+    """
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker[AsyncSession],
+            poll_seconds: float = 5,
+            instance: Optional[str] = None,
+    ):
+        self.session_pool = session_pool
+        self.poll_seconds = poll_seconds
+        self.instance = instance or f"{socket.gethostname()}:{os.getpid()}"
+        self._functions: dict[str, JobFunc] = {}
+        self._running: dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.failed = 0
+        self.skipped = 0
+
+    @staticmethod
+    def reference(func: JobFunc) -> str:
+        return f"{func.__module__}:{func.__qualname__}"
+
+    def register(self, func: JobFunc) -> str:
+        ref = self.reference(func)
+        self._functions[ref] = func
+        return ref
+
+    async def every(self, func: JobFunc, seconds: int, job_id: Optional[str] = None):
+        """Run `func` every `seconds`, first after one interval. A stored job keeps its next run."""
+        ref = self.register(func)
+        async with self.session_pool() as session:
+            await ScheduledJobDAO(session).schedule(
+                job_id or func.__name__, ref, datetime.utcnow() + timedelta(seconds=seconds), seconds, replace=False
+            )
+        self._wakeup.set()
+
+    async def at(self, func: JobFunc, run_at: datetime, job_id: Optional[str] = None):
+        """Run `func` once at `run_at` (naive UTC), replacing a job with the same id."""
+        ref = self.register(func)
+        async with self.session_pool() as session:
+            await ScheduledJobDAO(session).schedule(job_id or func.__name__, ref, run_at)
+        self._wakeup.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop(), name="job-runner")
+        logger.info(f"Job runner {self.instance} started with {len(self._functions)} functions.")
+
+    async def stop(self, timeout: float = 10):
+        """Stop claiming jobs and give the running ones `timeout` seconds to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        running = list(self._running.values())
+        if running:
+            done, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if pending:
+                logger.error(f"{len(pending)} jobs did not finish in {timeout}s and were canceled.")
+        logger.info(f"Job runner stopped: {self.metrics()}")
+
+    async def _loop(self):
+        while True:
+            try:
+                delay = await self.run_pending()
+            except Exception as e:
+                logger.error(f"Job runner poll failed: {e}")
+                delay = self.poll_seconds
+            self._wakeup.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+
+    async def run_pending(self) -> float:
+        """Start the due jobs this instance could claim; returns the seconds until the next poll."""
+        now = datetime.utcnow()
+        async with self.session_pool() as session:
+            dao = ScheduledJobDAO(session)
+            for job in await dao.find_due(now):
+                func = self._functions.get(job.func)
+                if func is None:
+                    # Left for an instance that registered it
+                    continue
+                if not await dao.claim(job, now, self.instance):
+                    continue
+                previous = self._running.get(job.id)
+                if previous is not None and not previous.done():
+                    self.skipped += 1
+                    logger.warning(f"Job {job.id} skipped, the previous run is still going.")
+                    continue
+                self._running[job.id] = asyncio.create_task(self._run(job.id, func), name=f"job-{job.id}")
+            next_run_at = await dao.next_run_at()
+
+        if next_run_at is None:
+            return self.poll_seconds
+        delay = (next_run_at - datetime.utcnow()).total_seconds()
+        return delay if 0 < delay < self.poll_seconds else self.poll_seconds
+
+    async def _run(self, job_id: str, func: JobFunc):
+        try:
+            await func()
+            self.runs += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Job {job_id} failed: {e}")
+        finally:
+            self._running.pop(job_id, None)
+
+    def metrics(self) -> dict:
+        return {
+            "running": len(self._running),
+            "runs": self.runs,
+            "failed": self.failed,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,138 @@
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BACKGROUND = "background"  # SQL and Bot API calls made outside of an update
+
+
+@dataclass
+class UpdateStats:
+    """What one update cost: filled by the SQL hooks and the Bot API middleware."""
+    handler: str = "unhandled"
+    queries: list = field(default_factory=list)  # (statement, seconds, rows)
+    api_calls: list = field(default_factory=list)  # (method, seconds)
+
+    @property
+    def sql_seconds(self) -> float:
+        return sum(seconds for _, seconds, _ in self.queries)
+
+    @property
+    def api_seconds(self) -> float:
+        return sum(seconds for _, seconds in self.api_calls)
+
+    def breakdown(self, limit: int = 10) -> str:
+        lines = [
+            f"  {seconds * 1000:8.2f} ms {rows:>6} rows  {' '.join(statement.split())[:160]}"
+            for statement, seconds, rows in sorted(self.queries, key=lambda query: -query[1])[:limit]
+        ]
+        lines += [f"  {seconds * 1000:8.2f} ms  Bot API {method}" for method, seconds in self.api_calls]
+        return "\n".join(lines)
+
+
+current_update: ContextVar[Optional[UpdateStats]] = ContextVar("current_update", default=None)
+
+
+class MetricsRegistry:
+    """Per-handler counters rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.updates = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.duration_sum = defaultdict(float)
+        self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.sql_statements = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.sql_rows = defaultdict(int)
+        self.api_calls = defaultdict(int)  # (handler, method)
+        self.api_seconds = defaultdict(float)
+
+    def observe_update(self, stats: UpdateStats, seconds: float, failed: bool = False):
+        handler = stats.handler
+        self.updates[handler] += 1
+        if failed:
+            self.errors[handler] += 1
+        self.duration_sum[handler] += seconds
+        buckets = self.duration_buckets[handler]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        self.observe_queries(handler, stats.queries)
+        for method, api_seconds in stats.api_calls:
+            self.observe_api_call(handler, method, api_seconds)
+
+    def observe_queries(self, handler: str, queries: list):
+        self.sql_statements[handler] += len(queries)
+        for _, seconds, rows in queries:
+            self.sql_seconds[handler] += seconds
+            self.sql_rows[handler] += rows
+
+    def observe_api_call(self, handler: str, method: str, seconds: float):
+        self.api_calls[handler, method] += 1
+        self.api_seconds[handler, method] += seconds
+
+    def render(self, gauges: Optional[dict[str, float]] = None) -> str:
+        lines = []
+
+        def family(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        family("bot_updates_total", "counter", "Handled updates.",
+               [({"handler": h}, v) for h, v in self.updates.items()])
+        family("bot_update_errors_total", "counter", "Updates that raised.",
+               [({"handler": h}, v) for h, v in self.errors.items()])
+
+        lines.append("# HELP bot_update_duration_seconds Wall time of an update.")
+        lines.append("# TYPE bot_update_duration_seconds histogram")
+        for handler, buckets in self.duration_buckets.items():
+            for bound, count in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'bot_update_duration_seconds_bucket{{handler="{handler}",le="{bound}"}} {count}')
+            lines.append(f'bot_update_duration_seconds_bucket{{handler="{handler}",le="+Inf"}} {self.updates[handler]}')
+            lines.append(f'bot_update_duration_seconds_sum{{handler="{handler}"}} {self.duration_sum[handler]:.6f}')
+            lines.append(f'bot_update_duration_seconds_count{{handler="{handler}"}} {self.updates[handler]}')
+
+        family("bot_sql_statements_total", "counter", "SQL statements executed.",
+               [({"handler": h}, v) for h, v in self.sql_statements.items()])
+        family("bot_sql_duration_seconds_total", "counter", "Time spent in SQL statements.",
+               [({"handler": h}, f"{v:.6f}") for h, v in self.sql_seconds.items()])
+        family("bot_sql_rows_total", "counter", "Rows reported by the database cursor.",
+               [({"handler": h}, v) for h, v in self.sql_rows.items()])
+        family("bot_api_requests_total", "counter", "Bot API requests.",
+               [({"handler": h, "method": m}, v) for (h, m), v in self.api_calls.items()])
+        family("bot_api_duration_seconds_total", "counter", "Time spent in Bot API requests.",
+               [({"handler": h, "method": m}, f"{v:.6f}") for (h, m), v in self.api_seconds.items()])
+
+        for name, value in (gauges or {}).items():
+            family(f"bot_{name}", "gauge", name.replace("_", " ").capitalize() + ".", [({}, value)])
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Count statements, time and rows of every query made through `engine`."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_started"].pop()
+        # SELECT row counts are only reported by some drivers (-1 otherwise)
+        query = (statement, seconds, max(cursor.rowcount, 0))
+        stats = current_update.get()
+        if stats is not None:
+            stats.queries.append(query)
+        else:
+            metrics.observe_queries(BACKGROUND, [query])
@@ -0,0 +1,236 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.types import Message
+from loguru import logger
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `capacity` accumulated."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        # `now` may predate the bucket: read by the caller before creating it
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class _Job:
+    chat_id: int
+    method: str  # Bot method, send_message or send_document
+    kwargs: dict
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class MessageDispatcher:
+    """
+    Outbound queue for messages that are not a direct reply to an update
+    (admin alerts, notifications, broadcasts).
+
+    Messages are released by a global and a per-chat token bucket and sent
+    concurrently up to `concurrency`. A chat that is over its limit or got a
+    RetryAfter is rescheduled, it never holds back other chats. `send()` and
+    `send_document()` return a future with the sent Message, or None if
+    delivery failed.
+    """
+
+    max_buckets = 10_000
+
+    def __init__(
+            self,
+            bot: Bot,
+            global_rate: float = 30,
+            chat_rate: float = 1,
+            chat_burst: float = 3,
+            concurrency: int = 10,
+            max_attempts: int = 3,
+    ):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._heap: list[tuple[float, int, _Job]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight: set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.max_depth = 0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._heap) + len(self._in_flight)
+
+    def start(self):
+        self._accepting = True
+        self._task = asyncio.create_task(self._run(), name="message-dispatcher")
+        logger.info("Message dispatcher started.")
+
+    def send(self, chat_id: int, text: str, **kwargs: Any) -> asyncio.Future:
+        """Enqueue a message without waiting for it to be sent."""
+        return self._enqueue(chat_id, "send_message", {"text": text, **kwargs})
+
+    def send_document(self, chat_id: int, document: Any, **kwargs: Any) -> asyncio.Future:
+        """Enqueue a document (file_id, URL or InputFile), same limits as messages."""
+        return self._enqueue(chat_id, "send_document", {"document": document, **kwargs})
+
+    def _enqueue(self, chat_id: int, method: str, kwargs: dict) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        if not self._accepting:
+            logger.warning(f"Message dispatcher is stopped, message to {chat_id} dropped.")
+            future.set_result(None)
+            return future
+        self._push(_Job(chat_id, method, kwargs, future), time.monotonic())
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        return future
+
+    def send_many(self, chat_ids: Iterable[int], text: str, **kwargs: Any) -> list[asyncio.Future]:
+        return [self.send(chat_id, text, **kwargs) for chat_id in chat_ids]
+
+    def _push(self, job: _Job, due: float):
+        heapq.heappush(self._heap, (due, next(self._counter), job))
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_buckets:
+                # Idle chats have a full bucket, forgetting them changes nothing
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if not value.is_full(now)
+                }
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, capacity=self.chat_burst)
+        return bucket
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            due = self._heap[0][0]
+            if due > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, job = heapq.heappop(self._heap)
+            chat_bucket = self._chat_bucket(job.chat_id, now)
+            wait = max(chat_bucket.wait_time(now), self.global_bucket.wait_time(now))
+            if wait > 0:
+                self._push(job, now + wait)
+                continue
+            chat_bucket.consume(now)
+            self.global_bucket.consume(now)
+
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._deliver(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _deliver(self, job: _Job):
+        job.attempts += 1
+        try:
+            message: Message = await getattr(self.bot, job.method)(job.chat_id, **job.kwargs)
+        except TelegramRetryAfter as e:
+            self.retried += 1
+            logger.warning(f"Flood control for chat {job.chat_id}, resend in {e.retry_after}s.")
+            self._push(job, time.monotonic() + e.retry_after)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if job.attempts < self.max_attempts:
+                self.retried += 1
+                self._push(job, time.monotonic() + 2 ** job.attempts)
+            else:
+                self._finish(job, None, e)
+        except Exception as e:
+            self._finish(job, None, e)
+        else:
+            self._finish(job, message)
+        finally:
+            self._semaphore.release()
+
+    def _finish(self, job: _Job, message: Optional[Message], error: Optional[Exception] = None):
+        if error is not None:
+            self.failed += 1
+            logger.warning(f"Message to {job.chat_id} was not delivered: {error}")
+        else:
+            self.sent += 1
+            latency = time.monotonic() - job.enqueued_at
+            self.latency_seconds += latency
+            self.max_latency_seconds = max(self.max_latency_seconds, latency)
+        if not job.future.done():
+            job.future.set_result(message)
+
+    async def stop(self, timeout: float = 10):
+        """Stop accepting messages and try to deliver what is queued."""
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.depth:
+            logger.error(f"Message dispatcher was not drained in {timeout}s, {self.depth} messages dropped.")
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for _, _, job in self._heap:
+            if not job.future.done():
+                job.future.set_result(None)
+        self._heap.clear()
+        logger.info(f"Message dispatcher stopped: {self.metrics()}")
+
+    def metrics(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "avg_latency_ms": round(self.latency_seconds / self.sent * 1000, 2) if self.sent else 0.0,
+            "max_latency_ms": round(self.max_latency_seconds * 1000, 2),
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import math
+import time
+from contextlib import suppress
+from typing import Awaitable, Callable, Optional
+
+from aiocryptopay.models.rates import ExchangeRate
+from loguru import logger
+
+from bot.config import config
+from bot.services.crypto import crypto
+
+PIVOT = "USD"  # CryptoBot quotes every crypto asset against the fiat currencies
+DECIMALS = 8  # converted amounts are rounded up to this precision
+
+
+def format_amount(amount: float) -> str:
+    """Plain decimal notation, 0.00025 rather than 2.5e-04."""
+    return f"{amount:.{DECIMALS}f}".rstrip("0").rstrip(".")
+
+
+class ExchangeRates:
+    """
+    In-memory table of CryptoBot exchange rates, refreshed in the background.
+
+    Every instance keeps its own copy (one getExchangeRates call per
+    `refresh_seconds`), so converting a price is a dict lookup. A pair that is
+    not quoted directly, e.g. TON -> BTC, is crossed through USD. Rates older
+    than `max_age` are not used: `convert` returns None and callers fall back
+    to the catalog currency.
+    """
+
+    def __init__(
+            self,
+            fetch: Callable[[], Awaitable[list[ExchangeRate]]],
+            refresh_seconds: float = 60,
+            max_age: float = 600,
+    ):
+        self.fetch = fetch
+        self.refresh_seconds = refresh_seconds
+        self.max_age = max_age
+        self._rates: dict[tuple[str, str], float] = {}
+        self.updated_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.refreshes = 0
+        self.failures = 0
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.updated_at is not None and time.monotonic() - self.updated_at <= self.max_age
+
+    async def refresh(self):
+        rows = await self.fetch()
+        table = {(row.source, row.target): float(row.rate) for row in rows or [] if row.is_valid and row.rate > 0}
+        # Swapped in one assignment, readers never see a half-built table
+        self._rates = table
+        self.updated_at = time.monotonic()
+        self.refreshes += 1
+
+    def rate(self, source: str, target: str) -> Optional[float]:
+        """Price of one `source` in `target`, ignoring staleness."""
+        if source == target:
+            return 1.0
+        rate = self._rates.get((source, target))
+        if rate is not None:
+            return rate
+        inverse = self._rates.get((target, source))
+        if inverse is not None:
+            return 1 / inverse
+        if PIVOT in (source, target):
+            return None
+        to_pivot, from_pivot = self.rate(source, PIVOT), self.rate(PIVOT, target)
+        return to_pivot * from_pivot if to_pivot is not None and from_pivot is not None else None
+
+    def convert(self, amount: float, source: str, target: str) -> Optional[float]:
+        """`amount` of `source` in `target`, rounded up; None if the rate is unknown or stale."""
+        if source == target:
+            return amount
+        rate = self.rate(source, target) if self.is_fresh else None
+        if rate is None:
+            return None
+        scale = 10 ** DECIMALS
+        # round() first: float noise must not push an exact amount one unit up
+        return math.ceil(round(amount * rate * scale, 2)) / scale
+
+    def format_price(self, amount: float, source: str, target: Optional[str]) -> str:
+        """"15.0 USDT", or "15.0 USDT ≈ 3.0 TON" when the user picked another asset."""
+        text = f"{amount} {source}"
+        converted = self.convert(amount, source, target) if target and target != source else None
+        return f"{text} ≈ {format_amount(converted)} {target}" if converted is not None else text
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop(), name="exchange-rates")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Exchange rates refresh failed: {e!r}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def metrics(self) -> dict:
+        return {
+            "pairs": len(self._rates),
+            "age_seconds": round(time.monotonic() - self.updated_at, 1) if self.updated_at is not None else -1,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+
+rates = ExchangeRates(
+    lambda: crypto.call("get_exchange_rates"),
+    refresh_seconds=config.RATES_REFRESH_SECONDS,
+    max_age=config.RATES_MAX_AGE_SECONDS,
+)
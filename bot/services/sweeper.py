@@ -0,0 +1,75 @@
+import asyncio
+import time
+from typing import Type
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database.dao.base import BaseDAO
+from bot.database.dao.dao import PaymentDAO
+from bot.services.crypto import delete_invoice
+from bot.services.outbox import MessageDispatcher
+
+# Last sweep per model, e.g. {"Booking": {"canceled": 3, ...}}
+sweep_metrics: dict[str, dict] = {}
+
+
+async def delete_invoices(invoice_ids: list[int], concurrency: int = 10) -> int:
+    """Delete CryptoBot invoices of canceled rows; returns how many failed."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def delete(invoice_id: int):
+        async with semaphore:
+            return await delete_invoice(invoice_id)
+
+    results = await asyncio.gather(*(delete(invoice_id) for invoice_id in invoice_ids), return_exceptions=True)
+    errors = [e for e in results if isinstance(e, Exception)]
+    for e in errors:
+        logger.warning(f"Failed to delete CryptoBot invoice: {e}")
+    return len(errors)
+
+
+async def sweep_expired(
+        session_pool: async_sessionmaker[AsyncSession],
+        dao_class: Type[BaseDAO],
+        outbox: MessageDispatcher,
+        expire_minutes: int,
+        text: str,
+        chunk_size: int = 500,
+) -> dict:
+    """
+    Cancel expired unpaid rows of `dao_class.model` chunk by chunk.
+
+    Each chunk is one short UPDATE ... RETURNING transaction; the invoices of
+    canceled rows are deleted in CryptoBot and the owners are notified once
+    per sweep through the rate-limited outbox.
+    """
+    started = time.perf_counter()
+    metrics = {"canceled": 0, "chunks": 0, "invoices_deleted": 0, "invoice_errors": 0}
+    user_ids: set[int] = set()
+
+    async with session_pool() as session:
+        dao = dao_class(session)
+        payment_dao = PaymentDAO(session)
+        after_id = 0
+        while rows := await dao.cancel_expired_chunk(expire_minutes, chunk_size, after_id):
+            after_id = rows[-1].id
+            metrics["chunks"] += 1
+            metrics["canceled"] += len(rows)
+            user_ids.update(row.user_id for row in rows)
+
+            invoice_ids = await payment_dao.get_invoice_ids(
+                [row.payment_id for row in rows if row.payment_id is not None]
+            )
+            errors = await delete_invoices(invoice_ids)
+            metrics["invoices_deleted"] += len(invoice_ids) - errors
+            metrics["invoice_errors"] += errors
+
+    delivered = await asyncio.gather(*outbox.send_many(user_ids, text))
+    metrics["notified"] = sum(message is not None for message in delivered)
+    metrics["notify_failed"] = len(delivered) - metrics["notified"]
+    metrics["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    sweep_metrics[dao_class.model.__name__] = metrics
+    logger.info(f"Expiry sweep of {dao_class.model.__tablename__}: {metrics}")
+    return metrics
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+from loguru import logger
+
+
+class UpdateQueue:
+    """
+    Bounded in-process queue between the webhook endpoint and the dispatcher.
+
+    The queue is split into one shard per worker and every update is routed by
+    its chat (or user) id, so updates of the same chat are always handled by
+    the same worker in the order they arrived.
+
+    Every shard holds `maxsize // workers` updates, not `maxsize`: a burst from
+    chats that hash to one shard is rejected once that shard is full, even if
+    the other shards are empty.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int = 8, maxsize: int = 1000):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        shard_size = max(1, maxsize // workers)
+        self._shards = [asyncio.Queue(maxsize=shard_size) for _ in range(workers)]
+        self._tasks: list[asyncio.Task] = []
+        self._accepting = False
+
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self._shards)
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._worker(shard), name=f"update-worker-{i}")
+            for i, shard in enumerate(self._shards)
+        ]
+        self._accepting = True
+        logger.info(f"Update queue started with {len(self._shards)} workers.")
+
+    def put(self, update: Update) -> bool:
+        """Enqueue without waiting; False means the caller should ask Telegram to retry."""
+        if not self._accepting:
+            self.rejected += 1
+            return False
+
+        context = UserContextMiddleware.resolve_event_context(update)
+        route_key = context.chat_id or context.user_id or update.update_id
+        try:
+            self._shards[route_key % len(self._shards)].put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Update queue is full, update {update.update_id} rejected.")
+            return False
+
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        return True
+
+    async def _worker(self, shard: asyncio.Queue):
+        while True:
+            update, enqueued_at = await shard.get()
+            self.wait_seconds += time.monotonic() - enqueued_at
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error when processing queued update {update.update_id}: {e}")
+            finally:
+                shard.task_done()
+
+    async def stop(self, timeout: float = 10):
+        """Stop accepting updates, drain what is queued and stop the workers."""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(shard.join() for shard in self._shards)), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Update queue was not drained in {timeout}s, {self.depth} updates dropped.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Update queue stopped: {self.metrics()}")
+
+    def metrics(self) -> dict:
+        handled = self.processed + self.failed
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_seconds / handled * 1000, 2) if handled else 0.0,
+        }
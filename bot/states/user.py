@@ -13,7 +13,7 @@ class JourneyBooking(StatesGroup):
 class OfferOrder(StatesGroup):
     user_id = State()
     offer_id = State()
-    full_name = State
+    full_name = State()
     age = State()
     zip_code = State()
     month = State()
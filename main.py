@@ -1,35 +1,59 @@
 from contextlib import asynccontextmanager
+from aiocryptopay.models.update import Update as CryptoUpdate
 from aiogram.types import Update
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from loguru import logger
 
-from bot.create_bot import dp, start_bot, bot, stop_bot
-from bot.config import config, broker, scheduler
-from bot.api.router import router as router_fast_stream, disable_booking
-from bot.database.main import init_db
+from bot.create_bot import dp, start_bot, bot, stop_bot, outbox, job_runner
+from bot.config import config, broker
+from bot.api.router import (
+    router as router_fast_stream,
+    disable_expired_bookings,
+    disable_expired_orders,
+    check_pending_invoices,
+    confirm_paid_invoice,
+    cleanup_fsm_states,
+    dispatch_campaign_messages,
+)
+from bot.database.engine import pool_stats
+from bot.database.main import init_db, engine, async_session_maker
+from bot.services.campaigns import setup_campaigns
+from bot.services.crypto import crypto, verify_webhook_signature
+from bot.services.dedup import UpdateDeduplicator
+from bot.database.dao.dao import offer_cache, route_cache
+from bot.services.metrics import metrics
+from bot.services.rates import rates
+from bot.services.update_queue import UpdateQueue
+
+update_queue = UpdateQueue(dp, bot, workers=config.UPDATE_WORKERS, maxsize=config.UPDATE_QUEUE_SIZE)
+dedup = UpdateDeduplicator(
+    maxsize=config.UPDATE_DEDUP_SIZE,
+    retention=config.UPDATE_DEDUP_RETENTION_SECONDS,
+    session_pool=async_session_maker if config.UPDATE_DEDUP_DB else None,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await setup_campaigns(async_session_maker)
     logger.info("The bot is launched ...")
     await start_bot()
     await broker.start()
-    scheduler.start()
-    scheduler.add_job(
-        disable_expired_bookings,
-        "interval",
-        minutes=30,
-        id="disable_expired_bookings",
-        replace_existing=True,
-    )
-    scheduler.add_job(
-        disable_expired_orders,
-        "interval",
-        minutes=30,
-        id="disable_expired_orders",
-        replace_existing=True,
-    )
+    if config.UPDATE_QUEUE_ENABLED:
+        update_queue.start()
+    # Stored in the main database, each run is claimed by a single instance.
+    # Paid invoices are pushed to /cryptobot, the invoice poll only reconciles
+    await job_runner.every(disable_expired_bookings, seconds=config.EXPIRY_SWEEP_MINUTES * 60)
+    await job_runner.every(disable_expired_orders, seconds=config.EXPIRY_SWEEP_MINUTES * 60)
+    await job_runner.every(check_pending_invoices, seconds=config.INVOICE_POLL_SECONDS)
+    await job_runner.every(dispatch_campaign_messages, seconds=config.CAMPAIGN_TICK_SECONDS)
+    await job_runner.every(cleanup_fsm_states, seconds=3600)
+    if config.UPDATE_DEDUP_DB:
+        await job_runner.every(dedup.cleanup, seconds=3600, job_id="cleanup_processed_updates")
+    job_runner.start()
+    # Kept in each instance's memory, so every instance refreshes its own copy
+    rates.start()
 
     webhook_url = config.hook_url
     await bot.set_webhook(
@@ -38,26 +62,80 @@ async def lifespan(app: FastAPI):
         drop_pending_updates=True
     )
     logger.success(f"Webhook is installed:{webhook_url}")
+    logger.info(f"CryptoBot webhook URL (set it in the app settings): {config.crypto_hook_url}")
     yield
     logger.info("The bot is stopped ...")
+    if config.UPDATE_QUEUE_ENABLED:
+        await update_queue.stop(timeout=config.UPDATE_DRAIN_TIMEOUT)
+    # Jobs still send through the outbox and read the FSM storage: drain them first
+    await job_runner.stop(timeout=config.JOB_DRAIN_TIMEOUT)
     await stop_bot()
+    await dp.storage.close()
     await broker.close()
-    scheduler.shutdown()
+    await rates.stop()
+    await crypto.close()
+    logger.info(f"DB pool stats: {pool_stats(engine)}")
+    await logger.complete()
 
 
 app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/webhook")
-async def webhook(request: Request) -> None:
+async def webhook(request: Request) -> Response:
     logger.info("A request from webhook was received.")
     try:
         update_data = await request.json()
         update = Update.model_validate(update_data, context={"bot": bot})
+        if config.UPDATE_DEDUP_ENABLED and await dedup.is_duplicate(update.update_id):
+            return Response()
+        if config.UPDATE_QUEUE_ENABLED:
+            if not update_queue.put(update):
+                # Telegram redelivers the update later
+                if config.UPDATE_DEDUP_ENABLED:
+                    await dedup.forget(update.update_id)
+                return Response(status_code=503)
+            return Response()
         await dp.feed_update(bot, update)
         logger.info("The update is successfully processed.")
     except Exception as e:
         logger.error(f"Error when processing update with webhook: {e}")
+    return Response()
+
+
+@app.post("/cryptobot")
+async def cryptobot_webhook(request: Request) -> Response:
+    """`invoice_paid` updates pushed by CryptoBot."""
+    body = await request.body()
+    if not verify_webhook_signature(body, request.headers.get("crypto-pay-api-signature")):
+        logger.warning("CryptoBot webhook with an invalid signature rejected.")
+        return Response(status_code=401)
+    try:
+        update = CryptoUpdate.model_validate_json(body)
+        if update.update_type == "invoice_paid":
+            await confirm_paid_invoice(update.payload.invoice_id)
+    except Exception as e:
+        # Nothing was committed, the invoice is still unpaid: CryptoBot retries
+        # and the retry confirms it and sends the notices
+        logger.error(f"Error when processing CryptoBot update: {e}")
+        return Response(status_code=500)
+    return Response()
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> Response:
+    gauges = {
+        **{f"update_queue_{key}": value for key, value in update_queue.metrics().items()},
+        **{f"outbox_{key}": value for key, value in outbox.metrics().items()},
+        **{f"jobs_{key}": value for key, value in job_runner.metrics().items()},
+        **{f"dedup_{key}": value for key, value in dedup.metrics().items()},
+        **{f"cryptobot_{key}": value for key, value in crypto.metrics().items()},
+        **{f"rates_{key}": value for key, value in rates.metrics().items()},
+        **{f"db_pool_{key}": value for key, value in pool_stats(engine).items() if isinstance(value, (int, float))},
+        **{f"route_cache_{key}": value for key, value in route_cache.stats().items()},
+        **{f"offer_cache_{key}": value for key, value in offer_cache.stats().items()},
+    }
+    return Response(metrics.render(gauges), media_type="text/plain; version=0.0.4")
 
 
 app.include_router(router_fast_stream)
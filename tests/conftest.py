@@ -1,45 +1,73 @@
-import pytest
-import aiosqlite
-import asyncio
+import os
 
+import pytest
 import pytest_asyncio
 
-from bot.database.db import init_db, save_order
-
-TEST_DB_PATH = "test_orders.db"
-
-
-@pytest.fixture(scope="session")
-def event_loop():
-    # Use a single event loop for all async tests
-    return asyncio.get_event_loop()
-
-@pytest_asyncio.fixture(scope="module")
-async def setup_test_db():
-    await init_db(db_path=TEST_DB_PATH)
-
-    # Clean existing orders
-    async with aiosqlite.connect(TEST_DB_PATH) as db:
-        await db.execute("DELETE FROM orders")
-        await db.commit()
-
-    # Create test order
-    await save_order({
-        "user_id": 1001,
-        "username": "@test_user",
-        "departure": "Station A",
-        "destination": "Station B",
-        "travel_date": "2025-08-01",
-        "seat_type": "Standard",
-        "quantity": 2,
-        "price": 20.5,
-        "invoice_id": "test_invoice_123",
-        "payment_method": "cryptobot"
-    }, db_path=TEST_DB_PATH)
-
-    yield TEST_DB_PATH  # provide path to use in test
-
-    # Clean on the end the tests
-    async with aiosqlite.connect(TEST_DB_PATH) as db:
-        await db.execute("DELETE FROM orders")
-        await db.commit()
+# bot.config reads the settings at import time
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("CRYPTO_PAY_TOKEN", "test")
+os.environ.setdefault("ADMIN_IDS", "[1]")
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("NETWORK_CRYPTO_API", "TEST_NET")
+os.environ.setdefault("SUPPORTS", "[]")
+os.environ.setdefault("BASE_URL", "http://localhost")
+os.environ.setdefault("RABBITMQ_USERNAME", "guest")
+os.environ.setdefault("RABBITMQ_PASSWORD", "guest")
+os.environ.setdefault("RABBITMQ_HOST", "localhost")
+os.environ.setdefault("RABBITMQ_PORT", "5672")
+os.environ.setdefault("VHOST", "test")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession  # noqa: E402
+
+from bot.database import Base  # noqa: E402
+from bot.services.crypto import CircuitBreaker, CryptoPayClient, PooledCryptoPay  # noqa: E402
+from tests.fake_cryptobot import FakeCryptoBot  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    test_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield test_engine
+    await test_engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def session_pool(engine):
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest_asyncio.fixture
+async def session(session_pool):
+    async with session_pool() as test_session:
+        yield test_session
+
+
+@pytest.fixture
+def statements(engine):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    yield executed
+    event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+
+@pytest_asyncio.fixture
+async def fake_bot():
+    server = FakeCryptoBot()
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest_asyncio.fixture
+async def client(fake_bot):
+    api = PooledCryptoPay(token="test", network=fake_bot.url, timeout=2)
+    pay_client = CryptoPayClient(api, backoff=0.01, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.2))
+    yield pay_client
+    await pay_client.close()
@@ -0,0 +1,81 @@
+"""Local stand-in for the Crypto Pay API, served by aiohttp on a random port."""
+import asyncio
+import itertools
+from collections import Counter
+from datetime import datetime
+
+from aiohttp import web
+
+
+def invoice_payload(invoice_id: int, status: str = "active", amount: float = 10, asset: str = "USDT") -> dict:
+    return {
+        "invoice_id": invoice_id,
+        "status": status,
+        "hash": f"IV{invoice_id}",
+        "asset": asset,
+        "amount": str(amount),
+        "bot_invoice_url": f"https://t.me/CryptoTestnetBot?start=IV{invoice_id}",
+        "web_app_invoice_url": f"https://testnet-app.send.tg/invoices/IV{invoice_id}",
+        "mini_app_invoice_url": f"https://t.me/CryptoTestnetBot/app?startapp=invoice-IV{invoice_id}",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "allow_comments": True,
+        "allow_anonymous": True,
+        "currency_type": "crypto",
+    }
+
+
+class FakeCryptoBot:
+    """
+    `fail_next` requests answer 502 with an HTML body, like a proxy in front
+    of a CryptoBot outage; every answer is delayed by `latency` seconds.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.fail_next = 0
+        self.calls = Counter()
+        self.statuses: dict[int, str] = {}
+        self.rates = {"USDT": "1.0", "TON": "5.0", "BTC": "60000.0"}  # to USD
+        self._invoice_ids = itertools.count(1)
+        self._runner = None
+        self.url = ""
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_next:
+            self.fail_next -= 1
+            return web.Response(status=502, text="<html>Bad Gateway</html>", content_type="text/html")
+
+        if method == "createInvoice":
+            invoice_id = next(self._invoice_ids)
+            self.statuses[invoice_id] = "active"
+            result = invoice_payload(invoice_id, amount=float(request.query["amount"]))
+        elif method == "getInvoices":
+            ids = [int(i) for i in request.query.get("invoice_ids", "").split(",") if i]
+            result = {"items": [invoice_payload(i, self.statuses[i]) for i in ids if i in self.statuses]}
+        elif method == "deleteInvoice":
+            result = self.statuses.pop(int(request.query["invoice_id"]), None) is not None
+        elif method == "getExchangeRates":
+            result = [
+                {"is_valid": True, "is_crypto": True, "is_fiat": False, "source": asset, "target": "USD", "rate": rate}
+                for asset, rate in self.rates.items()
+            ]
+        else:
+            return web.json_response({"ok": False, "error": {"code": 405, "name": "METHOD_NOT_FOUND"}})
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/{method}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
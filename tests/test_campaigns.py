@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+from bot.database.dao.dao import CampaignDAO, CampaignMessageDAO
+from bot.database.models import User, Booking, Route, CampaignMessage
+from bot.services.campaigns import broadcast, dispatch_campaigns, enroll_user, setup_campaigns, WELCOME
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+
+    @property
+    def depth(self):
+        return 0
+
+    def send(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+async def make_due(session):
+    await session.execute(CampaignMessage.__table__.update().values(due_at=datetime(2020, 1, 1)))
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_welcome_campaign_steps(session, session_pool):
+    await setup_campaigns(session_pool)
+    await enroll_user(session_pool, 1, WELCOME)
+    await enroll_user(session_pool, 1, WELCOME)
+    outbox = FakeOutbox()
+
+    assert await dispatch_campaigns(session_pool, outbox) == 0
+    await make_due(session)
+    assert await dispatch_campaigns(session_pool, outbox) == 1
+    await make_due(session)
+    assert await dispatch_campaigns(session_pool, outbox) == 1
+
+    assert [chat_id for chat_id, _ in outbox.sent] == [1, 1]
+    assert outbox.sent[0][1] != outbox.sent[1][1]
+    assert await CampaignMessageDAO(session).find_all() == []
+
+
+@pytest.mark.asyncio
+async def test_broadcast_to_segment_in_batches(session, session_pool):
+    session.add_all(User(id=i, username=f"u{i}") for i in range(1, 8))
+    session.add(Route(id=1, departure="A", destination="B", cost=1))
+    session.add_all(Booking(user_id=i, route_id=1, date="today", price=1, status="paid") for i in (2, 3, 5))
+    session.add(Booking(user_id=3, route_id=1, date="today", price=1, status="paid"))
+    await session.commit()
+
+    assert await broadcast(CampaignDAO(session), CampaignMessageDAO(session), "customers", "News") == 3
+
+    outbox = FakeOutbox()
+    assert await dispatch_campaigns(session_pool, outbox, batch_size=2) == 3
+    assert sorted(outbox.sent) == [(2, "News"), (3, "News"), (5, "News")]
+
+
+@pytest.mark.asyncio
+async def test_broadcasts_in_the_same_second_are_separate_and_removed(session, session_pool):
+    await setup_campaigns(session_pool)
+    session.add_all(User(id=i, username=f"u{i}") for i in (1, 2))
+    await session.commit()
+
+    assert await broadcast(CampaignDAO(session), CampaignMessageDAO(session), "all", "First") == 2
+    assert await broadcast(CampaignDAO(session), CampaignMessageDAO(session), "all", "Second") == 2
+    # Nobody to send it to: not kept
+    assert await broadcast(CampaignDAO(session), CampaignMessageDAO(session), "customers", "Third") == 0
+
+    outbox = FakeOutbox()
+    assert await dispatch_campaigns(session_pool, outbox) == 4
+    assert sorted(outbox.sent) == [(1, "First"), (1, "Second"), (2, "First"), (2, "Second")]
+    assert [campaign.name for campaign in await CampaignDAO(session).find_all()] == [WELCOME]
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import hmac
+
+import pytest
+from aiohttp import ClientResponseError
+
+from bot.services.crypto import CircuitOpenError, verify_webhook_signature
+
+
+@pytest.mark.asyncio
+async def test_reads_are_retried_with_backoff(fake_bot, client):
+    invoice = await client.call("create_invoice", asset="USDT", amount=5, retry=False)
+    fake_bot.fail_next = 2
+
+    found = await client.call("get_invoices", invoice_ids=invoice.invoice_id)
+
+    assert found.status == "active"
+    assert fake_bot.calls["getInvoices"] == 3
+    assert client.retries == 2
+
+
+@pytest.mark.asyncio
+async def test_invoice_creation_is_not_retried(fake_bot, client):
+    fake_bot.fail_next = 1
+
+    with pytest.raises(ClientResponseError):
+        await client.call("create_invoice", asset="USDT", amount=5, retry=False)
+    assert fake_bot.calls["createInvoice"] == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast_then_recovers(fake_bot, client):
+    fake_bot.fail_next = 3
+    with pytest.raises(ClientResponseError):
+        await client.call("get_invoices", invoice_ids=[1])
+
+    with pytest.raises(CircuitOpenError):
+        await client.call("get_invoices", invoice_ids=[1])
+    assert fake_bot.calls["getInvoices"] == 3
+
+    await asyncio.sleep(0.25)
+    assert await client.call("get_invoices", invoice_ids=[1]) is None
+    assert client.metrics()["circuit_open"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_call_does_not_jam_the_circuit(fake_bot, client):
+    fake_bot.fail_next = 3
+    with pytest.raises(ClientResponseError):
+        await client.call("get_invoices", invoice_ids=[1])
+    await asyncio.sleep(0.25)
+
+    fake_bot.latency = 1
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(client.call("get_invoices", invoice_ids=[1]), timeout=0.05)
+
+    fake_bot.latency = 0
+    assert await client.call("get_invoices", invoice_ids=[1]) is None
+    assert client.metrics()["circuit_open"] == 0
+
+
+@pytest.mark.asyncio
+async def test_identical_status_requests_are_coalesced(fake_bot, client):
+    invoice = await client.call("create_invoice", asset="USDT", amount=5, retry=False)
+    fake_bot.latency = 0.1
+
+    def status():
+        return client.coalesced(
+            ("get_invoices", invoice.invoice_id),
+            lambda: client.call("get_invoices", invoice_ids=invoice.invoice_id),
+        )
+
+    results = await asyncio.gather(*(status() for _ in range(5)))
+
+    assert {result.status for result in results} == {"active"}
+    assert fake_bot.calls["getInvoices"] == 1
+    assert client.metrics()["coalesced"] == 4
+
+
+def test_webhook_signature():
+    body = b'{"update_id":1,"update_type":"invoice_paid"}'
+    signature = hmac.new(hashlib.sha256(b"token").digest(), body, hashlib.sha256).hexdigest()
+
+    assert verify_webhook_signature(body, signature, token="token")
+    assert not verify_webhook_signature(body, signature, token="other")
+    assert not verify_webhook_signature(body + b" ", signature, token="token")
+    assert not verify_webhook_signature(body, None, token="token")
@@ -0,0 +1,283 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import event
+
+from bot.database.dao.dao import BookingDAO, MonthlyPassDAO, OfferDAO, RouteDAO, UserDAO, route_cache
+from bot.database.dao.registry import DAORegistry
+from bot.middlewares.db import DbSessionMiddleware
+from bot.database.models import User, Route, Booking, Offer, MonthlyPass, Payment
+from bot.database.schemas.booking import BookingBase, BookingByStatus, BookingsByUser
+from bot.database.schemas.monthly_pass import PassStatus
+from bot.database.schemas.route import RouteCreate
+from bot.database.schemas.user import UserCreate
+
+
+async def seed(session, count: int = 20):
+    session.add(User(id=1, username="user"))
+    session.add_all(Route(id=i, departure=f"A{i}", destination="B", cost=i) for i in range(1, count + 1))
+    session.add_all(
+        Booking(user_id=1, route_id=i, date="today", price=i, status="paid") for i in range(1, count + 1)
+    )
+    session.add(Offer(id=1, name="Pass", description="", advantages="", url="http://x", price=1))
+    session.add_all(
+        MonthlyPass(user_id=1, offer_id=1, month=date.today(), status="paid")
+        for _ in range(count)
+    )
+    await session.commit()
+    session.expunge_all()
+
+
+@pytest.mark.asyncio
+async def test_paid_bookings_load_routes_in_one_query(session, statements):
+    await seed(session)
+    statements.clear()
+
+    bookings = await BookingDAO(session).get_booking_paid(user_id=1)
+
+    assert [booking.route.departure for booking in bookings] == [f"A{i}" for i in range(1, 21)]
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_find_last_by_user_ignores_other_users(session):
+    await seed(session, count=3)
+    session.add(User(id=2, username="other"))
+    session.add(Booking(user_id=2, route_id=1, date="today", price=1, status="unpaid"))
+    await session.commit()
+
+    booking_dao = BookingDAO(session)
+    assert (await booking_dao.find_last_by_user(user_id=1)).id == 3
+    assert (await booking_dao.find_last_by_user(user_id=2)).id == 4
+    assert await booking_dao.find_last_by_user(user_id=3) is None
+
+
+@pytest.mark.asyncio
+async def test_find_page_walks_both_ways(session):
+    await seed(session, count=7)
+    booking_dao = BookingDAO(session)
+    filters = BookingsByUser(user_id=1, status="paid")
+
+    first = await booking_dao.find_page(filters, limit=3)
+    assert [b.id for b in first.items] == [7, 6, 5]
+    assert (first.has_newer, first.has_older) == (False, True)
+
+    second = await booking_dao.find_page(filters, before_id=first.items[-1].id, limit=3)
+    last = await booking_dao.find_page(filters, before_id=second.items[-1].id, limit=3)
+    assert [b.id for b in second.items] == [4, 3, 2]
+    assert ([b.id for b in last.items], last.has_older) == ([1], False)
+
+    back = await booking_dao.find_page(filters, after_id=last.items[0].id, limit=3)
+    assert [b.id for b in back.items] == [4, 3, 2]
+    assert (back.has_newer, back.has_older) == (True, True)
+
+
+@pytest.mark.asyncio
+async def test_find_all_eager_loads_many_to_one(session, statements):
+    await seed(session)
+    statements.clear()
+
+    passes = await MonthlyPassDAO(session).find_all(PassStatus(status="paid"), load=("offer", "user"))
+
+    assert {_pass.offer.name for _pass in passes} == {"Pass"}
+    assert {_pass.user.username for _pass in passes} == {"user"}
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_upsert_route_reports_insert_or_update(session, statements):
+    route_dao = RouteDAO(session)
+    # Same second as the update below: timestamps cannot tell them apart
+    route, inserted = await route_dao.upsert_route(RouteCreate(departure="A", destination="B", cost=1))
+    assert inserted
+    statements.clear()
+
+    route, inserted = await route_dao.upsert_route(RouteCreate(departure="A", destination="B", cost=5))
+    assert route.cost == 5
+    assert not inserted
+
+    new_route, inserted = await route_dao.upsert_route(RouteCreate(departure="B", destination="A", cost=7))
+    assert inserted
+    # An existing row costs one extra UPDATE on SQLite, PostgreSQL does it in the INSERT
+    assert [s.split()[0] for s in statements if not s.startswith(("BEGIN", "COMMIT"))] == ["INSERT", "UPDATE", "INSERT"]
+
+
+@pytest.mark.asyncio
+async def test_create_or_update_offer_by_name(session):
+    offer_dao = OfferDAO(session)
+    data = {"name": "Pass", "description": "", "advantages": "", "url": "http://x.com", "price": 1}
+
+    assert await offer_dao.create_or_update_offer(data) == "Create"
+    assert await offer_dao.create_or_update_offer({**data, "price": 2}) == "update"
+    assert (await offer_dao.find_one_or_none_by_id(1)).price == 2
+
+
+@pytest.mark.asyncio
+async def test_user_asset_is_read_fresh(session, session_pool):
+    session.add(User(id=7))
+    await session.commit()
+    user_dao = UserDAO(session)
+    assert await user_dao.get_asset(7) is None
+
+    # /currency handled by another instance
+    async with session_pool() as other:
+        await UserDAO(other).set_asset(7, "TON")
+    assert await user_dao.get_asset(7) == "TON"
+
+
+@pytest.mark.asyncio
+async def test_mark_paid_by_invoice_is_idempotent(session):
+    await seed(session, count=2)
+    session.add_all([Payment(id=1, payment_method="cryptobot", invoice_id=42), Payment(id=2, payment_method="manual")])
+    await session.execute(Booking.__table__.update().values(status="unpaid", payment_id=2))
+    await session.execute(Booking.__table__.update().where(Booking.id == 1).values(payment_id=1))
+    await session.commit()
+    booking_dao = BookingDAO(session)
+
+    rows = await booking_dao.mark_paid_by_invoice(42)
+    assert [(row.id, row.user_id) for row in rows] == [(1, 1)]
+    # Redelivered update
+    assert await booking_dao.mark_paid_by_invoice(42) == []
+    assert await MonthlyPassDAO(session).mark_paid_by_invoice(42) == []
+    assert (await booking_dao.find_one_or_none_by_id(2)).status == "unpaid"
+
+
+@pytest.mark.asyncio
+async def test_set_status_many_returns_only_changed_bookings(session):
+    await seed(session, count=3)
+    session.add(Payment(id=1, payment_method="cryptobot", invoice_id=42))
+    await session.execute(Booking.__table__.update().values(status="unpaid", payment_id=1))
+    await session.commit()
+    booking_dao = BookingDAO(session)
+
+    # The webhook pays the invoice between the poller's read and its UPDATE
+    await booking_dao.mark_paid_by_invoice(42)
+    assert await booking_dao.set_status_many([1, 2], "paid") == []
+
+    await session.execute(Booking.__table__.update().where(Booking.id == 3).values(status="unpaid"))
+    await session.commit()
+    rows = await booking_dao.set_status_many([1, 3], "canceled")
+    assert [(row.id, row.user_id) for row in rows] == [(3, 1)]
+    assert (await booking_dao.find_one_or_none_by_id(1)).status == "paid"
+
+
+@pytest.mark.asyncio
+async def test_cancel_expired_keeps_bookings_paid_meanwhile(session, monkeypatch):
+    await seed(session, count=3)
+    await session.execute(Booking.__table__.update().values(status="unpaid", created_at=datetime(2020, 1, 1)))
+    await session.commit()
+    booking_dao = BookingDAO(session)
+    # No RETURNING: ids are selected first, the webhook pays one before the UPDATE
+    monkeypatch.setattr(session.bind.dialect, "update_returning", False)
+    execute = session.execute
+
+    async def pay_after_select(statement, *args, **kwargs):
+        result = await execute(statement, *args, **kwargs)
+        if statement.is_select:
+            await execute(Booking.__table__.update().where(Booking.id == 2).values(status="paid"))
+        return result
+
+    monkeypatch.setattr(session, "execute", pay_after_select)
+    await booking_dao.cancel_expired_chunk(expire_minutes=60, limit=10)
+    monkeypatch.undo()
+
+    statuses = [booking.status for booking in await booking_dao.find_all()]
+    assert statuses == ["canceled", "paid", "canceled"]
+
+
+@pytest.mark.asyncio
+async def test_update_returning(session):
+    await seed(session, count=3)
+
+    bookings = await BookingDAO(session).update_returning(
+        BookingBase(id=2), BookingByStatus(status="canceled")
+    )
+
+    assert [(booking.id, booking.status) for booking in bookings] == [(2, "canceled")]
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_commits_once(engine, session_pool):
+    commits = []
+    event.listen(engine.sync_engine, "commit", commits.append)
+
+    async with DAORegistry(session_pool, unit_of_work=True) as dao:
+        await dao["user"].add(UserCreate(id=1, username="user", full_name="User"))
+        await dao["route"].add(RouteCreate(departure="A", destination="B", cost=1))
+
+    assert len(commits) == 1
+    async with session_pool() as check:
+        assert len(await RouteDAO(check).find_all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_rolls_back_on_error(session_pool):
+    with pytest.raises(RuntimeError):
+        async with DAORegistry(session_pool, unit_of_work=True) as dao:
+            await dao["route"].add(RouteCreate(departure="A", destination="B", cost=1))
+            raise RuntimeError
+
+    async with session_pool() as check:
+        assert await RouteDAO(check).find_all() == []
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_is_not_committed_after_a_caught_dao_error(session_pool):
+    async with DAORegistry(session_pool, unit_of_work=True) as dao:
+        await dao["route"].add(RouteCreate(departure="A", destination="B", cost=1))
+        try:
+            # NOT NULL violation
+            await dao["route"].upsert(
+                {"departure": "C", "destination": "D", "cost": None}, conflict=("departure", "destination")
+            )
+        except Exception:
+            pass  # handlers answer "Something went wrong" and return normally
+        await dao["route"].add(RouteCreate(departure="B", destination="A", cost=1))
+
+    async with session_pool() as check:
+        assert await RouteDAO(check).find_all() == []
+
+
+@pytest.mark.asyncio
+async def test_route_cache_is_invalidated_when_the_unit_ends(session, session_pool):
+    route_cache.invalidate()
+    session.add(Route(departure="A", destination="B", cost=1))
+    await session.commit()
+
+    async with DAORegistry(session_pool, unit_of_work=True) as dao:
+        await dao["route"].update_cost("A", "B", 5)
+        # Read inside the unit: caches a cost that is not committed yet
+        assert (await dao["route"].get_route("A", "B")).cost == 5
+        await dao.rollback()
+    assert (await RouteDAO(session).get_route("A", "B")).cost == 1
+
+    async with DAORegistry(session_pool, unit_of_work=True) as dao:
+        await dao["route"].update_cost("A", "B", 7)
+        # Another update reads the committed row meanwhile
+        async with session_pool() as other:
+            assert (await RouteDAO(other).get_route("A", "B")).cost == 1
+    assert (await RouteDAO(session).get_route("A", "B")).cost == 7
+
+
+@pytest.mark.asyncio
+async def test_session_is_opened_only_when_a_handler_uses_it(session_pool):
+    opened = []
+
+    def pool():
+        opened.append(1)
+        return session_pool()
+
+    middleware = DbSessionMiddleware(pool)
+
+    async def echo(event, data):
+        return "pong"
+
+    async def lookup(event, data):
+        assert data["dao"]["user"] is data["dao"].user
+        return await data["dao"].user.find_one_or_none_by_id(1)
+
+    assert await middleware(echo, object(), {}) == "pong"
+    assert opened == []
+
+    assert await middleware(lookup, object(), {}) is None
+    assert opened == [1]
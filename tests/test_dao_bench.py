@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks.dao_bench import compare, run_benchmarks
+
+
+@pytest.mark.asyncio
+async def test_dao_bench_report(tmp_path):
+    report = await run_benchmarks(f"sqlite+aiosqlite:///{tmp_path / 'bench.db'}", sizes=[200], ops=5)
+
+    rows = report["results"]
+    assert {(row["indexes"], row["op"], row["mode"]) for row in rows} >= {
+        (True, "insert", "per_call"), (True, "insert", "batched"), (False, "update", "batched"),
+        (False, "cancel_expired", "-"),
+    }
+    # Every tenth row is unpaid and a day old
+    assert {row["ops"] for row in rows if row["op"] == "cancel_expired"} == {20}
+    assert compare(report, report) == []
+
+    slower = {"results": [{**row, "ops_per_sec": row["ops_per_sec"] * 2} for row in rows]}
+    assert len(compare(report, slower)) == len([row for row in rows if row["ops_per_sec"]])
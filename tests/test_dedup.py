@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from bot.database.dao.dao import ProcessedUpdateDAO
+from bot.database.models import ProcessedUpdate
+from bot.services.dedup import UpdateDeduplicator
+
+
+@pytest.mark.asyncio
+async def test_memory_dedup_is_bounded():
+    dedup = UpdateDeduplicator(maxsize=2)
+
+    assert not await dedup.is_duplicate(1)
+    assert await dedup.is_duplicate(1)
+    assert not await dedup.is_duplicate(2)
+    assert not await dedup.is_duplicate(3)
+    # Evicted by the LRU
+    assert not await dedup.is_duplicate(1)
+    assert dedup.metrics() == {"accepted": 4, "duplicates": 1, "cached": 2}
+
+
+@pytest.mark.asyncio
+async def test_db_dedup_across_instances(session, session_pool):
+    first = UpdateDeduplicator(session_pool=session_pool)
+    second = UpdateDeduplicator(session_pool=session_pool)
+
+    assert not await first.is_duplicate(10)
+    assert await second.is_duplicate(10)
+
+    # e.g. the update queue was full and Telegram will redeliver it
+    await first.forget(10)
+    assert not await first.is_duplicate(10)
+
+
+@pytest.mark.asyncio
+async def test_cleanup_keeps_recent_ids(session, session_pool):
+    dedup = UpdateDeduplicator(retention=3600, session_pool=session_pool)
+    for update_id in (1, 2):
+        await dedup.is_duplicate(update_id)
+    await session.execute(
+        ProcessedUpdate.__table__.update().where(ProcessedUpdate.update_id == 1).values(created_at=datetime(2020, 1, 1))
+    )
+    await session.commit()
+
+    await dedup.cleanup()
+    assert [row.update_id for row in await ProcessedUpdateDAO(session).find_all()] == [2]
+
+
+@pytest.mark.asyncio
+async def test_forget_reaches_instances_that_saw_the_retry(session, session_pool):
+    first = UpdateDeduplicator(session_pool=session_pool)
+    second = UpdateDeduplicator(session_pool=session_pool)
+
+    assert not await first.is_duplicate(10)
+    # A retry reached the other instance while the first one still held the update
+    assert await second.is_duplicate(10)
+    await first.forget(10)
+    assert not await second.is_duplicate(10)
+    assert await first.is_duplicate(10)
+
+
+@pytest.mark.asyncio
+async def test_failed_claim_is_not_remembered(session_pool, monkeypatch):
+    dedup = UpdateDeduplicator(session_pool=session_pool)
+
+    async def broken_claim(self, update_id):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(ProcessedUpdateDAO, "claim", broken_claim)
+    assert not await dedup.is_duplicate(10)
+    monkeypatch.undo()
+
+    # Redelivered once the database is back: claimed and handled, then dropped
+    assert not await dedup.is_duplicate(10)
+    assert await dedup.is_duplicate(10)
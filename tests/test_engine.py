@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import text
+
+from bot.config import config
+from bot.database.engine import TimedQueuePool, create_engine_from_config, pool_stats
+
+
+@pytest.mark.asyncio
+async def test_engine_applies_pool_settings_and_sqlite_pragmas(tmp_path):
+    settings = config.model_copy(update={
+        "DB_URL": f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}",
+        "DB_POOL_SIZE": 2,
+        "DB_MAX_OVERFLOW": 3,
+        "DB_POOL_TIMEOUT": 7,
+        "DB_POOL_RECYCLE": 60,
+        "DB_POOL_PRE_PING": False,
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT": 1234,
+    })
+    engine = create_engine_from_config(settings)
+    try:
+        pool = engine.pool
+        assert isinstance(pool, TimedQueuePool)
+        assert (pool.size(), pool._max_overflow, pool._timeout, pool._recycle, pool._pre_ping) == (2, 3, 7, 60, False)
+        assert engine.echo is False
+
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 2  # FULL
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 1234
+        assert pool_stats(engine)["checkouts"] == 1
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_in_memory_sqlite_keeps_the_default_pool():
+    engine = create_engine_from_config(config.model_copy(update={"DB_URL": "sqlite+aiosqlite:///:memory:"}))
+    try:
+        assert not isinstance(engine.pool, TimedQueuePool)
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+    finally:
+        await engine.dispose()
@@ -0,0 +1,104 @@
+import csv
+import gzip
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from bot.database.dao.dao import BookingDAO
+from bot.database.dao.registry import DAORegistry
+from bot.database.models import User, Route, Booking, Payment
+from bot.handlers.admin import export_paid_orders
+from bot.services.export import EXPORT_COLUMNS, export_bookings_csv
+
+
+async def seed(session, count: int = 130):
+    session.add(User(id=1, username="user", full_name="Full Name"))
+    session.add(Route(id=1, departure="A", destination="B", cost=1))
+    session.add(Payment(id=1, payment_method="cryptobot", invoice_id=42))
+    session.add_all(
+        Booking(
+            id=i, user_id=1, route_id=1, payment_id=1, date="today", price=i,
+            status="paid" if i % 2 else "unpaid",
+            created_at=datetime(2024, 1, 1) if i <= 100 else datetime(2024, 3, 1),
+        )
+        for i in range(1, count + 1)
+    )
+    await session.commit()
+
+
+def read_rows(path: str, compress: bool) -> list[list[str]]:
+    with (gzip.open(path, "rt", encoding="utf-8", newline="") if compress else open(path, newline="")) as file:
+        return list(csv.reader(file))
+
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.text = text
+        self.from_user = SimpleNamespace(id=1)
+        self.answers = []
+        self.documents = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+    async def answer_document(self, document, caption=None, **kwargs):
+        # The handler removes the file once sent
+        self.documents.append((document.filename, caption, read_rows(document.path, document.filename.endswith(".gz"))))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compress", [False, True], ids=["csv", "gzip"])
+async def test_export_streams_filtered_batches(session, compress):
+    await seed(session)
+    booking_dao = BookingDAO(session)
+    batches = []
+    stream_export = booking_dao.stream_export
+
+    async def counted(**kwargs):
+        async for rows in stream_export(**kwargs):
+            batches.append(len(rows))
+            yield rows
+
+    booking_dao.stream_export = counted
+
+    path, total = await export_bookings_csv(
+        booking_dao, status="paid", date_to=datetime(2024, 2, 1), compress=compress, batch_size=20
+    )
+    try:
+        rows = read_rows(path, compress)
+    finally:
+        os.remove(path)
+
+    assert (total, batches) == (50, [20, 20, 10])
+    assert rows[0] == EXPORT_COLUMNS
+    assert len(rows) == 51
+    first = dict(zip(EXPORT_COLUMNS, rows[1]))
+    assert (first["id"], first["status"], first["price"]) == ("1", "paid", "1.0")
+    assert (first["departure"], first["destination"]) == ("A", "B")
+    assert (first["user_id"], first["username"], first["full_name"]) == ("1", "user", "Full Name")
+    assert (first["payment_method"], first["invoice_id"]) == ("cryptobot", "42")
+    assert {row[2] for row in rows[1:]} == {"paid"}
+
+    path, total = await export_bookings_csv(booking_dao, date_from=datetime(2024, 2, 1), batch_size=20)
+    os.remove(path)
+    assert total == 30
+
+
+@pytest.mark.asyncio
+async def test_export_command(session, session_pool):
+    await seed(session)
+
+    message = FakeMessage("/export_bookings status=unpaid from=2024-02-01 gzip")
+    async with DAORegistry(session_pool) as dao:
+        await export_paid_orders(message, dao)
+    [(filename, caption, rows)] = message.documents
+    assert (filename, caption) == ("export_bookings.csv.gz", "📦 15 bookings exported.")
+    assert [row[0] for row in rows[1:]] == [str(i) for i in range(102, 131, 2)]
+
+    message = FakeMessage("/export_bookings color=red")
+    async with DAORegistry(session_pool) as dao:
+        await export_paid_orders(message, dao)
+    assert message.documents == []
+    assert message.answers == ["❗ Usage: /export_bookings [status=paid] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [gzip]"]
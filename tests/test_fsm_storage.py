@@ -0,0 +1,91 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from bot.database.storage import SQLAlchemyStorage
+from bot.states.user import JourneyBooking
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+@pytest.mark.asyncio
+async def test_state_survives_new_storage_instance(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'fsm.db'}"
+    storage = SQLAlchemyStorage.from_url(url)
+    await storage.init()
+
+    async with storage.buffered():
+        await storage.set_state(KEY, JourneyBooking.destination)
+        await storage.update_data(KEY, {"departure": "A"})
+        assert await storage.flush() == 1
+
+    other_worker = SQLAlchemyStorage.from_url(url)
+    assert await other_worker.get_state(KEY) == JourneyBooking.destination.state
+    assert await other_worker.get_data(KEY) == {"departure": "A"}
+
+    await storage.close()
+    await other_worker.close()
+
+
+@pytest.mark.asyncio
+async def test_cleared_and_abandoned_conversations_are_removed(session_pool):
+    storage = SQLAlchemyStorage(session_pool)
+    await storage.set_state(KEY, JourneyBooking.departure)
+
+    assert await storage.cleanup(ttl=timedelta(hours=1)) == 0
+    assert await storage.cleanup(ttl=timedelta(hours=-1)) == 1
+
+    await storage.set_state(KEY, JourneyBooking.departure)
+    async with storage.buffered():
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+    assert await storage.get_state(KEY) is None
+    assert await storage.cleanup(ttl=timedelta(hours=-1)) == 0
+
+
+@pytest.mark.asyncio
+async def test_interleaved_updates_keep_their_own_writes(session_pool):
+    storage = SQLAlchemyStorage(session_pool)
+    other_key = StorageKey(bot_id=1, chat_id=7, user_id=7)
+    first_wrote, second_done = asyncio.Event(), asyncio.Event()
+
+    async def first_update():
+        async with storage.buffered():
+            await storage.set_state(KEY, JourneyBooking.quantity)
+            first_wrote.set()
+            await second_done.wait()
+            assert await storage.get_state(KEY) == JourneyBooking.quantity.state
+
+    async def second_update():
+        await first_wrote.wait()
+        async with storage.buffered():
+            # The first update has not finished, its write is not visible yet
+            assert await storage.get_state(KEY) is None
+            await storage.set_state(other_key, JourneyBooking.departure)
+        # Only its own buffer was flushed
+        assert await storage.get_state(other_key) == JourneyBooking.departure.state
+        assert await storage.get_state(KEY) is None
+        second_done.set()
+
+    await asyncio.gather(first_update(), second_update())
+    assert await storage.get_state(KEY) == JourneyBooking.quantity.state
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_the_buffer(session_pool, monkeypatch):
+    storage = SQLAlchemyStorage(session_pool)
+    write = storage._write
+
+    async def failing_write(records):
+        raise ConnectionError("database is gone")
+
+    async with storage.buffered():
+        await storage.set_state(KEY, JourneyBooking.seat_type)
+        monkeypatch.setattr(storage, "_write", failing_write)
+        with pytest.raises(ConnectionError):
+            await storage.flush()
+        monkeypatch.setattr(storage, "_write", write)
+        assert await storage.get_state(KEY) == JourneyBooking.seat_type.state
+    assert await storage.get_state(KEY) == JourneyBooking.seat_type.state
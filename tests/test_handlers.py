@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bot.config import config
+from bot.database.dao.base import Page
+from bot.database.dao.dao import BookingDAO
+from bot.database.dao.registry import DAORegistry
+from bot.database.models import User, Route, Booking
+from bot.handlers import admin
+from bot.handlers.admin import handle_pdf_upload, set_canceled_booking, set_paid_booking
+from bot.handlers.user import render_history_page
+from bot.services.outbox import MessageDispatcher
+
+
+class FakeMessage:
+    """Records each reply with the booking status another session sees at that moment."""
+
+    def __init__(self, text: str, session_pool):
+        self.text = text
+        self.from_user = SimpleNamespace(id=1)
+        self.session_pool = session_pool
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        async with self.session_pool() as other:
+            booking = await BookingDAO(other).find_one_or_none_by_id(1)
+        self.answers.append((text, booking.status))
+
+
+class FakeBot:
+    def __init__(self, blocked=()):
+        self.documents = []
+        self.blocked = set(blocked)
+
+    async def send_document(self, chat_id, document, caption=None):
+        if chat_id in self.blocked:
+            raise RuntimeError("bot was blocked by the user")
+        self.documents.append((chat_id, document, caption))
+        return caption
+
+
+async def seed(session):
+    session.add(User(id=1, username="user"))
+    session.add(Route(id=1, departure="A", destination="B", cost=1))
+    session.add(Booking(id=1, user_id=1, route_id=1, date="today", price=1))
+    await session.commit()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "handler, command, reply, status",
+    [
+        (set_paid_booking, "/mark_paid 1", "Order 1 has paid!", "paid"),
+        (set_canceled_booking, "/cancel_order 1", "Order 1 has canceled!", "canceled"),
+    ],
+    ids=["mark_paid", "cancel_order"],
+)
+async def test_status_is_committed_before_the_reply(session, session_pool, handler, command, reply, status):
+    await seed(session)
+
+    message = FakeMessage(command, session_pool)
+    async with DAORegistry(session_pool, unit_of_work=True) as dao:
+        await handler(message, dao)
+
+    assert message.answers == [(reply, status)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "blocked, reply, status",
+    [
+        ((), "✅ Ticket sent to user.", "processed"),
+        ((1,), "⚠️ Ticket for booking 1 was not delivered. Try /attach_invoice again.", "unpaid"),
+    ],
+    ids=["delivered", "blocked"],
+)
+async def test_ticket_goes_through_the_outbox(session, session_pool, monkeypatch, blocked, reply, status):
+    await seed(session)
+    monkeypatch.setitem(admin.pending_ticket_uploads, 1, 1)
+    bot = FakeBot(blocked)
+    outbox = MessageDispatcher(bot, global_rate=1000, chat_rate=1000)
+    outbox.start()
+
+    message = FakeMessage("", session_pool)
+    message.document = SimpleNamespace(file_id="ticket-file")
+    async with DAORegistry(session_pool, unit_of_work=True) as dao:
+        await handle_pdf_upload(message, dao, outbox)
+    await outbox.stop()
+
+    assert message.answers == [(reply, status)]
+    assert bot.documents == ([] if blocked else [(1, "ticket-file", "🎟 Your ticket PDF is ready!")])
+
+
+def test_history_prices_are_in_the_price_asset(monkeypatch):
+    monkeypatch.setattr(config, "PRICE_ASSET", "TON")
+    route = SimpleNamespace(departure="A", destination="B")
+    booking = SimpleNamespace(id=1, route=route, date="today", seat_type="standard", quantity=2, price=3.0)
+
+    assert "Price: 3.0 TON" in render_history_page("bookings", Page(items=[booking]))
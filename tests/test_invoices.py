@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot.api import router
+from bot.config import config
+from bot.database.dao.dao import BookingDAO
+from bot.database.models import User, Route, Booking, Payment
+from bot.services import crypto
+
+
+@pytest.fixture
+def sent(monkeypatch, session_pool, client):
+    messages = {"users": [], "admins": []}
+
+    async def send_user_msg(user_id, text):
+        messages["users"].append((user_id, text))
+
+    async def notify_admins(text):
+        messages["admins"].append(text)
+
+    monkeypatch.setattr(router, "async_session_maker", session_pool)
+    monkeypatch.setattr(router, "send_user_msg", send_user_msg)
+    monkeypatch.setattr(router, "notify_admins", notify_admins)
+    monkeypatch.setattr(crypto, "crypto", client)
+    return messages
+
+
+@pytest.mark.asyncio
+async def test_pending_invoices_are_polled_in_chunks(session, fake_bot, sent, statements, monkeypatch):
+    monkeypatch.setattr(config, "INVOICE_POLL_CHUNK", 2)
+    old = datetime.utcnow() - timedelta(minutes=config.INVOICE_TIMEOUT_MINUTES + 1)
+    session.add_all([User(id=1, username="a"), User(id=2, username="b")])
+    session.add(Route(id=1, departure="A", destination="B", cost=1))
+    session.add_all(Payment(id=i, payment_method="cryptobot", invoice_id=100 + i) for i in range(1, 6))
+    session.add_all(Booking(id=i, user_id=1 + i % 2, route_id=1, payment_id=i, date="today", price=1) for i in range(1, 5))
+    session.add(Booking(id=5, user_id=1, route_id=1, payment_id=5, date="today", price=1, created_at=old))
+    await session.commit()
+    fake_bot.statuses.update({101: "paid", 102: "paid", 103: "expired", 104: "active", 105: "active"})
+    statements.clear()
+
+    await router.check_pending_invoices()
+
+    assert fake_bot.calls["getInvoices"] == 3
+    # Timed out here but still payable in CryptoBot, an expired invoice is left alone
+    assert fake_bot.calls["deleteInvoice"] == 1
+    assert 105 not in fake_bot.statuses
+    # One UPDATE per status, however many bookings it moves
+    assert len([s for s in statements if s.startswith("UPDATE")]) == 2
+    statuses = {booking.id: booking.status for booking in await BookingDAO(session).find_all()}
+    assert statuses == {1: "paid", 2: "paid", 3: "canceled", 4: "unpaid", 5: "canceled"}
+    assert sorted(sent["users"]) == [
+        (1, "⌛ Booking canceled due to timeout."),
+        (1, "✅ Your payment is confirmed!"),
+        (2, "⌛ Booking canceled due to timeout."),
+        (2, "✅ Your payment is confirmed!"),
+    ]
+    assert sorted(sent["admins"]) == ["📬 Paid booking 1", "📬 Paid booking 2"]
+
+
+@pytest.mark.asyncio
+async def test_payment_for_a_canceled_booking_is_reported(session, sent):
+    session.add(User(id=1, username="a"))
+    session.add(Route(id=1, departure="A", destination="B", cost=1))
+    session.add(Payment(id=1, payment_method="cryptobot", invoice_id=7))
+    session.add_all([
+        Booking(id=1, user_id=1, route_id=1, payment_id=1, date="today", price=1),
+        Booking(id=2, user_id=1, route_id=1, payment_id=1, date="today", price=1),
+    ])
+    await session.commit()
+
+    assert await router.confirm_paid_invoice(7) == 2
+    # Redelivered update: nothing is sent twice
+    assert await router.confirm_paid_invoice(7) == 0
+    assert sent["admins"] == ["📬 Paid booking 1", "📬 Paid booking 2"]
+
+    await session.execute(Booking.__table__.update().values(status="canceled"))
+    await session.commit()
+    sent["admins"].clear()
+    sent["users"].clear()
+    assert await router.confirm_paid_invoice(7) == 0
+    assert sent["admins"] == [
+        "⚠️ Invoice 7 was paid but booking 1 is canceled.",
+        "⚠️ Invoice 7 was paid but booking 2 is canceled.",
+    ]
+    assert sent["users"] == [(1, "⚠️ Your payment arrived after the order was canceled. Our support will contact you.")]
+
+    assert await router.confirm_paid_invoice(8) == 0
+    assert sent["admins"][-1] == "⚠️ Invoice 8 was paid but matches no booking or pass order."
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot.database.dao.dao import ScheduledJobDAO
+from bot.database.models import ScheduledJob
+from bot.services.jobs import JobRunner
+
+calls = []
+
+
+async def sweep():
+    calls.append("sweep")
+
+
+async def remind():
+    calls.append("remind")
+
+
+async def make_due(session):
+    await session.execute(ScheduledJob.__table__.update().values(next_run_at=datetime(2020, 1, 1)))
+    await session.commit()
+
+
+async def settle(*runners):
+    await asyncio.gather(*(task for runner in runners for task in list(runner._running.values())))
+
+
+@pytest.mark.asyncio
+async def test_interval_job_runs_once_across_instances(session, session_pool):
+    calls.clear()
+    first = JobRunner(session_pool, instance="a")
+    second = JobRunner(session_pool, instance="b")
+    await first.every(sweep, seconds=60)
+    await second.every(sweep, seconds=60)
+
+    await asyncio.gather(first.run_pending(), second.run_pending())
+    assert calls == []
+
+    await make_due(session)
+    await asyncio.gather(first.run_pending(), second.run_pending())
+    await settle(first, second)
+    assert calls == ["sweep"]
+    assert first.runs + second.runs == 1
+
+    job = await ScheduledJobDAO(session).find_one_or_none_by_id("sweep")
+    await session.refresh(job)
+    # Missed runs are coalesced, the next one is in the future
+    assert job.next_run_at > datetime.utcnow()
+    assert job.last_run_by in ("a", "b")
+
+
+@pytest.mark.asyncio
+async def test_one_off_job_is_removed_after_its_run(session, session_pool):
+    calls.clear()
+    runner = JobRunner(session_pool)
+    await runner.at(remind, datetime.utcnow() - timedelta(seconds=1), job_id="remind_once")
+
+    await runner.run_pending()
+    await runner.run_pending()
+    await settle(runner)
+    assert calls == ["remind"]
+    assert await ScheduledJobDAO(session).find_all() == []
+
+
+@pytest.mark.asyncio
+async def test_unregistered_job_is_left_for_other_instances(session, session_pool):
+    calls.clear()
+    owner = JobRunner(session_pool, instance="owner")
+    await owner.at(remind, datetime.utcnow() - timedelta(seconds=1))
+
+    other = JobRunner(session_pool, instance="other")
+    await other.run_pending()
+    assert calls == []
+    assert len(await ScheduledJobDAO(session).find_all()) == 1
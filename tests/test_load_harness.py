@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_webhook_load_harness(tmp_path):
+    # Own process: the harness needs a file database, not the in-memory test one
+    env = {key: value for key, value in os.environ.items() if key != "DB_URL"}
+    env["DB_URL"] = f"sqlite+aiosqlite:///{tmp_path / 'load.db'}"
+    report_path = tmp_path / "report.json"
+
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.webhook_load", "--users", "4", "--concurrency", "2",
+         "--json", str(report_path)],
+        cwd=ROOT, env=env, check=True, capture_output=True, timeout=120,
+    )
+
+    report = json.loads(report_path.read_text())
+    assert report["statuses"] == {"200": 44}
+    # /webhook answers 200 even when a handler fails, the logged errors tell
+    assert report["errors"] == 0, report["error_samples"]
+    assert report["db"] == {
+        "users": 4,
+        "users_with_one_booking_and_payment": 4,
+        "bookings": 4,
+        "payments": {"manual": 2, "cryptobot": 2},
+    }
+    assert {step: row["count"] for step, row in report["steps"].items()} == {
+        "start": 4, "booking": 4, "departure": 4, "destination": 4, "travel_date": 4, "seat_type": 4,
+        "quantity": 4, "confirm": 4, "pay_manual": 2, "pay_cryptobot": 2, "order_offers": 4, "offer": 4,
+    }
+    assert report["updates_per_sec"] > 0
+    assert report["steps"]["confirm"]["p50_ms"] <= report["steps"]["confirm"]["p99_ms"]
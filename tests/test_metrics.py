@@ -0,0 +1,50 @@
+import pytest
+
+from bot.database.dao.dao import RouteDAO
+from bot.database.models import Route
+from bot.middlewares.metrics import MetricsMiddleware
+from bot.services.metrics import MetricsRegistry, UpdateStats, current_update, instrument_engine, metrics
+
+
+@pytest.mark.asyncio
+async def test_sql_hooks_record_into_current_update(engine, session):
+    instrument_engine(engine)
+    session.add(Route(departure="A", destination="B", cost=1))
+    await session.commit()
+
+    stats = UpdateStats(handler="process_quantity")
+    token = current_update.set(stats)
+    try:
+        await RouteDAO(session).find_all()
+    finally:
+        current_update.reset(token)
+
+    assert len(stats.queries) == 1
+    assert stats.queries[0][0].startswith("SELECT")
+    assert "SELECT" in stats.breakdown()
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_handler_and_logs_slow_updates():
+    async def handler(event, data):
+        current_update.get().handler = "booking_start"
+        current_update.get().api_calls.append(("SendMessage", 0.02))
+
+    before = metrics.updates["booking_start"]
+    await MetricsMiddleware(slow_ms=0)(handler, object(), {})
+
+    assert metrics.updates["booking_start"] == before + 1
+    assert metrics.api_calls["booking_start", "SendMessage"] >= 1
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.observe_update(UpdateStats(handler="cmd_start", queries=[("SELECT 1", 0.002, 1)]), 0.07)
+
+    text = registry.render({"outbox_depth": 3})
+
+    assert 'bot_updates_total{handler="cmd_start"} 1' in text
+    assert 'bot_update_duration_seconds_bucket{handler="cmd_start",le="0.05"} 0' in text
+    assert 'bot_update_duration_seconds_bucket{handler="cmd_start",le="0.1"} 1' in text
+    assert 'bot_sql_statements_total{handler="cmd_start"} 1' in text
+    assert "bot_outbox_depth 3" in text
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from bot.services.outbox import MessageDispatcher, TokenBucket
+
+
+class FakeBot:
+    def __init__(self, flood_once=(), blocked=()):
+        self.sent = []
+        self.flood_once = set(flood_once)
+        self.blocked = set(blocked)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        method = SendMessage(chat_id=chat_id, text=text)
+        if chat_id in self.flood_once:
+            self.flood_once.discard(chat_id)
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=method, message="bot was blocked by the user")
+        self.sent.append((chat_id, text))
+        return text
+
+    async def send_document(self, chat_id, document, caption=None, **kwargs):
+        self.sent.append((chat_id, document))
+        return caption
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(rate=2, capacity=1)
+    now = bucket.updated
+    assert bucket.wait_time(now) == 0
+    bucket.consume(now)
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_rescheduled_and_blocked_chats_fail():
+    bot = FakeBot(flood_once={1}, blocked={3})
+    outbox = MessageDispatcher(bot, global_rate=1000, chat_rate=1000)
+    outbox.start()
+
+    results = await asyncio.gather(*outbox.send_many([1, 2, 3], "hi"))
+    await outbox.stop()
+
+    assert results == ["hi", "hi", None]
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 2]
+    metrics = outbox.metrics()
+    assert (metrics["sent"], metrics["failed"], metrics["retried"]) == (2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_per_chat_limit_does_not_block_other_chats():
+    bot = FakeBot()
+    outbox = MessageDispatcher(bot, global_rate=1000, chat_rate=2, chat_burst=1)
+    outbox.start()
+
+    first = outbox.send_many([1, 1], "slow")
+    other = outbox.send(2, "fast")
+    await other
+    assert bot.sent[:2] == [(1, "slow"), (2, "fast")]
+
+    await asyncio.gather(*first)
+    await outbox.stop()
+    assert len(bot.sent) == 3
+
+
+@pytest.mark.asyncio
+async def test_documents_share_the_chat_limit():
+    bot = FakeBot()
+    outbox = MessageDispatcher(bot, global_rate=1000, chat_rate=2, chat_burst=1)
+    outbox.start()
+
+    message = outbox.send(1, "hi")
+    document = outbox.send_document(1, "file-id", caption="ticket")
+    other = outbox.send(2, "fast")
+    await other
+    assert bot.sent == [(1, "hi"), (2, "fast")]
+
+    assert await document == "ticket"
+    await message
+    await outbox.stop()
+    assert bot.sent[-1] == (1, "file-id")
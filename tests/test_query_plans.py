@@ -0,0 +1,93 @@
+"""
+Checks that the hot DAO queries are served by indexes.
+
+SQLite always runs; set TEST_POSTGRES_URL (postgresql+asyncpg://...) to check
+the same statements on Postgres.
+"""
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from bot.database import Base
+from bot.database.dao.dao import BookingDAO, MonthlyPassDAO, OfferDAO
+from bot.database.schemas.booking import BookingsByUser
+from bot.database.schemas.monthly_pass import PassesByUser
+from bot.database.schemas.offers import OfferName
+
+ENGINES = ["sqlite"]
+if os.getenv("TEST_POSTGRES_URL"):
+    ENGINES.append("postgresql")
+
+
+@pytest_asyncio.fixture(params=ENGINES)
+async def plan_engine(request, tmp_path):
+    if request.param == "sqlite":
+        url = f"sqlite+aiosqlite:///{tmp_path / 'plans.db'}"
+    else:
+        url = os.environ["TEST_POSTGRES_URL"]
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+async def query_plan(engine, dao_call) -> str:
+    """Run a DAO call, then EXPLAIN the statement it sent to the database."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+            await dao_call(session)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    statement, parameters = captured[0]
+    async with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return "\n".join(row[-1] for row in result)
+        # Empty tables: make the planner show whether an index is usable at all
+        await conn.exec_driver_sql("SET enable_seqscan = off")
+        result = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in result)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "dao_call, index",
+    [
+        (lambda session: BookingDAO(session).get_booking_paid(user_id=1), "ix_bookings_user_status"),
+        (lambda session: BookingDAO(session).find_last_by_user(user_id=1), "ix_bookings_user_id"),
+        (
+            lambda session: BookingDAO(session).find_page(BookingsByUser(user_id=1, status="paid"), before_id=10),
+            "ix_bookings_user_status",
+        ),
+        (
+            lambda session: MonthlyPassDAO(session).find_page(PassesByUser(user_id=1, status="paid"), after_id=10),
+            "ix_monthly_passes_user_status",
+        ),
+        (lambda session: BookingDAO(session).cancel_expired(), "ix_bookings_status_created"),
+        (lambda session: MonthlyPassDAO(session).cancel_expired(), "ix_monthly_passes_status_created"),
+        (lambda session: OfferDAO(session).find_one_or_none(OfferName(name="Pass")), "ix_offers_name"),
+        (lambda session: BookingDAO(session).mark_paid_by_invoice(7), "ix_bookings_payment_status"),
+        (lambda session: MonthlyPassDAO(session).mark_paid_by_invoice(7), "ix_monthly_passes_payment_status"),
+    ],
+    ids=[
+        "bookings_by_user_status", "last_booking_of_user", "bookings_page", "passes_page", "expired_bookings",
+        "expired_passes", "offer_by_name", "paid_invoice_bookings", "paid_invoice_passes",
+    ],
+)
+async def test_hot_queries_use_indexes(plan_engine, dao_call, index):
+    plan = await query_plan(plan_engine, dao_call)
+    assert index in plan, plan
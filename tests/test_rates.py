@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from aiocryptopay.models.rates import ExchangeRate
+
+from bot.services.rates import ExchangeRates, format_amount
+
+
+def rate(source: str, target: str, value: float) -> ExchangeRate:
+    return ExchangeRate(is_valid=True, is_crypto=True, is_fiat=False, source=source, target=target, rate=value)
+
+
+@pytest.mark.asyncio
+async def test_refresh_from_cryptobot(fake_bot, client):
+    table = ExchangeRates(lambda: client.call("get_exchange_rates"))
+    assert table.convert(15, "USDT", "TON") is None
+
+    await table.refresh()
+    assert table.convert(15, "USDT", "TON") == 3.0
+    assert table.convert(3, "TON", "USDT") == 15.0
+    # Crossed through USD
+    assert table.convert(12000, "TON", "BTC") == 1.0
+    assert table.convert(15, "USDT", "XYZ") is None
+    assert table.format_price(15.0, "USDT", "TON") == "15.0 USDT ≈ 3 TON"
+    assert table.format_price(15.0, "USDT", None) == "15.0 USDT"
+
+    # Converting never calls CryptoBot
+    table.convert(1, "BTC", "TON")
+    assert fake_bot.calls["getExchangeRates"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fiat_prices_and_rounding():
+    async def fetch():
+        return [rate("USDT", "USD", 1.0), rate("USDT", "EUR", 0.8), rate("BTC", "USD", 60000.0)]
+
+    table = ExchangeRates(fetch)
+    await table.refresh()
+
+    assert table.convert(8, "EUR", "USDT") == 10.0
+    # Rounded up, the invoice never undercharges
+    assert table.convert(1, "USDT", "BTC") == 0.00001667
+    assert format_amount(0.00001667) == "0.00001667"
+
+
+@pytest.mark.asyncio
+async def test_stale_rates_are_not_used():
+    async def fetch():
+        return [rate("TON", "USD", 5.0)]
+
+    table = ExchangeRates(fetch, max_age=0.05)
+    await table.refresh()
+    assert table.convert(10, "USD", "TON") == 2.0
+
+    await asyncio.sleep(0.1)
+    assert table.convert(10, "USD", "TON") is None
+    assert table.convert(10, "TON", "TON") == 10
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_survives_failures(fake_bot, client):
+    table = ExchangeRates(lambda: client.call("get_exchange_rates", retry=False), refresh_seconds=0.02)
+    fake_bot.fail_next = 1
+    table.start()
+    # Polled rather than a fixed sleep: the first calls are slow on a loaded machine
+    async def refreshed():
+        while not table.refreshes:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(refreshed(), timeout=5)
+    await table.stop()
+
+    assert table.failures == 1
+    assert table.refreshes >= 1
+    assert table.convert(5, "TON", "USDT") == 25.0
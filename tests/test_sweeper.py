@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from bot.database.dao.dao import BookingDAO
+from bot.database.models import User, Route, Booking, Payment
+from bot.services import sweeper
+from bot.services.outbox import MessageDispatcher
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append(chat_id)
+        return text
+
+
+@pytest.mark.asyncio
+async def test_sweep_cancels_in_chunks(session, session_pool, monkeypatch):
+    deleted = []
+
+    async def delete_invoice(invoice_id):
+        deleted.append(invoice_id)
+        return True
+
+    monkeypatch.setattr(sweeper, "delete_invoice", delete_invoice)
+
+    old = datetime(2020, 1, 1)
+    session.add_all([User(id=1, username="a"), User(id=2, username="b")])
+    session.add(Route(id=1, departure="A", destination="B", cost=1))
+    session.add_all(Payment(id=i, payment_method="cryptobot", invoice_id=100 + i) for i in range(1, 6))
+    session.add_all(
+        Booking(user_id=1 + i % 2, route_id=1, payment_id=i, date="today", price=1, created_at=old)
+        for i in range(1, 6)
+    )
+    session.add(Booking(user_id=1, route_id=1, date="today", price=1, status="paid", created_at=old))
+    session.add(Booking(user_id=1, route_id=1, date="today", price=1))
+    await session.commit()
+
+    bot = FakeBot()
+    outbox = MessageDispatcher(bot)
+    outbox.start()
+    metrics = await sweeper.sweep_expired(
+        session_pool, BookingDAO, outbox, expire_minutes=60, text="expired", chunk_size=2
+    )
+    await outbox.stop()
+
+    assert metrics["canceled"] == 5
+    assert metrics["chunks"] == 3
+    assert sorted(deleted) == [101, 102, 103, 104, 105]
+    assert sorted(bot.sent) == [1, 2]
+    assert metrics["notified"] == 2
+    statuses = [booking.status for booking in await BookingDAO(session).find_all()]
+    assert statuses == ["canceled"] * 5 + ["paid", "unpaid"]
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from aiogram.types import Update
+
+from bot.services.update_queue import UpdateQueue
+
+
+def message_update(update_id: int, chat_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+            "text": "hi",
+        },
+    })
+
+
+class FakeDispatcher:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.handled = []
+        self.workers = {}
+
+    async def feed_update(self, bot, update):
+        self.workers.setdefault(update.message.chat.id, set()).add(asyncio.current_task().get_name())
+        await asyncio.sleep(self.delay)
+        self.handled.append((update.message.chat.id, update.update_id))
+
+
+@pytest.mark.asyncio
+async def test_updates_of_a_chat_are_handled_in_order_by_one_worker():
+    dispatcher = FakeDispatcher(delay=0.001)
+    queue = UpdateQueue(dispatcher, bot=None, workers=4, maxsize=100)
+    queue.start()
+    for update_id in range(20):
+        assert queue.put(message_update(update_id, chat_id=1 + update_id % 3))
+    await queue.stop()
+
+    for chat_id in (1, 2, 3):
+        assert [u for c, u in dispatcher.handled if c == chat_id] == list(range(chat_id - 1, 20, 3))
+        assert len(dispatcher.workers[chat_id]) == 1
+    assert queue.metrics()["processed"] == 20
+
+
+@pytest.mark.asyncio
+async def test_full_shard_rejects_while_others_are_empty():
+    # Not started: nothing is consumed, each of the 2 shards holds 4 // 2 updates
+    queue = UpdateQueue(FakeDispatcher(), bot=None, workers=2, maxsize=4)
+    queue._accepting = True
+
+    assert queue.put(message_update(1, chat_id=2))
+    assert queue.put(message_update(2, chat_id=2))
+    assert not queue.put(message_update(3, chat_id=2))
+    assert queue.put(message_update(4, chat_id=1))
+    assert queue.metrics()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_queued_updates():
+    dispatcher = FakeDispatcher(delay=0.01)
+    queue = UpdateQueue(dispatcher, bot=None, workers=2, maxsize=10)
+    queue.start()
+    for update_id in range(6):
+        queue.put(message_update(update_id, chat_id=update_id))
+    await queue.stop(timeout=5)
+
+    assert len(dispatcher.handled) == 6
+    assert queue.depth == 0
+    # Stopped: the webhook answers 503 and Telegram redelivers
+    assert not queue.put(message_update(7, chat_id=7))
@@ -0,0 +1,70 @@
+import pytest
+
+from bot.database.dao.dao import OfferDAO, RouteDAO, offer_cache, route_cache
+from bot.database.schemas.route import RouteCreate
+from bot.keyboards.offers_kb import get_list_offers
+from bot.keyboards.user import general_keyboard_menu
+from bot.services.cache import TTLCache
+
+
+def test_ttl_cache_expires_and_counts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("bot.services.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10)
+
+    assert cache.get("a") == (False, None)
+    cache.set("a", None)
+    assert cache.get("a") == (True, None)
+    now[0] += 11
+    assert cache.get("a") == (False, None)
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 0}
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+
+
+@pytest.mark.asyncio
+async def test_route_cache_invalidated_on_write(session):
+    route_cache.invalidate()
+    route_dao = RouteDAO(session)
+
+    assert await route_dao.get_route("A", "B") is None
+    await route_dao.add(RouteCreate(departure="A", destination="B", cost=10))
+    assert (await route_dao.get_route("A", "B")).cost == 10
+
+    hits = route_cache.hits
+    assert (await route_dao.get_route("A", "B")).cost == 10
+    assert route_cache.hits == hits + 1
+
+    await route_dao.update_cost("A", "B", 12.5)
+    assert (await route_dao.get_route("A", "B")).cost == 12.5
+
+
+@pytest.mark.asyncio
+async def test_offer_catalog_rebuilt_only_on_write(session, statements):
+    offer_cache.invalidate()
+    offer_dao = OfferDAO(session)
+    data = {"name": "Pass", "description": "", "advantages": "", "url": "http://x.com", "price": 1}
+    await offer_dao.create_or_update_offer(data)
+
+    catalog = await offer_dao.get_catalog()
+    statements.clear()
+    assert await offer_dao.get_catalog() is catalog
+    assert get_list_offers(catalog) is get_list_offers(await offer_dao.get_catalog())
+    assert statements == []
+
+    await offer_dao.create_or_update_offer({**data, "price": 2})
+    new_catalog = await offer_dao.get_catalog()
+    assert [offer.price for offer in new_catalog] == [2]
+    assert get_list_offers(new_catalog) is not get_list_offers(catalog)
+
+
+def test_static_keyboards_are_shared():
+    assert general_keyboard_menu() is general_keyboard_menu()